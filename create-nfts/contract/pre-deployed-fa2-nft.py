@@ -162,10 +162,6 @@ def test():
     # Originate the contract in the test scenario
     scenario += contract
 
-    if scenario.simulation_mode() is sp.SimulationMode.MOCKUP:
-        scenario.p("mockups - fix transfer based testing")
-        return
-
     # Run tests
 
     scenario.h2("Verify the initial owners of the tokens")
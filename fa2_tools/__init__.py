@@ -0,0 +1,15 @@
+"""Shared helpers for the SmartPy FA2 tutorial contracts.
+
+The tutorial contracts in `smartpy_fa2_fungible` and `create-nfts/contract`
+are standalone scripts. This package holds the supporting tools and extra
+contract mixins, and `fa2_tools.examples` extends the tutorial contracts
+with them.
+"""
+
+import os as _os
+
+# Trace the scenario file that imports this package, see `fa2_tools.trace`
+if _os.environ.get("FA2_TRACE"):
+    from fa2_tools.trace import install_from_env
+
+    install_from_env()
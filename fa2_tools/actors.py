@@ -0,0 +1,132 @@
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+# Alias the FA2 types of the template
+t = fa2.t
+
+
+@sp.module
+def actors():
+    import t
+
+    mint_batch: type = sp.list[
+        sp.record(
+            to_=sp.address,
+            token=sp.variant(new=sp.map[sp.string, sp.bytes], existing=sp.nat),
+            amount=sp.nat,
+        ).layout(("to_", ("token", "amount")))
+    ]
+
+    burn_batch: type = sp.list[
+        sp.record(from_=sp.address, token_id=sp.nat, amount=sp.nat).layout(
+            ("from_", ("token_id", "amount"))
+        )
+    ]
+
+    conversion_batch: type = sp.list[
+        sp.record(source_token_id=sp.nat, target_token_id=sp.nat, amount=sp.nat)
+    ]
+
+    fa2_call: type = sp.variant(
+        transfer=t.transfer_params,
+        mint=mint_batch,
+        burn=burn_batch,
+        convert=conversion_batch,
+        update_operators=t.update_operators_params,
+    ).layout(("transfer", ("mint", ("burn", ("convert", "update_operators")))))
+
+    step: type = sp.record(actor=sp.address, calls=sp.list[fa2_call]).layout(
+        ("actor", "calls")
+    )
+
+    class Actor(sp.Contract):
+        """An account that forwards FA2 calls, so that it is their sender.
+
+        Calls between contracts cost far less to simulate than calls from
+        the scenario, so a `Driver` can run the calls of many actors in one
+        scenario call.
+        """
+
+        def __init__(self, fa2_address):
+            self.data.fa2 = sp.cast(fa2_address, sp.address)
+
+        @sp.entrypoint
+        def set_fa2(self, fa2_address):
+            self.data.fa2 = fa2_address
+
+        @sp.entrypoint
+        def forward(self, calls):
+            sp.cast(calls, sp.list[fa2_call])
+            for call in calls:
+                match call:
+                    case transfer(batch):
+                        sp.transfer(
+                            batch,
+                            sp.mutez(0),
+                            sp.contract(t.transfer_params, self.data.fa2, entrypoint="transfer").unwrap_some(),
+                        )
+                    case mint(batch):
+                        sp.transfer(
+                            batch,
+                            sp.mutez(0),
+                            sp.contract(mint_batch, self.data.fa2, entrypoint="mint").unwrap_some(),
+                        )
+                    case burn(batch):
+                        sp.transfer(
+                            batch,
+                            sp.mutez(0),
+                            sp.contract(burn_batch, self.data.fa2, entrypoint="burn").unwrap_some(),
+                        )
+                    case convert(batch):
+                        sp.transfer(
+                            batch,
+                            sp.mutez(0),
+                            sp.contract(conversion_batch, self.data.fa2, entrypoint="convert").unwrap_some(),
+                        )
+                    case update_operators(batch):
+                        # The interpreter doesn't match unpacked records with
+                        # the records built by the scenario as big_map keys,
+                        # so rebuild them, in the same order
+                        reversed_actions = []
+                        for action in batch:
+                            match action:
+                                case add_operator(permission):
+                                    reversed_actions.push(sp.variant.add_operator(sp.record(
+                                        owner=permission.owner,
+                                        operator=permission.operator,
+                                        token_id=permission.token_id,
+                                    )))
+                                case remove_operator(permission):
+                                    reversed_actions.push(sp.variant.remove_operator(sp.record(
+                                        owner=permission.owner,
+                                        operator=permission.operator,
+                                        token_id=permission.token_id,
+                                    )))
+                        actions = sp.cast([], t.update_operators_params)
+                        for action in reversed_actions:
+                            actions.push(action)
+                        sp.transfer(
+                            actions,
+                            sp.mutez(0),
+                            sp.contract(t.update_operators_params, self.data.fa2, entrypoint="update_operators").unwrap_some(),
+                        )
+
+    class Driver(sp.Contract):
+        """Run the calls of many actors, in order, in one operation.
+
+        The steps come packed, as a `list[step]`, so that a scenario passes
+        one bytes literal instead of building an expression for every call.
+        Internal operations run depth-first, so each step sees the effects
+        of the steps before it.
+        """
+
+        @sp.entrypoint
+        def run(self, packed):
+            sp.cast(packed, sp.bytes)
+            steps = sp.unpack(packed, sp.list[step]).unwrap_some(error="DRIVER_BAD_STEPS")
+            for item in steps:
+                sp.transfer(
+                    item.calls,
+                    sp.mutez(0),
+                    sp.contract(sp.list[fa2_call], item.actor, entrypoint="forward").unwrap_some(),
+                )
@@ -0,0 +1,124 @@
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+# Alias the main template for FA2 contracts
+main = fa2.main
+
+
+@sp.module
+def airdrop():
+    import main
+
+    claim_param: type = sp.list[
+        sp.record(
+            index=sp.nat,
+            to_=sp.address,
+            token_id=sp.nat,
+            amount=sp.nat,
+            proof=sp.list[sp.bytes],
+        )
+    ]
+
+    class MerkleClaims(main.AdminInterface):
+        """(Mixin) Shared storage and checks of the Merkle airdrop mixins.
+
+        The contract stores the root of a Merkle tree of allocations, built
+        offline with `fa2_tools.merkle`, and a bitmap of the claimed indexes,
+        256 per big_map entry. The bitmap is keyed by root, so setting a new
+        root starts a new airdrop.
+        """
+
+        def __init__(self, airdrop_root):
+            main.AdminInterface.__init__(self)
+            self.data.airdrop_root = sp.cast(airdrop_root, sp.bytes)
+            self.data.airdrop_claimed = sp.cast(
+                sp.big_map(), sp.big_map[sp.pair[sp.bytes, sp.nat], sp.nat]
+            )
+
+        @sp.entrypoint
+        def set_airdrop_root(self, airdrop_root):
+            sp.cast(airdrop_root, sp.bytes)
+            assert self.is_administrator_(), "FA2_NOT_ADMIN"
+            self.data.airdrop_root = airdrop_root
+
+        @sp.private(with_storage="read-write")
+        def check_claim_(self, claim):
+            """Verify the proof of an allocation and mark it as claimed."""
+            node = sp.blake2b(
+                sp.bytes("0x00")
+                + sp.pack((claim.index, (claim.to_, (claim.token_id, claim.amount))))
+            )
+            position = claim.index
+            for sibling in claim.proof:
+                if sp.mod(position, 2) == 0:
+                    node = sp.blake2b(sp.bytes("0x01") + node + sibling)
+                else:
+                    node = sp.blake2b(sp.bytes("0x01") + sibling + node)
+                position = position >> 1
+            assert node == self.data.airdrop_root, "AIRDROP_INVALID_PROOF"
+
+            key = (self.data.airdrop_root, claim.index >> 8)
+            bit = 1 << sp.mod(claim.index, 256)
+            claimed = self.data.airdrop_claimed.get(key, default=0)
+            assert (claimed & bit) == 0, "AIRDROP_ALREADY_CLAIMED"
+            self.data.airdrop_claimed[key] = claimed | bit
+
+        @sp.onchain_view()
+        def is_claimed(self, index):
+            sp.cast(index, sp.nat)
+            claimed = self.data.airdrop_claimed.get(
+                (self.data.airdrop_root, index >> 8), default=0
+            )
+            return (claimed & (1 << sp.mod(index, 256))) != 0
+
+    class MerkleAirdropFungible(MerkleClaims, main.FungibleInterface, main.CommonInterface):
+        """(Mixin) Merkle airdrop claims for `main.Fungible`.
+
+        Anyone can submit claims, for example a relayer for many recipients
+        at once; the tokens always go to the recipient in the allocation.
+        Claimed tokens are minted, so the supply grows as they are claimed.
+        """
+
+        def __init__(self, airdrop_root):
+            main.CommonInterface.__init__(self)
+            main.FungibleInterface.__init__(self)
+            MerkleClaims.__init__(self, airdrop_root)
+
+        @sp.entrypoint
+        def claim(self, claims):
+            sp.cast(claims, claim_param)
+            for claim in claims:
+                assert self.is_defined_(claim.token_id), "FA2_TOKEN_UNDEFINED"
+                self.check_claim_(claim)
+                key = (claim.to_, claim.token_id)
+                self.data.ledger[key] = self.data.ledger.get(key, default=0) + claim.amount
+                self.data.supply[claim.token_id] = (
+                    self.data.supply.get(claim.token_id, default=0) + claim.amount
+                )
+
+    class MerkleAirdropNft(MerkleClaims, main.NftInterface, main.CommonInterface):
+        """(Mixin) Merkle airdrop claims for `main.Nft`.
+
+        Each allocation is a token that exists but has no owner yet, with an
+        amount of 1. Claiming it gives it to the recipient.
+
+        The template's `balance_` and `supply_` read the ledger entry of
+        every defined token, so the contract must also override them to
+        return 0 for unclaimed tokens, for example
+        `return 1 if token_id in self.data.ledger else 0` for `supply_`.
+        """
+
+        def __init__(self, airdrop_root):
+            main.CommonInterface.__init__(self)
+            main.NftInterface.__init__(self)
+            MerkleClaims.__init__(self, airdrop_root)
+
+        @sp.entrypoint
+        def claim(self, claims):
+            sp.cast(claims, claim_param)
+            for claim in claims:
+                assert self.is_defined_(claim.token_id), "FA2_TOKEN_UNDEFINED"
+                assert claim.amount == 1, "FA2_INSUFFICIENT_BALANCE"
+                assert not (claim.token_id in self.data.ledger), "AIRDROP_TOKEN_OWNED"
+                self.check_claim_(claim)
+                self.data.ledger[claim.token_id] = claim.to_
@@ -0,0 +1,268 @@
+"""Scale benchmarks for the tutorial FA2 contracts.
+
+For every combination of N holders, M token IDs and batch size K, this
+module originates `MyFungibleContract` from
+`smartpy_fa2_fungible/part_4_complete.py` and `MyNFTContract` from
+`create-nfts/contract/fa2-from-template.py`, calls `mint`, `transfer`,
+`burn` and (fungible only) `convert` with batches of K elements, and
+writes the cost of each call as CSV:
+
+    python -m fa2_tools.bench --holders 2,10,100 --tokens 1,10 --batch 1,10,100 --output bench.csv
+
+The costs are read from octez-client receipts by `fa2_tools.costs`,
+which runs the benchmarks in mockup simulation mode. Dividing the gas and
+storage of each call by its number of elements gives the cost curves;
+a per-element cost that grows with N, M or K points to super-linear
+behaviour.
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib.util
+import itertools
+import os
+import sys
+import tempfile
+
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+from fa2_tools import costs
+from fa2_tools.contracts import PATHS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNGIBLE_PATH = PATHS["convertible_fungible"]
+NFT_PATH = PATHS["nft"]
+
+CSV_FIELDS = [
+    "contract", "entrypoint", "holders", "tokens", "batch_size", "elements",
+    "gas", "gas_per_element", "paid_storage_size_diff", "storage_per_element",
+]
+
+
+@contextlib.contextmanager
+def _without_tests():
+    """Turn `@sp.add_test()` into a no-op so importing a tutorial file doesn't run its scenario."""
+    add_test = sp.add_test
+    sp.add_test = lambda *args, **kwargs: (lambda f: f)
+    try:
+        yield
+    finally:
+        sp.add_test = add_test
+
+
+def load_module(path):
+    """Return the `my_module` SmartPy module defined in a tutorial file."""
+    name = "fa2_tutorial_" + os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    with _without_tests():
+        spec.loader.exec_module(module)
+    return module.my_module
+
+
+def _token_metadata(tokens):
+    return [
+        fa2.make_metadata(name="Token %d" % i, decimals=0, symbol="TK%d" % i)
+        for i in range(tokens)
+    ]
+
+
+def fungible_scenario(my_module, name, holders, tokens, batch_size):
+    """Originate a fungible contract with N x M balances and call each entrypoint with K elements."""
+    scenario = sp.test_scenario(name, my_module)
+    admin = sp.test_account("Admin")
+    accounts = [sp.test_account("Holder%d" % i) for i in range(holders)]
+    sender = accounts[0]
+
+    # Every holder owns enough of every token for the batches below
+    initial_ledger = {
+        (account.address, token_id): 2 * batch_size
+        for account in accounts
+        for token_id in range(tokens)
+    }
+    contract = my_module.MyFungibleContract(
+        admin.address, sp.big_map(), initial_ledger, _token_metadata(tokens)
+    )
+    scenario += contract
+
+    contract.mint(
+        [
+            sp.record(
+                to_=accounts[i % holders].address,
+                amount=1,
+                token=sp.variant("existing", i % tokens),
+            )
+            for i in range(batch_size)
+        ],
+        _sender=admin,
+    )
+    contract.transfer(
+        [
+            sp.record(
+                from_=sender.address,
+                txs=[
+                    sp.record(
+                        to_=accounts[(i + 1) % holders].address,
+                        amount=1,
+                        token_id=i % tokens,
+                    )
+                    for i in range(batch_size)
+                ],
+            ),
+        ],
+        _sender=sender,
+    )
+    contract.burn(
+        [
+            sp.record(from_=sender.address, token_id=i % tokens, amount=1)
+            for i in range(batch_size)
+        ],
+        _sender=sender,
+    )
+    contract.convert(
+        [
+            sp.record(
+                source_token_id=i % tokens,
+                target_token_id=(i + 1) % tokens,
+                amount=1,
+            )
+            for i in range(batch_size)
+        ],
+        _sender=sender,
+    )
+
+
+def nft_scenario(my_module, name, holders, tokens, batch_size):
+    """Originate an NFT contract with M tokens spread over N holders and call each entrypoint with K elements."""
+    scenario = sp.test_scenario(name, my_module)
+    admin = sp.test_account("Admin")
+    accounts = [sp.test_account("Holder%d" % i) for i in range(holders)]
+    sender = accounts[0]
+
+    ledger = {token_id: accounts[token_id % holders].address for token_id in range(tokens)}
+    contract = my_module.MyNFTContract(
+        admin.address, sp.big_map(), ledger, _token_metadata(tokens)
+    )
+    scenario += contract
+
+    # Mint 2K new tokens to the sender: it transfers the first K and burns the rest
+    contract.mint(
+        [
+            sp.record(
+                metadata=fa2.make_metadata(name="Minted %d" % i, decimals=0, symbol="MT%d" % i),
+                to_=sender.address,
+            )
+            for i in range(2 * batch_size)
+        ],
+        _sender=admin,
+    )
+    contract.transfer(
+        [
+            sp.record(
+                from_=sender.address,
+                txs=[
+                    sp.record(
+                        to_=accounts[(i + 1) % holders].address,
+                        amount=1,
+                        token_id=tokens + i,
+                    )
+                    for i in range(batch_size)
+                ],
+            ),
+        ],
+        _sender=sender,
+    )
+    contract.burn(
+        [
+            sp.record(from_=sender.address, token_id=tokens + batch_size + i, amount=1)
+            for i in range(batch_size)
+        ],
+        _sender=sender,
+    )
+
+
+SCENARIOS = {
+    "fungible": (FUNGIBLE_PATH, fungible_scenario),
+    "nft": (NFT_PATH, nft_scenario),
+}
+
+
+def _elements(row, point):
+    if row["entrypoint"] == "origination":
+        # One initial ledger entry per holder and token for fungible contracts,
+        # one per token for NFT contracts
+        if point["contract"] == "fungible":
+            return point["holders"] * point["tokens"]
+        return point["tokens"]
+    if point["contract"] == "nft" and row["entrypoint"] == "mint":
+        return 2 * point["batch_size"]
+    return point["batch_size"]
+
+
+def _add_test(scenario, *args):
+    def test():
+        scenario(*args)
+
+    sp.add_test()(test)
+
+
+def run(contracts, holders, tokens, batch_sizes, client="octez-client"):
+    """Run every benchmark point and return one CSV row per applied call."""
+    modules = {contract: load_module(SCENARIOS[contract][0]) for contract in contracts}
+    points = {}
+    with tempfile.TemporaryDirectory(prefix="fa2_bench_") as tmp:
+        log_path = os.path.join(tmp, "calls.jsonl")
+        open(log_path, "w").close()
+        with costs.recording(log_path, client=client):
+            for contract, n, m, k in itertools.product(contracts, holders, tokens, batch_sizes):
+                name = "bench_%s_n%d_m%d_k%d" % (contract, n, m, k)
+                points[name] = dict(contract=contract, holders=n, tokens=m, batch_size=k)
+                _add_test(SCENARIOS[contract][1], modules[contract], name, n, m, k)
+        table = costs.build_table(log_path)
+
+    rows = []
+    for name, calls in table["scenarios"].items():
+        point = points[name]
+        for call in calls:
+            if call["status"] != "applied":
+                continue
+            elements = _elements(call, point)
+            rows.append(dict(
+                point,
+                entrypoint=call["entrypoint"],
+                elements=elements,
+                gas=call["gas"],
+                gas_per_element=round(call["gas"] / elements, 3),
+                paid_storage_size_diff=call["paid_storage_size_diff"],
+                storage_per_element=round(call["paid_storage_size_diff"] / elements, 3),
+            ))
+    return rows
+
+
+def _axis(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contracts", default="fungible,nft")
+    parser.add_argument("--holders", type=_axis, default=[2, 10, 100])
+    parser.add_argument("--tokens", type=_axis, default=[1, 10])
+    parser.add_argument("--batch", type=_axis, default=[1, 10, 100])
+    parser.add_argument("--output", default="bench.csv")
+    parser.add_argument("--client", default="octez-client")
+    args = parser.parse_args(argv)
+
+    rows = run(args.contracts.split(","), args.holders, args.tokens, args.batch, client=args.client)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print("Wrote %d rows to %s" % (len(rows), args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
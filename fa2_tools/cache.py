@@ -0,0 +1,227 @@
+"""On-disk cache of compiled SmartPy contracts, keyed by source.
+
+Two keys are used. The source key of a scenario file hashes the syntax
+tree of the whole file, of every `fa2_tools` module that it imports,
+directly or through other `fa2_tools` modules, of the tutorial files if
+one of them loads a tutorial contract with `load_module`, the SmartPy
+version and the `fa2_lib` template source. Any code that runs when the
+file runs is part of the key, such as the test functions, while comments
+and formatting are not. The module key hashes the same sources, except
+that only the module-level imports, assignments, classes and
+`@sp.module` functions of the scenario file itself are kept: editing a
+test body changes the source key but not the module key.
+
+After a passing run, `store` records the result under the source key and
+copies the compiled Michelson and type files that SmartPy wrote to the
+output directory into the cache under the module key. The runner
+(`python -m fa2_tools.runner --cache`) skips files whose source key
+already passed, and tools that only need the compiled Michelson can read
+it with `lookup` without running SmartPy at all, even after a test body
+changed. The artifacts under a module key are those of every passing run
+with those modules, each file replaced by the latest run that wrote it,
+so a test body that originates another contract adds its files, and a
+contract that is no longer originated keeps its older ones.
+"""
+import ast
+import fnmatch
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+
+from fa2_tools.contracts import PATHS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(ROOT, ".fa2_cache")
+
+# Files that SmartPy writes for each originated contract
+ARTIFACT_PATTERNS = ("*_contract.tz", "*_contract.json", "*_types.py")
+
+
+def _parse(path):
+    with open(path) as f:
+        return ast.parse(f.read(), filename=path)
+
+
+def _loads_lazily(init):
+    return any(isinstance(node, ast.FunctionDef) and node.name == "__getattr__" for node in _parse(init).body)
+
+
+def _module_paths(name):
+    """Return the source files that importing the `fa2_tools` module `name` runs."""
+    parts = name.split(".")
+    paths = []
+    for depth in range(1, len(parts) + 1):
+        path = os.path.join(ROOT, *parts[:depth])
+        if os.path.isdir(path):
+            init = os.path.join(path, "__init__.py")
+            paths.append(init)
+            if depth == len(parts) and os.path.exists(init) and _loads_lazily(init):
+                # A package such as `fa2_tools.contracts` imports its modules on first use
+                paths.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".py")
+                )
+        elif os.path.exists(path + ".py"):
+            paths.append(path + ".py")
+            break
+        else:
+            break
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _package(path):
+    """Return the dotted name of the package that a file under ROOT belongs to."""
+    parts = os.path.relpath(path, ROOT).split(os.sep)
+    return ".".join(parts[:-1])
+
+
+def _imported_tools(tree, path):
+    """Return the paths of the `fa2_tools` modules that a file imports anywhere in its code."""
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if node.level:
+                package = _package(path).split(".")
+                package = package[:len(package) - node.level + 1]
+                module = ".".join(package + ([module] if module else []))
+            names.append(module)
+            # `from fa2_tools import views` imports a module, not a name
+            names.extend(module + "." + alias.name for alias in node.names)
+    paths = []
+    for name in names:
+        if name == "fa2_tools" or name.startswith("fa2_tools."):
+            paths.extend(_module_paths(name))
+    if any(isinstance(node, ast.Call) and _called_name(node) == "load_module" for node in ast.walk(tree)):
+        # `fa2_tools.bench.load_module` runs a tutorial file, and the file's
+        # argument is usually computed, so depend on all of them
+        paths.extend(path for path in PATHS.values() if os.path.exists(path))
+    return paths
+
+
+def _called_name(call):
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    if isinstance(call.func, ast.Attribute):
+        return call.func.attr
+    return None
+
+
+def smartpy_version():
+    """Return the installed SmartPy version and a hash of the FA2 template it ships."""
+    try:
+        version = importlib.metadata.version("smartpy-tezos")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    try:
+        spec = importlib.util.find_spec("smartpy.templates.fa2_lib")
+    except ModuleNotFoundError:
+        spec = None
+    template = ""
+    if spec is not None and spec.origin and os.path.exists(spec.origin):
+        with open(spec.origin, "rb") as f:
+            template = hashlib.sha256(f.read()).hexdigest()
+    return "%s/%s" % (version, template)
+
+
+def _module_code(tree):
+    """Return a tree with the module-level code of a scenario file, without its tests."""
+    kept = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if any(_decorator_name(decorator) == "module" for decorator in node.decorator_list):
+                kept.append(node)
+        elif isinstance(node, (ast.Import, ast.ImportFrom, ast.Assign, ast.AnnAssign, ast.ClassDef)):
+            kept.append(node)
+    return ast.Module(body=kept, type_ignores=[])
+
+
+def _decorator_name(decorator):
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+    if isinstance(decorator, ast.Attribute):
+        return decorator.attr
+    if isinstance(decorator, ast.Name):
+        return decorator.id
+    return None
+
+
+def _key(path, version, modules_only):
+    seen = set()
+    pending = [os.path.abspath(path)]
+    trees = {}
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        tree = _parse(current)
+        trees[current] = tree
+        pending.extend(_imported_tools(tree, current))
+    tree = trees.pop(os.path.abspath(path))
+    digest = hashlib.sha256((version or smartpy_version()).encode())
+    digest.update(ast.dump(_module_code(tree) if modules_only else tree).encode())
+    for current in sorted(trees):
+        digest.update(os.path.relpath(current, ROOT).encode())
+        digest.update(ast.dump(trees[current]).encode())
+    return digest.hexdigest()
+
+
+def source_key(path, version=None):
+    """Return the fingerprint of a file and of the `fa2_tools` sources it imports."""
+    return _key(path, version, modules_only=False)
+
+
+def module_key(path, version=None):
+    """Return the fingerprint of the contract sources of a file, without its tests."""
+    return _key(path, version, modules_only=True)
+
+
+class Cache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.version = smartpy_version()
+
+    def _module_dir(self, key):
+        return os.path.join(self.directory, "modules", key)
+
+    def _result_path(self, key):
+        return os.path.join(self.directory, "results", key + ".json")
+
+    def lookup(self, path):
+        """Return the directory of cached compiled artifacts for a file, or None."""
+        directory = self._module_dir(module_key(path, self.version))
+        return directory if os.path.isdir(directory) else None
+
+    def passed(self, path):
+        """Return the cached result of a previous passing run of this exact scenario, or None."""
+        result_path = self._result_path(source_key(path, self.version))
+        if not os.path.exists(result_path):
+            return None
+        with open(result_path) as f:
+            return json.load(f)
+
+    def store(self, path, output_dir, result):
+        """Cache the compiled artifacts in `output_dir` and the result of a passing run."""
+        if result["status"] != "pass":
+            return
+        module_dir = self._module_dir(module_key(path, self.version))
+        for dirpath, _, filenames in os.walk(output_dir):
+            for name in filenames:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in ARTIFACT_PATTERNS):
+                    target = os.path.join(module_dir, os.path.relpath(dirpath, output_dir))
+                    os.makedirs(target, exist_ok=True)
+                    fd, staging = tempfile.mkstemp(dir=target)
+                    os.close(fd)
+                    shutil.copy2(os.path.join(dirpath, name), staging)
+                    # Renaming last means a half-written file is never used
+                    os.replace(staging, os.path.join(target, name))
+        result_path = self._result_path(source_key(path, self.version))
+        os.makedirs(os.path.dirname(result_path), exist_ok=True)
+        with open(result_path, "w") as f:
+            json.dump(result, f, indent=2)
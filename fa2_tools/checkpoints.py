@@ -0,0 +1,163 @@
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+# Alias the main template for FA2 contracts
+main = fa2.main
+
+
+@sp.module
+def checkpoints():
+    import main
+
+    balance_checkpoint: type = sp.record(level=sp.nat, balance=sp.nat)
+    supply_checkpoint: type = sp.record(level=sp.nat, supply=sp.nat)
+
+    class CheckpointedBalancesFungible(main.FungibleInterface, main.CommonInterface):
+        """(Mixin) Balance and supply history for `main.Fungible`.
+
+        Each change of a balance or a supply appends a (level, value)
+        checkpoint, and changes within the same level update the last
+        checkpoint instead. The `get_balance_at` and `total_supply_at` views
+        binary-search the checkpoints, so a snapshot at any level costs a
+        logarithmic number of big_map reads.
+
+        The contract must make every change to `ledger` and `supply` with
+        `update_balance_` and `update_supply_`. The value from before the
+        first change is kept as a checkpoint at level 0, so balances from
+        the initial storage are part of the history.
+        """
+
+        def __init__(self):
+            main.CommonInterface.__init__(self)
+            main.FungibleInterface.__init__(self)
+            self.data.balance_checkpoints = sp.cast(
+                sp.big_map(),
+                sp.big_map[sp.pair[sp.address, sp.pair[sp.nat, sp.nat]], balance_checkpoint],
+            )
+            self.data.balance_checkpoint_counts = sp.cast(
+                sp.big_map(), sp.big_map[sp.pair[sp.address, sp.nat], sp.nat]
+            )
+            self.data.supply_checkpoints = sp.cast(
+                sp.big_map(), sp.big_map[sp.pair[sp.nat, sp.nat], supply_checkpoint]
+            )
+            self.data.supply_checkpoint_counts = sp.cast(
+                sp.big_map(), sp.big_map[sp.nat, sp.nat]
+            )
+
+        @sp.private(with_storage="read-write")
+        def update_balance_(self, params):
+            """Set a balance, deleting its ledger key at zero, and checkpoint it.
+
+            An unchanged balance, such as after a transfer of 0 tokens, gets
+            no checkpoint and no write.
+            """
+            sp.cast(params, sp.record(owner=sp.address, token_id=sp.nat, balance=sp.nat))
+            key = (params.owner, params.token_id)
+            previous = self.data.ledger.get(key, default=0)
+            if previous != params.balance:
+                count = self.data.balance_checkpoint_counts.get(key, default=0)
+                if count == 0:
+                    if previous != 0:
+                        self.data.balance_checkpoints[(params.owner, (params.token_id, 0))] = sp.record(
+                            level=0, balance=previous
+                        )
+                        count = 1
+
+                # Merge the changes made within the same level
+                append = True
+                if count > 0:
+                    last = (params.owner, (params.token_id, sp.as_nat(count - 1)))
+                    if self.data.balance_checkpoints[last].level == sp.level:
+                        self.data.balance_checkpoints[last].balance = params.balance
+                        append = False
+                if append:
+                    self.data.balance_checkpoints[(params.owner, (params.token_id, count))] = sp.record(
+                        level=sp.level, balance=params.balance
+                    )
+                    count += 1
+                self.data.balance_checkpoint_counts[key] = count
+
+                if params.balance == 0:
+                    del self.data.ledger[key]
+                else:
+                    self.data.ledger[key] = params.balance
+
+        @sp.private(with_storage="read-write")
+        def update_supply_(self, params):
+            """Set a token's supply and checkpoint it, unless it's unchanged."""
+            sp.cast(params, sp.record(token_id=sp.nat, supply=sp.nat))
+            previous = self.data.supply.get(params.token_id, default=0)
+            if previous != params.supply:
+                count = self.data.supply_checkpoint_counts.get(params.token_id, default=0)
+                if count == 0:
+                    if previous != 0:
+                        self.data.supply_checkpoints[(params.token_id, 0)] = sp.record(
+                            level=0, supply=previous
+                        )
+                        count = 1
+
+                append = True
+                if count > 0:
+                    last = (params.token_id, sp.as_nat(count - 1))
+                    if self.data.supply_checkpoints[last].level == sp.level:
+                        self.data.supply_checkpoints[last].supply = params.supply
+                        append = False
+                if append:
+                    self.data.supply_checkpoints[(params.token_id, count)] = sp.record(
+                        level=sp.level, supply=params.supply
+                    )
+                    count += 1
+                self.data.supply_checkpoint_counts[params.token_id] = count
+
+                self.data.supply[params.token_id] = params.supply
+            else:
+                # A new token has a supply entry even at 0, for `supply_`
+                if not (params.token_id in self.data.supply):
+                    self.data.supply[params.token_id] = 0
+
+        @sp.onchain_view()
+        def get_balance_at(self, params):
+            """Return an account's balance of a token at the end of a level."""
+            sp.cast(params, sp.record(owner=sp.address, token_id=sp.nat, level=sp.nat))
+            key = (params.owner, params.token_id)
+            count = self.data.balance_checkpoint_counts.get(key, default=0)
+            # Without checkpoints, the balance never changed
+            result = self.data.ledger.get(key, default=0)
+            if count > 0:
+                # Find the first checkpoint after the level
+                low = 0
+                high = count
+                while low < high:
+                    middle = (low + high) >> 1
+                    if self.data.balance_checkpoints[(params.owner, (params.token_id, middle))].level <= params.level:
+                        low = middle + 1
+                    else:
+                        high = middle
+                result = 0
+                if low > 0:
+                    result = self.data.balance_checkpoints[
+                        (params.owner, (params.token_id, sp.as_nat(low - 1)))
+                    ].balance
+            return result
+
+        @sp.onchain_view()
+        def total_supply_at(self, params):
+            """Return a token's total supply at the end of a level."""
+            sp.cast(params, sp.record(token_id=sp.nat, level=sp.nat))
+            count = self.data.supply_checkpoint_counts.get(params.token_id, default=0)
+            result = self.data.supply.get(params.token_id, default=0)
+            if count > 0:
+                low = 0
+                high = count
+                while low < high:
+                    middle = (low + high) >> 1
+                    if self.data.supply_checkpoints[(params.token_id, middle)].level <= params.level:
+                        low = middle + 1
+                    else:
+                        high = middle
+                result = 0
+                if low > 0:
+                    result = self.data.supply_checkpoints[
+                        (params.token_id, sp.as_nat(low - 1))
+                    ].supply
+            return result
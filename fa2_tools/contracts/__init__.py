@@ -0,0 +1,94 @@
+"""The tutorial contracts, for scripts that deploy or check them.
+
+Each tutorial file defines its contract in its own `@sp.module`, next to
+its test scenario. Scripts can use the contracts without copying them:
+
+    from fa2_tools.contracts import fungible, nft
+
+    contract = fungible.MyFungibleContract(admin, sp.big_map(), ledger, token_metadata)
+
+- `fungible`: part 3 of the fungible tutorial
+- `convertible_fungible`: part 4 of the fungible tutorial, with `convert`
+- `nft`: the NFT tutorial (`create-nfts/contract/fa2-from-template.py`)
+- `open_mint_nft`: the NFT contract where anyone can mint
+  (`create-nfts/contract/pre-deployed-fa2-nft.py`)
+
+Each of them is the `my_module` of its tutorial file, loaded with
+`fa2_tools.bench.load_module` without running the file's tests, so the
+tutorial stays the only definition of the contract. The files are only
+loaded when a script first uses them, and only once per process, so
+importing this package costs nothing until then. All of the modules are
+named `my_module` in SmartPy, so an `@sp.module` can build on one of them
+at a time, with `import my_module` after `my_module = fungible`.
+
+Scripts that only need the compiled Michelson, such as deployment
+scripts, don't need SmartPy at all after the first run: `compiled` returns
+the `.tz` file of a contract from the compilation cache (`fa2_tools.cache`)
+and compiles all of the contracts once if the cache doesn't have them yet
+for this SmartPy version and these tutorial sources.
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PATHS = {
+    "fungible": os.path.join(ROOT, "smartpy_fa2_fungible", "part_3_complete.py"),
+    "convertible_fungible": os.path.join(ROOT, "smartpy_fa2_fungible", "part_4_complete.py"),
+    "nft": os.path.join(ROOT, "create-nfts", "contract", "fa2-from-template.py"),
+    "open_mint_nft": os.path.join(ROOT, "create-nfts", "contract", "pre-deployed-fa2-nft.py"),
+}
+# The name that `compiled` takes, and the module and class of each contract
+CONTRACTS = {
+    "MyFungibleContract": ("fungible", "MyFungibleContract"),
+    "MyConvertibleFungibleContract": ("convertible_fungible", "MyFungibleContract"),
+    "MyNFTContract": ("nft", "MyNFTContract"),
+    "MyOpenMintNFTContract": ("open_mint_nft", "MyNFTContract"),
+}
+
+_COMPILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_compile.py")
+
+
+def __getattr__(name):
+    if name in PATHS:
+        from fa2_tools.bench import load_module
+
+        # Later lookups find the module in the globals, so each file is loaded once
+        module = globals()[name] = load_module(PATHS[name])
+        return module
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def _compiled_paths(directory, name):
+    if directory is None:
+        return []
+    return sorted(glob.glob(os.path.join(directory, "**", name, "*_contract.tz"), recursive=True))
+
+
+def compiled(name, cache=None):
+    """Return the path of the compiled Michelson (`.tz`) of a contract."""
+    if name not in CONTRACTS:
+        raise ValueError("Unknown contract %r; use one of %s" % (name, ", ".join(sorted(CONTRACTS))))
+    from fa2_tools.cache import Cache
+    from fa2_tools.runner import output_dir_for, run_file
+
+    cache = cache or Cache()
+    paths = _compiled_paths(cache.lookup(_COMPILE_PATH), name)
+    if not paths:
+        # Nothing is cached yet, or `_compile.py` now originates another contract
+        output_root = tempfile.mkdtemp(prefix="fa2_contracts_")
+        try:
+            result = run_file(_COMPILE_PATH, output_root)
+            output_dir = output_dir_for(_COMPILE_PATH, output_root)
+            if result["status"] != "pass":
+                with open(os.path.join(output_dir, "output.log")) as f:
+                    raise RuntimeError("Compiling the tutorial contracts failed:\n" + f.read())
+            cache.store(_COMPILE_PATH, output_dir, result)
+        finally:
+            shutil.rmtree(output_root, ignore_errors=True)
+        paths = _compiled_paths(cache.lookup(_COMPILE_PATH), name)
+    if not paths:
+        raise RuntimeError("SmartPy didn't write the Michelson of %s" % name)
+    return paths[0]
@@ -0,0 +1,39 @@
+"""Originate each tutorial contract once so that SmartPy writes its Michelson.
+
+`fa2_tools.contracts.compiled` runs this file and keeps its output in the
+compilation cache. Each contract is originated in its own scenario, named
+after the contract, with an empty ledger.
+"""
+
+import smartpy as sp
+
+from fa2_tools import contracts
+
+ADMIN = sp.address("tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb")
+
+
+def _originate(name):
+    module_name, class_name = contracts.CONTRACTS[name]
+    module = getattr(contracts, module_name)
+    scenario = sp.test_scenario(name, module)
+    scenario += getattr(module, class_name)(ADMIN, sp.big_map(), {}, [])
+
+
+@sp.add_test()
+def test_fungible():
+    _originate("MyFungibleContract")
+
+
+@sp.add_test()
+def test_convertible_fungible():
+    _originate("MyConvertibleFungibleContract")
+
+
+@sp.add_test()
+def test_nft():
+    _originate("MyNFTContract")
+
+
+@sp.add_test()
+def test_open_mint_nft():
+    _originate("MyOpenMintNFTContract")
@@ -0,0 +1,286 @@
+"""Per-entrypoint gas and storage report for SmartPy scenarios.
+
+Run one or more scenario files and write a JSON table of what each
+contract call cost:
+
+    python -m fa2_tools.costs run smartpy_fa2_fungible/part_4_complete.py --output costs.json
+
+Compare a new table against a committed baseline and fail if an
+entrypoint got more expensive than the threshold allows:
+
+    python -m fa2_tools.costs compare costs_baseline.json costs.json --threshold 0.05
+
+Real Michelson costs only exist when the scenarios run in mockup
+simulation mode, where SmartPy injects each origination and call with
+`octez-client`, so `run` adds `--mode mockup` to `SMARTPY_FLAGS` while
+the scenarios run (`--mode native` leaves them in the interpreter). This
+module also puts a small wrapper named `octez-client` first on the PATH.
+The wrapper runs the real client and logs its receipt, and the report is
+built from those receipts.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import re
+import runpy
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+# Receipt fields, as printed by octez-client for applied operations
+_GAS_RE = re.compile(r"^\s*Consumed gas: ([0-9.]+)", re.MULTILINE)
+_STORAGE_SIZE_RE = re.compile(r"^\s*Storage size: (\d+) bytes", re.MULTILINE)
+_PAID_DIFF_RE = re.compile(r"^\s*Paid storage size diff: (\d+) bytes", re.MULTILINE)
+_ORIGINATED_RE = re.compile(r"^\s*Originated contracts:\s*\n\s*(KT1\w+)", re.MULTILINE)
+
+_WRAPPER = """#!{python}
+import json, subprocess, sys
+
+result = subprocess.run([{client!r}] + sys.argv[1:], capture_output=True, text=True)
+sys.stdout.write(result.stdout)
+sys.stderr.write(result.stderr)
+with open({log!r}, "a") as log:
+    log.write(json.dumps(dict(argv=sys.argv[1:], stdout=result.stdout, returncode=result.returncode)) + "\\n")
+sys.exit(result.returncode)
+"""
+
+
+def parse_receipt(text):
+    """Read the gas and storage figures from an octez-client operation receipt.
+
+    Gas and paid storage are summed over all the results in the receipt,
+    including internal operations. The storage size is the one reported
+    for the first contract in the receipt, which is the called contract.
+    """
+    gas = sum(float(value) for value in _GAS_RE.findall(text))
+    paid_storage_size_diff = sum(int(value) for value in _PAID_DIFF_RE.findall(text))
+    storage_sizes = _STORAGE_SIZE_RE.findall(text)
+    return dict(
+        gas=round(gas, 3),
+        storage_size=int(storage_sizes[0]) if storage_sizes else None,
+        paid_storage_size_diff=paid_storage_size_diff,
+    )
+
+
+def _option(argv, name, default=None):
+    if name in argv and argv.index(name) + 1 < len(argv):
+        return argv[argv.index(name) + 1]
+    return default
+
+
+def _contract_call(argv):
+    """Return (kind, contract, entrypoint) for an octez-client command line, or None."""
+    # Skip the global options, such as `--mode mockup --base-dir <dir>`
+    words = [word for word in argv if not word.startswith("-")]
+    if "originate" in words and "contract" in words:
+        return ("origination", words[words.index("contract") + 1], "origination")
+    if "transfer" in words and "to" in words:
+        return ("call", words[words.index("to") + 1], _option(argv, "--entrypoint", "default"))
+    if "call" in words and "from" in words:
+        return ("call", words[words.index("call") + 1], _option(argv, "--entrypoint", "default"))
+    return None
+
+
+def build_table(log_path):
+    """Turn a wrapper log into a table of costs keyed by scenario, step and entrypoint."""
+    scenarios = {}
+    rows = None
+    storage_sizes = {}
+    path = None
+    with open(log_path) as log:
+        for line in log:
+            entry = json.loads(line)
+            if "started" in entry:
+                continue
+            if "path" in entry:
+                # Several files reuse a scenario name, such as "fa2_lib_fungible"
+                path = entry["path"]
+                continue
+            if "scenario" in entry:
+                name = entry["scenario"] if path is None else "%s:%s" % (path, entry["scenario"])
+                rows = scenarios.setdefault(name, [])
+                storage_sizes = {}
+                continue
+            call = _contract_call(entry["argv"])
+            if call is None or rows is None or "--dry-run" in entry["argv"]:
+                continue
+            kind, contract, entrypoint = call
+            row = dict(step=len(rows) + 1, entrypoint=entrypoint, contract=contract)
+            if entry["returncode"] != 0:
+                # Failing calls (`_valid=False`) are never applied
+                row.update(status="failed", gas=None, storage_size=None,
+                           storage_size_diff=None, paid_storage_size_diff=None)
+                rows.append(row)
+                continue
+            costs = parse_receipt(entry["stdout"])
+            if kind == "origination":
+                originated = _ORIGINATED_RE.search(entry["stdout"])
+                if originated:
+                    row["contract"] = originated.group(1)
+            previous_size = storage_sizes.get(row["contract"], 0)
+            if costs["storage_size"] is not None:
+                storage_sizes[row["contract"]] = costs["storage_size"]
+                costs["storage_size_diff"] = costs["storage_size"] - previous_size
+            else:
+                costs["storage_size_diff"] = None
+            row.update(status="applied", **costs)
+            rows.append(row)
+    return dict(version=1, scenarios=scenarios)
+
+
+@contextlib.contextmanager
+def recording(log_path, client="octez-client", mode="mockup"):
+    """Record the octez-client calls made by the scenarios run inside this block.
+
+    The scenarios run in the SmartPy simulation `mode`; only "mockup"
+    calls octez-client. Each `sp.test_scenario` call writes a marker to
+    the log, so that the calls that follow it are attributed to that
+    scenario.
+    """
+    # Only running scenarios needs SmartPy; comparing tables does not
+    import smartpy as sp
+
+    real_client = shutil.which(client)
+    if real_client is None:
+        raise RuntimeError("Cannot find %s; install Octez to measure costs" % client)
+    wrapper_dir = tempfile.mkdtemp(prefix="fa2_costs_")
+    wrapper = os.path.join(wrapper_dir, "octez-client")
+    with open(wrapper, "w") as f:
+        f.write(_WRAPPER.format(python=sys.executable, client=real_client, log=os.path.abspath(log_path)))
+    os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IEXEC)
+
+    test_scenario = sp.test_scenario
+
+    def recording_test_scenario(name, *args, **kwargs):
+        with open(log_path, "a") as log:
+            log.write(json.dumps(dict(scenario=name)) + "\n")
+        return test_scenario(name, *args, **kwargs)
+
+    path = os.environ.get("PATH", "")
+    flags = os.environ.get("SMARTPY_FLAGS")
+    os.environ["PATH"] = wrapper_dir + os.pathsep + path
+    # `sp.test_scenario` reads the flags each time it creates a scenario
+    os.environ["SMARTPY_FLAGS"] = " ".join(filter(None, [flags, "--mode", mode]))
+    sp.test_scenario = recording_test_scenario
+    try:
+        yield
+    finally:
+        sp.test_scenario = test_scenario
+        os.environ["PATH"] = path
+        if flags is None:
+            del os.environ["SMARTPY_FLAGS"]
+        else:
+            os.environ["SMARTPY_FLAGS"] = flags
+        shutil.rmtree(wrapper_dir, ignore_errors=True)
+
+
+def measure(paths, client="octez-client", log_path=None, mode="mockup"):
+    """Run the scenario files in the simulation `mode` and return their cost table.
+
+    The client calls and their receipts are kept in `log_path` if given,
+    for example for `fa2_tools.indexer`.
+    """
+    with tempfile.TemporaryDirectory(prefix="fa2_costs_") as tmp:
+        log_path = log_path or os.path.join(tmp, "calls.jsonl")
+        with open(log_path, "w") as log:
+            # A new first line tells readers such as `fa2_tools.indexer` that the log was written again
+            log.write(json.dumps(dict(started=time.time())) + "\n")
+        with recording(log_path, client=client, mode=mode):
+            for path in paths:
+                with open(log_path, "a") as log:
+                    log.write(json.dumps(dict(path=os.path.relpath(path))) + "\n")
+                runpy.run_path(path, run_name="__main__")
+        return build_table(log_path)
+
+
+def _by_occurrence(rows):
+    """Key the rows of a scenario by entrypoint and by how many calls to it came before."""
+    counts = {}
+    keyed = {}
+    for row in rows:
+        occurrence = counts.get(row["entrypoint"], 0)
+        counts[row["entrypoint"]] = occurrence + 1
+        keyed[(row["entrypoint"], occurrence)] = row
+    return keyed
+
+
+def compare(baseline, current, threshold=0.05):
+    """List the entrypoint costs in `current` that regressed against `baseline`.
+
+    Steps are matched by scenario, entrypoint and occurrence (the first,
+    second, ... call to that entrypoint in the scenario), so adding a step
+    only shifts the steps of its own entrypoint. A cost regresses when it
+    grows by more than `threshold` (a fraction) of its baseline value.
+    Steps that are missing from either table are ignored.
+    """
+    regressions = []
+    for scenario, rows in current["scenarios"].items():
+        baseline_rows = _by_occurrence(baseline["scenarios"].get(scenario, []))
+        for key, row in _by_occurrence(rows).items():
+            before = baseline_rows.get(key)
+            if before is None or row["status"] != "applied" or before["status"] != "applied":
+                continue
+            for field in ("gas", "paid_storage_size_diff", "storage_size_diff"):
+                old, new = before[field], row[field]
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + threshold):
+                    regressions.append(dict(
+                        scenario=scenario, step=row["step"], entrypoint=row["entrypoint"],
+                        occurrence=key[1], field=field, baseline=old, current=new,
+                    ))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run scenario files and write their cost table")
+    run.add_argument("paths", nargs="+")
+    run.add_argument("--output", default="costs.json")
+    run.add_argument("--client", default="octez-client")
+    run.add_argument("--log", help="Keep the client calls and their receipts in this JSON Lines file")
+    run.add_argument("--mode", choices=["mockup", "native"], default="mockup",
+                     help="SmartPy simulation mode; only mockup records costs")
+    run.add_argument("--baseline", help="Also compare the new table against this baseline")
+    run.add_argument("--threshold", type=float, default=0.05)
+
+    cmp = commands.add_parser("compare", help="Compare a cost table against a baseline")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.05)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        table = measure(args.paths, client=args.client, log_path=args.log, mode=args.mode)
+        if not any(table["scenarios"].values()):
+            print("No contract calls were recorded; the scenarios need names and --mode mockup")
+        with open(args.output, "w") as f:
+            json.dump(table, f, indent=2)
+        if not args.baseline:
+            return 0
+        current = table
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+
+    regressions = compare(baseline, current, threshold=args.threshold)
+    for r in regressions:
+        print("%(scenario)s step %(step)s %(entrypoint)s: %(field)s %(baseline)s -> %(current)s" % r)
+    if regressions:
+        print("%d cost regression(s) above %.1f%%" % (len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
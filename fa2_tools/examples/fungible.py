@@ -0,0 +1,1088 @@
+"""Part 4's `MyFungibleContract` with the `fa2_tools` contract extensions.
+
+The tutorial files stay self-contained, so that they run on their own and
+in the SmartPy IDE. This example loads `MyFungibleContract` from
+`smartpy_fa2_fungible/part_4_complete.py` and extends it with the mixins
+of this package:
+
+- the batched `get_balances` and `total_supplies` views (`views.py`)
+- operators for all of an owner's tokens (`operators.py`)
+- permits for relayed transfers (`permits.py`)
+- Merkle airdrop claims (`airdrop.py`)
+- balance and supply checkpoints (`checkpoints.py`), with the ledger keys
+  of drained balances deleted and `collect_zero_balances` for the zero
+  entries left in older storage
+
+Run it from the repository root with `fa2_tools` on `PYTHONPATH`:
+
+    PYTHONPATH=. python fa2_tools/examples/fungible.py
+"""
+
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+from fa2_tools.airdrop import airdrop
+from fa2_tools.bench import FUNGIBLE_PATH, load_module
+from fa2_tools.checkpoints import checkpoints
+from fa2_tools.ipfs import pin_on_ipfs
+from fa2_tools.merkle import build_small, claim_param
+from fa2_tools.operators import all_tokens_operators
+from fa2_tools.permits import permits, sign_permit
+from fa2_tools.trace import phase
+from fa2_tools.views import batch_views, get_balances, total_supplies, verify_balances
+
+# Alias the main template for FA2 contracts
+main = fa2.main
+
+# The tutorial contract that this example extends
+my_module = load_module(FUNGIBLE_PATH)
+
+
+@sp.module
+def extended():
+    import main
+    import my_module
+    import batch_views
+    import all_tokens_operators
+    import permits
+    import airdrop
+    import checkpoints
+
+    burn_batch: type = sp.list[
+        sp.record(
+            from_ = sp.address,
+            token_id = sp.nat,
+            amount = sp.nat,
+        ).layout(("from_", ("token_id", "amount")))
+    ]
+
+    mint_batch: type = sp.list[
+        sp.record(
+            to_ = sp.address,
+            token = sp.variant(new=sp.map[sp.string, sp.bytes], existing=sp.nat),
+            amount = sp.nat,
+        ).layout(("to_", ("token", "amount")))
+    ]
+
+    # Order of inheritance: [<policy>], <tutorial contract>, [<other mixins>].
+    class MyExtendedFungibleContract(
+        all_tokens_operators.AllTokensOperatorTransfer,
+        my_module.MyFungibleContract,
+        batch_views.OnchainviewBatchBalancesFungible,
+        permits.Permits,
+        airdrop.MerkleAirdropFungible,
+        checkpoints.CheckpointedBalancesFungible,
+    ):
+        def __init__(self, admin_address, contract_metadata, ledger, token_metadata):
+
+            # Initialize the balance and supply history
+            checkpoints.CheckpointedBalancesFungible.__init__(self)
+
+            # Initialize airdrop claims, with no airdrop until the admin sets a root
+            airdrop.MerkleAirdropFungible.__init__(self, sp.bytes("0x"))
+
+            # Initialize permits for relayed transfers
+            permits.Permits.__init__(self)
+
+            # Initialize the batched balance and supply views
+            batch_views.OnchainviewBatchBalancesFungible.__init__(self)
+
+            # Initialize the tutorial contract
+            my_module.MyFungibleContract.__init__(
+                self, admin_address, contract_metadata, ledger, token_metadata
+            )
+
+            # Initialize the transfer policy, with operator approvals for all tokens
+            all_tokens_operators.AllTokensOperatorTransfer.__init__(self)
+
+        # Transfer tokens, with the same checks and errors as the FA2 template,
+        # but reading and writing each ledger key only once per batch
+        @sp.entrypoint
+        def transfer(self, batch):
+            sp.cast(batch, my_module.transfer_batch)
+
+            # Verify that transfers are allowed
+            assert self.private.policy.supports_transfer, "FA2_TX_DENIED"
+
+            # Running balances of every (address, token_id) the batch touches
+            balances = sp.cast({}, sp.map[sp.pair[sp.address, sp.nat], sp.nat])
+            # Tokens and (from_, token_id) pairs that passed their checks
+            defined = sp.cast(sp.set(), sp.set[sp.nat])
+            allowed = sp.cast(sp.set(), sp.set[sp.pair[sp.address, sp.nat]])
+
+            for transfer in batch:
+                # Whether the owner's permit for this transfer item was used
+                permitted = False
+
+                for tx in transfer.txs:
+                    from_ = (transfer.from_, tx.token_id)
+                    to_ = (tx.to_, tx.token_id)
+
+                    # Verify that the token exists
+                    if not (tx.token_id in defined):
+                        assert self.is_defined_(tx.token_id), "FA2_TOKEN_UNDEFINED"
+                        defined.add(tx.token_id)
+
+                    # Verify that the sender is the owner or an operator,
+                    # for all tokens or for this one, or else use the
+                    # owner's permit, which authorizes the whole item once
+                    if not permitted and not (from_ in allowed):
+                        if (sp.sender == transfer.from_) or self.is_operator_(
+                            sp.record(owner=transfer.from_, operator=sp.sender, token_id=tx.token_id)
+                        ):
+                            allowed.add(from_)
+                        else:
+                            permitted = self.use_permit_(transfer)
+                            assert permitted, "FA2_NOT_OPERATOR"
+
+                    # Move the tokens between the running balances
+                    # Checking each tx keeps the template's semantics: the batch
+                    # fails at the first tx that overdraws its sender, and tokens
+                    # received earlier in the batch can be sent on.
+                    # Like in the template, transfers of 0 tokens touch no balance.
+                    if tx.amount > 0:
+                        if not (from_ in balances):
+                            balances[from_] = self.data.ledger.get(from_, default=0)
+                        balances[from_] = sp.as_nat(
+                            balances[from_] - tx.amount,
+                            error="FA2_INSUFFICIENT_BALANCE",
+                        )
+                        if not (to_ in balances):
+                            balances[to_] = self.data.ledger.get(to_, default=0)
+                        balances[to_] += tx.amount
+
+            # Write and checkpoint each ledger key once, deleting the keys of
+            # drained balances
+            for item in balances.items():
+                self.update_balance_(
+                    sp.record(owner=sp.fst(item.key), token_id=sp.snd(item.key), balance=item.value)
+                )
+
+        # Burn tokens, with the same checks and errors as the FA2 template,
+        # but deleting the ledger keys of drained balances
+        @sp.entrypoint
+        def burn(self, batch):
+            sp.cast(batch, burn_batch)
+
+            # Verify that transfers are allowed
+            assert self.private.policy.supports_transfer, "FA2_TX_DENIED"
+
+            for action in batch:
+                # Verify that the token exists
+                assert self.is_defined_(action.token_id), "FA2_TOKEN_UNDEFINED"
+
+                # Verify that the transfer policy allows the sender to burn
+                self.check_tx_transfer_permissions_(
+                    sp.record(from_=action.from_, to_=action.from_, token_id=action.token_id)
+                )
+
+                # Burn the tokens; a missing ledger key is a zero balance
+                balance = sp.as_nat(
+                    self.data.ledger.get((action.from_, action.token_id), default=0) - action.amount,
+                    error="FA2_INSUFFICIENT_BALANCE",
+                )
+                self.update_balance_(
+                    sp.record(owner=action.from_, token_id=action.token_id, balance=balance)
+                )
+
+                is_supply = sp.is_nat(
+                    self.data.supply.get(action.token_id, default=0) - action.amount
+                )
+                match(is_supply):
+                    case Some(supply):
+                        self.update_supply_(sp.record(token_id=action.token_id, supply=supply))
+                    case None:
+                        self.update_supply_(sp.record(token_id=action.token_id, supply=0))
+
+        # Mint tokens, with the same checks and errors as the FA2 template,
+        # but checkpointing the balances and supplies
+        @sp.entrypoint
+        def mint(self, batch):
+            sp.cast(batch, mint_batch)
+            assert self.is_administrator_(), "FA2_NOT_ADMIN"
+            for action in batch:
+                match action.token:
+                    case new(metadata):
+                        token_id = self.data.next_token_id
+                        self.data.token_metadata[token_id] = sp.record(
+                            token_id=token_id, token_info=metadata
+                        )
+                        self.update_supply_(sp.record(token_id=token_id, supply=action.amount))
+                        self.update_balance_(
+                            sp.record(owner=action.to_, token_id=token_id, balance=action.amount)
+                        )
+                        self.data.next_token_id += 1
+                    case existing(token_id):
+                        assert self.is_defined_(token_id), "FA2_TOKEN_UNDEFINED"
+                        self.update_supply_(
+                            sp.record(
+                                token_id=token_id,
+                                supply=self.data.supply.get(token_id, default=0) + action.amount,
+                            )
+                        )
+                        self.update_balance_(
+                            sp.record(
+                                owner=action.to_,
+                                token_id=token_id,
+                                balance=self.data.ledger.get((action.to_, token_id), default=0) + action.amount,
+                            )
+                        )
+
+        # Claim airdropped tokens, checkpointing the balances and supplies
+        @sp.entrypoint
+        def claim(self, claims):
+            sp.cast(claims, airdrop.claim_param)
+            for claim in claims:
+                assert self.is_defined_(claim.token_id), "FA2_TOKEN_UNDEFINED"
+                self.check_claim_(claim)
+                self.update_balance_(
+                    sp.record(
+                        owner=claim.to_,
+                        token_id=claim.token_id,
+                        balance=self.data.ledger.get((claim.to_, claim.token_id), default=0) + claim.amount,
+                    )
+                )
+                self.update_supply_(
+                    sp.record(
+                        token_id=claim.token_id,
+                        supply=self.data.supply.get(claim.token_id, default=0) + claim.amount,
+                    )
+                )
+
+        # Delete ledger keys whose balance is zero, such as the ones left
+        # before drained balances were deleted. Anyone can call it: keys with
+        # a balance and missing keys are skipped.
+        @sp.entrypoint
+        def collect_zero_balances(self, keys):
+            sp.cast(keys, sp.list[sp.pair[sp.address, sp.nat]])
+            for key in keys:
+                if self.data.ledger.get(key, default=1) == 0:
+                    del self.data.ledger[key]
+
+        # Convert one token into another, like the tutorial contract, but
+        # checkpointing the balances and supplies
+        @sp.entrypoint
+        def convert(self, batch):
+            sp.cast(batch, my_module.conversion_batch)
+
+            # Verify that transfers are allowed
+            assert self.private.policy.supports_transfer, "FA2_TX_DENIED"
+
+            # Net the batch in memory before touching the big maps.
+            # Each token is checked and read from the ledger and supply only
+            # the first time it appears, and each ledger key and supply entry
+            # is written back once at the end.
+            balances = sp.cast({}, sp.map[sp.nat, sp.nat])
+            supplies = sp.cast({}, sp.map[sp.nat, sp.nat])
+
+            for conversion in batch:
+
+                record(source_token_id, target_token_id, amount).match = conversion
+
+                # Verify that the source and target tokens exist and load them
+                if not (source_token_id in balances):
+                    assert self.is_defined_(source_token_id), "FA2_TOKEN_UNDEFINED"
+                    balances[source_token_id] = self.data.ledger.get(
+                        (sp.sender, source_token_id), default=0
+                    )
+                    supplies[source_token_id] = self.data.supply.get(
+                        source_token_id, default=0
+                    )
+                if not (target_token_id in balances):
+                    assert self.is_defined_(target_token_id), "FA2_TOKEN_UNDEFINED"
+                    balances[target_token_id] = self.data.ledger.get(
+                        (sp.sender, target_token_id), default=0
+                    )
+                    supplies[target_token_id] = self.data.supply.get(
+                        target_token_id, default=0
+                    )
+
+                # Burn the source tokens
+                # Checking the running balance keeps the per-entry semantics:
+                # the batch fails at the first entry that overdraws the sender
+                balances[source_token_id] = sp.as_nat(
+                    balances[source_token_id] - amount,
+                    error="FA2_INSUFFICIENT_BALANCE",
+                )
+                is_supply = sp.is_nat(supplies[source_token_id] - amount)
+                match(is_supply):
+                    case Some(supply):
+                        supplies[source_token_id] = supply
+                    case None:
+                        supplies[source_token_id] = 0
+
+                # Mint the target tokens
+                balances[target_token_id] += amount
+                supplies[target_token_id] += amount
+
+            # Write and checkpoint each (sender, token_id) ledger key and
+            # supply entry once, deleting the keys of drained balances
+            for item in balances.items():
+                self.update_balance_(
+                    sp.record(owner=sp.sender, token_id=item.key, balance=item.value)
+                )
+                self.update_supply_(sp.record(token_id=item.key, supply=supplies[item.key]))
+
+
+def _get_balance(fa2_contract, args):
+    """Utility function to call the contract's get_balance view to get an account's token balance."""
+    return sp.View(fa2_contract, "get_balance")(args)
+
+
+def _total_supply(fa2_contract, args):
+    """Utility function to call the contract's total_supply view to get the total amount of tokens."""
+    return sp.View(fa2_contract, "total_supply")(args)
+
+
+@sp.add_test()
+def test():
+    # Create and configure the test scenario
+    scenario = sp.test_scenario("fa2_extended_fungible", extended)
+
+    # Define test accounts
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+
+    # Define initial token metadata
+    tok0_md = fa2.make_metadata(name="Token Zero", decimals=0, symbol="Tok0")
+    tok1_md = fa2.make_metadata(name="Token One", decimals=0, symbol="Tok1")
+
+    # Define tokens and initial owners
+    initial_ledger = {
+        (alice.address, 0): 10,
+        (bob.address, 1): 10,
+    }
+
+    # Instantiate the FA2 fungible token contract
+    contract = extended.MyExtendedFungibleContract(admin.address, sp.big_map(), initial_ledger, [tok0_md, tok1_md])
+
+    # Build contract metadata content
+    with phase("metadata"):
+        contract_metadata = sp.create_tzip16_metadata(
+            name="My extended FA2 fungible token contract",
+            description="This is an FA2 fungible token contract using SmartPy.",
+            version="1.0.0",
+            license_name="CC-BY-SA",
+            license_details="Creative Commons Attribution Share Alike license 4.0 https://creativecommons.org/licenses/by/4.0/",
+            interfaces=["TZIP-012", "TZIP-016"],
+            authors=["SmartPy <https://smartpy.tezos.com>"],
+            homepage="https://smartpy.io/ide?template=fa2_lib_fungible.py",
+            # Optionally, upload the source code to IPFS and add the URI here
+            source_uri=None,
+            offchain_views=contract.get_offchain_views(),
+        )
+
+    # Add the info specific to FA2 permissions
+    contract_metadata["permissions"] = {
+        # The operator policy chosen:
+        # owner-or-operator-transfer is the default.
+        "operator": "owner-or-operator-transfer",
+        # Those two options should always have these values.
+        # It means that the contract doesn't use the hook mechanism.
+        "receiver": "owner-no-hook",
+        "sender": "owner-no-hook",
+    }
+
+    # Get the IPFS URI of the metadata
+    # By default, the URI is computed locally and the metadata is stored in .fa2_ipfs/
+    # To upload the metadata to IPFS through Pinata, set FA2_IPFS_BACKEND=pinata
+    # TODO: Add your Pinata API key and secret
+    # Or put them in the PINATA_KEY and PINATA_SECRET environment variables
+    metadata_uri = pin_on_ipfs(contract_metadata, api_key=None, secret_key=None)
+
+    # Create the metadata big map based on the IPFS URI
+    contract_metadata = sp.scenario_utils.metadata_of_url(metadata_uri)
+
+    # Update the scenario instance with the new metadata
+    contract.data.metadata = contract_metadata
+
+    # Originate the contract in the test scenario
+    scenario += contract
+
+    scenario.h2("Verify the initial owners of the tokens")
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=0)) == 10
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=0)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=1)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=1)) == 10
+    )
+    scenario.verify(_total_supply(contract, sp.record(token_id=0)) == 10)
+    scenario.verify(_total_supply(contract, sp.record(token_id=1)) == 10)
+
+    scenario.h2("Verify the initial owners with the batched views")
+    requests = [
+        sp.record(owner=alice.address, token_id=0),
+        sp.record(owner=bob.address, token_id=0),
+        sp.record(owner=alice.address, token_id=1),
+        sp.record(owner=bob.address, token_id=1),
+    ]
+    scenario.verify_equal(
+        get_balances(contract, requests),
+        [
+            sp.record(request=requests[0], balance=10),
+            sp.record(request=requests[1], balance=0),
+            sp.record(request=requests[2], balance=0),
+            sp.record(request=requests[3], balance=10),
+        ],
+    )
+    scenario.verify_equal(
+        total_supplies(contract, [1, 0]),
+        [
+            sp.record(token_id=1, total_supply=10),
+            sp.record(token_id=0, total_supply=10),
+        ],
+    )
+
+    scenario.h2("Transfer tokens")
+    # Bob sends 3 of token 1 to Alice
+    contract.transfer(
+        [
+            sp.record(
+                from_=bob.address,
+                txs=[sp.record(to_=alice.address, amount=3, token_id=1)],
+            ),
+        ],
+        _sender=bob,
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 10,
+            (bob, 0): 0,
+            (alice, 1): 3,
+            (bob, 1): 7,
+        },
+        supplies={0: 10, 1: 10},
+    )
+
+    # Alice sends 4 of token 0 to Bob
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=4, token_id=0)],
+            ),
+        ],
+        _sender=alice,
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 6,
+            (bob, 0): 4,
+            (alice, 1): 3,
+            (bob, 1): 7,
+        },
+        supplies={0: 10, 1: 10},
+    )
+
+    # Bob cannot transfer Alice's tokens
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+    )
+
+    scenario.h2("Mint tokens")
+
+    # Mint more of an existing token
+    contract.mint(
+        [
+            sp.record(to_=alice.address, amount=4, token=sp.variant("existing", 0)),
+            sp.record(to_=bob.address, amount=4, token=sp.variant("existing", 1)),
+        ],
+        _sender=admin,
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 10,
+            (bob, 0): 4,
+            (alice, 1): 3,
+            (bob, 1): 11,
+        },
+        supplies={0: 14, 1: 14},
+    )
+
+    # Other users can't mint tokens
+    contract.mint(
+        [
+            sp.record(to_=alice.address, amount=4, token=sp.variant("existing", 0)),
+        ],
+        _sender=alice,
+        _valid=False
+    )
+
+    # Create a token type
+    tok2_md = fa2.make_metadata(name="Token Two", decimals=0, symbol="Tok2")
+    contract.mint(
+        [
+            sp.record(to_=alice.address, amount=5, token=sp.variant("new", tok2_md)),
+        ],
+        _sender=admin,
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=2)) == 5
+    )
+
+    scenario.h2("Burn tokens")
+    # Verify that you can burn your own token
+    contract.burn([sp.record(token_id=2, from_=alice.address, amount=1)], _sender=alice)
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=2)) == 4
+    )
+    # Verify that you can't burn someone else's token
+    contract.burn(
+        [sp.record(token_id=2, from_=alice.address, amount=1)],
+        _sender=bob,
+        _valid=False,
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=2)) == 4
+    )
+    scenario.verify(
+        _total_supply(contract, sp.record(token_id=2)) == 4
+    )
+
+    scenario.h2("Convert tokens")
+
+    # Verify that you can convert your own tokens
+    conversions = [
+        sp.record(source_token_id = 0, target_token_id = 1, amount = 2),
+    ]
+    contract.convert(
+        conversions,
+        _sender=alice
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 8,
+            (alice, 1): 5,
+        },
+        supplies={0: 12, 1: 16},
+    )
+
+    # Verify that a batch that repeats the same pair is netted correctly
+    conversions = [
+        sp.record(source_token_id = 0, target_token_id = 1, amount = 1),
+        sp.record(source_token_id = 0, target_token_id = 1, amount = 2),
+        sp.record(source_token_id = 1, target_token_id = 2, amount = 4),
+    ]
+    contract.convert(
+        conversions,
+        _sender=alice
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 5,
+            (alice, 1): 4,
+            (alice, 2): 8,
+        },
+        supplies={0: 9, 1: 15, 2: 8},
+    )
+
+    # Verify that a batch fails if any entry overdraws the sender,
+    # even if a later entry in the batch would cover the balance
+    conversions = [
+        sp.record(source_token_id = 2, target_token_id = 0, amount = 9),
+        sp.record(source_token_id = 0, target_token_id = 2, amount = 9),
+    ]
+    contract.convert(
+        conversions,
+        _sender=alice,
+        _valid=False,
+        _exception="FA2_INSUFFICIENT_BALANCE",
+    )
+
+    # Verify that you can't convert to a token that doesn't exist
+    conversions = [
+        sp.record(source_token_id = 0, target_token_id = 3, amount = 1),
+    ]
+    contract.convert(
+        conversions,
+        _sender=alice,
+        _valid=False,
+        _exception="FA2_TOKEN_UNDEFINED",
+    )
+
+    scenario.h2("Transfer batches")
+
+    # Bob lets Alice transfer his token 1
+    contract.update_operators(
+        [
+            sp.variant(
+                "add_operator",
+                sp.record(owner=bob.address, operator=alice.address, token_id=1),
+            ),
+        ],
+        _sender=bob,
+    )
+
+    # Verify that a batch that repeats senders, recipients and tokens is
+    # aggregated correctly, including tokens received earlier in the batch
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=bob.address, amount=1, token_id=0),
+                    sp.record(to_=bob.address, amount=1, token_id=0),
+                    sp.record(to_=bob.address, amount=2, token_id=2),
+                ],
+            ),
+            sp.record(
+                from_=bob.address,
+                txs=[
+                    sp.record(to_=alice.address, amount=3, token_id=1),
+                    sp.record(to_=alice.address, amount=3, token_id=1),
+                ],
+            ),
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=1, token_id=1)],
+            ),
+        ],
+        _sender=alice,
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 3,
+            (bob, 0): 6,
+            (alice, 1): 9,
+            (bob, 1): 6,
+            (alice, 2): 6,
+            (bob, 2): 2,
+        },
+        supplies={0: 9, 1: 15, 2: 8},
+    )
+
+    # Verify that an operator can't transfer tokens it wasn't approved for
+    contract.transfer(
+        [
+            sp.record(
+                from_=bob.address,
+                txs=[sp.record(to_=alice.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=alice,
+        _valid=False,
+        _exception="FA2_NOT_OPERATOR",
+    )
+
+    # Verify that a batch fails if its txs together overdraw the sender
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=bob.address, amount=2, token_id=0),
+                    sp.record(to_=bob.address, amount=2, token_id=0),
+                ],
+            ),
+        ],
+        _sender=alice,
+        _valid=False,
+        _exception="FA2_INSUFFICIENT_BALANCE",
+    )
+
+    # Verify that you can't transfer a token that doesn't exist
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=0, token_id=3)],
+            ),
+        ],
+        _sender=alice,
+        _valid=False,
+        _exception="FA2_TOKEN_UNDEFINED",
+    )
+
+    scenario.h2("Approve an operator for all tokens")
+
+    # Verify that only the owner can approve operators for its tokens
+    contract.update_all_tokens_operators(
+        [
+            sp.variant(
+                "add_all_tokens_operator",
+                sp.record(owner=alice.address, operator=bob.address),
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+        _exception="FA2_NOT_OWNER",
+    )
+
+    # Alice lets Bob transfer all of her tokens
+    contract.update_all_tokens_operators(
+        [
+            sp.variant(
+                "add_all_tokens_operator",
+                sp.record(owner=alice.address, operator=bob.address),
+            ),
+        ],
+        _sender=alice,
+    )
+    scenario.verify(
+        sp.View(contract, "is_all_tokens_operator")(
+            sp.record(owner=alice.address, operator=bob.address)
+        )
+    )
+
+    # Bob transfers several of Alice's tokens without per-token approvals
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=bob.address, amount=1, token_id=0),
+                    sp.record(to_=bob.address, amount=1, token_id=1),
+                    sp.record(to_=bob.address, amount=1, token_id=2),
+                ],
+            ),
+        ],
+        _sender=bob,
+    )
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (alice, 0): 2,
+            (bob, 0): 7,
+            (alice, 1): 8,
+            (bob, 1): 7,
+            (alice, 2): 5,
+            (bob, 2): 3,
+        },
+    )
+
+    # Once Alice removes the approval, Bob can't transfer her tokens
+    contract.update_all_tokens_operators(
+        [
+            sp.variant(
+                "remove_all_tokens_operator",
+                sp.record(owner=alice.address, operator=bob.address),
+            ),
+        ],
+        _sender=alice,
+    )
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+        _exception="FA2_NOT_OPERATOR",
+    )
+
+    relayer = sp.test_account("Relayer")
+
+    # Permits are signed with the test accounts' keys and checked against
+    # the scenario's timestamps, which mockup mode doesn't support
+    if scenario.simulation_mode() is not sp.SimulationMode.MOCKUP:
+        scenario.h2("Relay transfers with permits")
+        expiry = sp.timestamp(3600)
+
+        # Alice and Bob sign permits off-chain, and the relayer registers both
+        # permits in one call and settles both transfers in another
+        alice_permit, alice_transfer = sign_permit(
+            alice, contract, 0, [(bob.address, 0, 1), (bob.address, 2, 2)], expiry
+        )
+        bob_permit, bob_transfer = sign_permit(
+            bob, contract, 0, [(alice.address, 1, 3)], expiry
+        )
+        contract.permit([alice_permit, bob_permit], _sender=relayer, _now=sp.timestamp(10))
+        contract.transfer([alice_transfer, bob_transfer], _sender=relayer, _now=sp.timestamp(20))
+        verify_balances(
+            scenario,
+            contract,
+            balances={
+                (alice, 0): 1,
+                (bob, 0): 8,
+                (alice, 1): 11,
+                (bob, 1): 4,
+                (alice, 2): 3,
+                (bob, 2): 5,
+            },
+        )
+        scenario.verify(sp.View(contract, "permit_nonce")(alice.address) == 1)
+
+        # Verify that a permit can't be registered twice or used twice
+        contract.permit([alice_permit], _sender=relayer, _now=sp.timestamp(30), _valid=False)
+        contract.transfer(
+            [alice_transfer],
+            _sender=relayer,
+            _now=sp.timestamp(30),
+            _valid=False,
+            _exception="FA2_NOT_OPERATOR",
+        )
+
+        # Verify that a permit signed by someone else is rejected
+        forged_permit, _ = sign_permit(alice, contract, 0, [(bob.address, 1, 1)], expiry)
+        contract.permit(
+            [sp.record(
+                public_key=bob.public_key,
+                signature=forged_permit.signature,
+                transfer_hash=forged_permit.transfer_hash,
+                expiry=forged_permit.expiry,
+            )],
+            _sender=relayer,
+            _now=sp.timestamp(30),
+            _valid=False,
+            _exception="MISSING_SIGNED",
+        )
+
+        # Verify that a permit signed for the contract on another chain is rejected
+        other_chain_permit, _ = sign_permit(
+            alice, contract, 1, [(bob.address, 1, 1)], expiry, chain_id=sp.chain_id_cst("0x7a06a770")
+        )
+        contract.permit(
+            [other_chain_permit],
+            _sender=relayer,
+            _now=sp.timestamp(30),
+            _valid=False,
+            _exception="MISSING_SIGNED",
+        )
+
+        # Verify that an expired permit can't be used
+        alice_permit, alice_transfer = sign_permit(
+            alice, contract, 1, [(bob.address, 1, 1)], sp.timestamp(100)
+        )
+        contract.permit([alice_permit], _sender=relayer, _now=sp.timestamp(50))
+        contract.transfer(
+            [alice_transfer],
+            _sender=relayer,
+            _now=sp.timestamp(200),
+            _valid=False,
+            _exception="EXPIRED_PERMIT",
+        )
+
+        # Verify that an expired permit can be replaced with a new one, and that
+        # the owner's own transfer of the same item doesn't use the permit up
+        alice_permit, alice_transfer = sign_permit(
+            alice, contract, 2, [(bob.address, 1, 1)], sp.timestamp(1000)
+        )
+        contract.permit([alice_permit], _sender=relayer, _now=sp.timestamp(200))
+        contract.transfer([alice_transfer], _sender=alice, _now=sp.timestamp(300))
+        contract.transfer([alice_transfer], _sender=relayer, _now=sp.timestamp(300))
+        verify_balances(scenario, contract, balances={(alice, 1): 9, (bob, 1): 6})
+        scenario.verify(sp.View(contract, "permit_nonce")(alice.address) == 3)
+
+        # Send the relayed tokens back, so that the next steps start from
+        # the same balances in every simulation mode
+        contract.transfer(
+            [
+                sp.record(
+                    from_=alice.address,
+                    txs=[sp.record(to_=bob.address, amount=3, token_id=1)],
+                ),
+            ],
+            _sender=alice,
+        )
+        contract.transfer(
+            [
+                sp.record(
+                    from_=bob.address,
+                    txs=[
+                        sp.record(to_=alice.address, amount=1, token_id=0),
+                        sp.record(to_=alice.address, amount=2, token_id=1),
+                        sp.record(to_=alice.address, amount=2, token_id=2),
+                    ],
+                ),
+            ],
+            _sender=bob,
+        )
+
+    scenario.h2("Claim an airdrop")
+    carol = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+    dave = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+
+    # Build the Merkle tree of the allocations offline and store its root
+    root, entries = build_small(
+        [(carol, 0, 5), (dave, 1, 7), (dave, 0, 3)]
+    )
+    contract.set_airdrop_root(sp.bytes("0x" + root), _sender=alice, _valid=False)
+    contract.set_airdrop_root(sp.bytes("0x" + root), _sender=admin)
+
+    # A relayer submits two of the claims; the tokens go to the recipients
+    contract.claim([claim_param(entries[0]), claim_param(entries[2])], _sender=relayer)
+    verify_balances(
+        scenario,
+        contract,
+        balances={
+            (sp.address(carol), 0): 5,
+            (sp.address(dave), 0): 3,
+            (sp.address(dave), 1): 0,
+        },
+        supplies={0: 17, 1: 15},
+    )
+    scenario.verify(sp.View(contract, "is_claimed")(0))
+    scenario.verify(sp.View(contract, "is_claimed")(1) == False)
+
+    # Verify that an allocation can't be claimed twice
+    contract.claim(
+        [claim_param(entries[0])],
+        _sender=relayer,
+        _valid=False,
+        _exception="AIRDROP_ALREADY_CLAIMED",
+    )
+
+    # Verify that a claim must match its allocation
+    forged = dict(entries[1], amount=70)
+    contract.claim(
+        [claim_param(forged)],
+        _sender=relayer,
+        _valid=False,
+        _exception="AIRDROP_INVALID_PROOF",
+    )
+
+    scenario.h2("Delete drained balances")
+
+    # Alice sends all of her token 0 to Bob, which deletes her ledger key
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=2, token_id=0)],
+            ),
+        ],
+        _sender=alice,
+    )
+    scenario.verify(contract.data.ledger.contains((alice.address, 0)) == False)
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=0)) == 0
+    )
+
+    # Burning a whole balance deletes its key too
+    contract.burn([sp.record(token_id=2, from_=alice.address, amount=5)], _sender=alice)
+    scenario.verify(contract.data.ledger.contains((alice.address, 2)) == False)
+    scenario.verify(_total_supply(contract, sp.record(token_id=2)) == 3)
+
+    # Minting 0 tokens doesn't create a zero entry
+    contract.mint(
+        [sp.record(to_=sp.address(carol), amount=0, token=sp.variant("existing", 1))],
+        _sender=admin,
+    )
+    scenario.verify(contract.data.ledger.contains((sp.address(carol), 1)) == False)
+
+    # Zero entries left in older storage can be collected by anyone
+    old_contract = extended.MyExtendedFungibleContract(
+        admin.address,
+        sp.big_map(),
+        {(alice.address, 0): 0, (bob.address, 0): 10},
+        [tok0_md],
+    )
+    scenario += old_contract
+    old_contract.collect_zero_balances(
+        [(alice.address, 0), (bob.address, 0), (sp.address(carol), 0)],
+        _sender=relayer,
+    )
+    scenario.verify(old_contract.data.ledger.contains((alice.address, 0)) == False)
+    verify_balances(
+        scenario,
+        old_contract,
+        balances={
+            (alice, 0): 0,
+            (bob, 0): 10,
+        },
+    )
+
+    # The checkpoints are taken at the levels that the scenario sets,
+    # which mockup mode doesn't support
+    if scenario.simulation_mode() is not sp.SimulationMode.MOCKUP:
+        scenario.h2("Read balances and supplies at past levels")
+
+        # Two transfers in the same level share a checkpoint
+        for amount in [4, 1]:
+            contract.transfer(
+                [
+                    sp.record(
+                        from_=bob.address,
+                        txs=[sp.record(to_=alice.address, amount=amount, token_id=0)],
+                    ),
+                ],
+                _sender=bob,
+                _level=100,
+            )
+        contract.transfer(
+            [
+                sp.record(
+                    from_=bob.address,
+                    txs=[sp.record(to_=alice.address, amount=2, token_id=0)],
+                ),
+            ],
+            _sender=bob,
+            _level=200,
+        )
+        contract.mint(
+            [sp.record(to_=alice.address, amount=2, token=sp.variant("existing", 0))],
+            _sender=admin,
+            _level=300,
+        )
+        scenario.verify(contract.data.balance_checkpoint_counts[(bob.address, 0)] == 3)
+
+        # Transfers of 0 tokens and to oneself leave the balances unchanged
+        # and add no checkpoint
+        contract.transfer(
+            [
+                sp.record(
+                    from_=bob.address,
+                    txs=[
+                        sp.record(to_=alice.address, amount=0, token_id=0),
+                        sp.record(to_=bob.address, amount=1, token_id=0),
+                    ],
+                ),
+            ],
+            _sender=bob,
+            _level=400,
+        )
+        scenario.verify(contract.data.balance_checkpoint_counts[(bob.address, 0)] == 3)
+
+        def balance_at(account, token_id, level):
+            return sp.View(contract, "get_balance_at")(
+                sp.record(owner=account.address, token_id=token_id, level=level)
+            )
+
+        scenario.verify(balance_at(bob, 0, 50) == 9)
+        scenario.verify(balance_at(bob, 0, 100) == 4)
+        scenario.verify(balance_at(bob, 0, 150) == 4)
+        scenario.verify(balance_at(bob, 0, 200) == 2)
+        scenario.verify(balance_at(alice, 0, 50) == 0)
+        scenario.verify(balance_at(alice, 0, 150) == 5)
+        scenario.verify(balance_at(alice, 0, 250) == 7)
+        scenario.verify(balance_at(alice, 0, 300) == 9)
+        # Balances that never changed come from the ledger
+        scenario.verify(balance_at(admin, 0, 50) == 0)
+
+        def total_supply_at(token_id, level):
+            return sp.View(contract, "total_supply_at")(
+                sp.record(token_id=token_id, level=level)
+            )
+
+        scenario.verify(total_supply_at(0, 250) == 17)
+        scenario.verify(total_supply_at(0, 300) == 19)
+        scenario.verify(total_supply_at(1, 300) == 15)
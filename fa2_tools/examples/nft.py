@@ -0,0 +1,713 @@
+"""The NFT tutorial's `MyNFTContract` with the `fa2_tools` contract extensions.
+
+The tutorial files stay self-contained, so that they run on their own and
+in the SmartPy IDE. This example loads `MyNFTContract` from
+`create-nfts/contract/fa2-from-template.py` and extends it with the mixins
+of this package:
+
+- the batched `get_balances` and `total_supplies` views (`views.py`)
+- operators for all of an owner's tokens (`operators.py`)
+- permits for relayed transfers (`permits.py`)
+- Merkle airdrop claims (`airdrop.py`)
+
+`MyLazyNFTContract` is an NFT contract for large collections with
+template-based token metadata (`lazy_metadata.py`).
+
+Run it from the repository root with `fa2_tools` on `PYTHONPATH`:
+
+    PYTHONPATH=. python fa2_tools/examples/nft.py
+"""
+
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+from fa2_tools.airdrop import airdrop
+from fa2_tools.bench import NFT_PATH, load_module
+from fa2_tools.lazy_metadata import lazy_metadata
+from fa2_tools.merkle import build_small, claim_param
+from fa2_tools.metadata import lazy_template, token_info
+from fa2_tools.operators import all_tokens_operators
+from fa2_tools.permits import permits, sign_permit
+from fa2_tools.trace import phase
+from fa2_tools.views import batch_views, get_balances, total_supplies
+
+# Main template for FA2 contracts
+main = fa2.main
+
+# The tutorial contract that this example extends
+my_module = load_module(NFT_PATH)
+
+
+@sp.module
+def extended():
+    import main
+    import my_module
+    import batch_views
+    import all_tokens_operators
+    import permits
+    import lazy_metadata
+    import airdrop
+
+    # The FA2 transfer parameter, with the layout that the standard requires
+    transfer_tx: type = sp.record(
+        to_=sp.address,
+        token_id=sp.nat,
+        amount=sp.nat,
+    ).layout(("to_", ("token_id", "amount")))
+
+    transfer_batch: type = sp.list[
+        sp.record(
+            from_=sp.address,
+            txs=sp.list[transfer_tx],
+        ).layout(("from_", "txs"))
+    ]
+
+    # Order of inheritance: [<policy>], <tutorial contract>, [<other mixins>].
+    class MyExtendedNFTContract(
+        all_tokens_operators.AllTokensOperatorTransfer,
+        my_module.MyNFTContract,
+        batch_views.OnchainviewBatchBalancesNft,
+        airdrop.MerkleAirdropNft,
+        permits.Permits,
+    ):
+        def __init__(self, admin_address, contract_metadata, ledger, token_metadata):
+
+            # Initialize permits for relayed transfers
+            permits.Permits.__init__(self)
+
+            # Initialize airdrop claims, with no airdrop until the admin sets a root
+            airdrop.MerkleAirdropNft.__init__(self, sp.bytes("0x"))
+
+            # Initialize the batched balance and supply views
+            batch_views.OnchainviewBatchBalancesNft.__init__(self)
+
+            # Initialize the tutorial contract
+            my_module.MyNFTContract.__init__(
+                self, admin_address, contract_metadata, ledger, token_metadata
+            )
+
+            # Initialize the transfer policy, with operator approvals for all tokens
+            all_tokens_operators.AllTokensOperatorTransfer.__init__(self)
+
+        # Transfer tokens, with the same checks and errors as the FA2 template,
+        # also accepting an owner's permit for one transfer item when the
+        # sender is neither the owner nor an operator
+        @sp.entrypoint
+        def transfer(self, batch):
+            sp.cast(batch, transfer_batch)
+
+            # Verify that transfers are allowed
+            assert self.private.policy.supports_transfer, "FA2_TX_DENIED"
+
+            for transfer in batch:
+                # Whether the owner's permit for this transfer item was used
+                permitted = False
+
+                for tx in transfer.txs:
+                    # Verify that the token exists
+                    assert self.is_defined_(tx.token_id), "FA2_TOKEN_UNDEFINED"
+
+                    # Verify that the sender is the owner or an operator,
+                    # for all tokens or for this one, or else use the
+                    # owner's permit, which authorizes the whole item once
+                    if not permitted:
+                        if not (
+                            (sp.sender == transfer.from_)
+                            or self.is_operator_(
+                                sp.record(owner=transfer.from_, operator=sp.sender, token_id=tx.token_id)
+                            )
+                        ):
+                            permitted = self.use_permit_(transfer)
+                            assert permitted, "FA2_NOT_OPERATOR"
+
+                    # Move the token
+                    if tx.amount > 0:
+                        assert tx.amount == 1, "FA2_INSUFFICIENT_BALANCE"
+                        assert tx.token_id in self.data.ledger, "FA2_INSUFFICIENT_BALANCE"
+                        assert self.data.ledger[tx.token_id] == transfer.from_, "FA2_INSUFFICIENT_BALANCE"
+                        self.data.ledger[tx.token_id] = tx.to_
+
+        # Unclaimed airdrop tokens are defined but have no ledger entry
+        @sp.private(with_storage="read-only")
+        def balance_(self, params):
+            (is_defined, balance_params) = params
+            assert is_defined(balance_params.token_id), "FA2_TOKEN_UNDEFINED"
+            balance = 0
+            if balance_params.token_id in self.data.ledger:
+                if self.data.ledger[balance_params.token_id] == balance_params.owner:
+                    balance = 1
+            return balance
+
+        @sp.private(with_storage="read-only")
+        def supply_(self, params) -> sp.nat:
+            (is_defined, token_id) = params
+            assert is_defined(token_id), "FA2_TOKEN_UNDEFINED"
+            return 1 if token_id in self.data.ledger else 0
+
+    class MyLazyNFTContract(
+        main.Admin,
+        main.Nft,
+        main.BurnNft,
+        main.OnchainviewBalanceOf,
+        batch_views.OnchainviewBatchBalancesNft,
+        lazy_metadata.LazyMetadataNft,
+    ):
+        def __init__(self, admin_address, contract_metadata, base_uri, template):
+            """An NFT contract for large collections, with template-based metadata.
+            Tokens are minted with `mint_many`, which stores only their ledger
+            entries, and the `token_metadata` off-chain view builds their
+            metadata from the base URI and the shared fields.
+            """
+
+            # Initialize template-based token metadata
+            lazy_metadata.LazyMetadataNft.__init__(self, base_uri, template)
+
+            # Initialize on-chain balance view
+            main.OnchainviewBalanceOf.__init__(self)
+
+            # Initialize the batched balance and supply views
+            batch_views.OnchainviewBatchBalancesNft.__init__(self)
+
+            # Initialize the NFT-specific entrypoints
+            main.BurnNft.__init__(self)
+
+            # Initialize the NFT base class, with no tokens yet
+            main.Nft.__init__(
+                self,
+                contract_metadata,
+                sp.cast({}, sp.map[sp.nat, sp.address]),
+                sp.cast([], sp.list[sp.map[sp.string, sp.bytes]]),
+            )
+
+            # Initialize administrative permissions
+            main.Admin.__init__(self, admin_address)
+
+        # Minted tokens exist whether or not they have a token_metadata entry
+        @sp.private(with_storage="read-only")
+        def is_defined_(self, token_id):
+            return token_id < self.data.next_token_id
+
+# Create token metadata
+# Adapted from fa2.make_metadata
+# For whole collections, use the streaming builders in fa2_tools.metadata
+def create_metadata(symbol, name, decimals, displayUri, artifactUri, description, thumbnailUri):
+    return token_info(
+        dict(
+            name=name,
+            decimals=decimals,
+            symbol=symbol,
+            displayUri=displayUri,
+            artifactUri=artifactUri,
+            description=description,
+            thumbnailUri=thumbnailUri,
+        )
+    )
+
+def _get_balance(fa2_contract, args):
+    """Utility function to call the contract's get_balance view to get an account's token balance."""
+    return sp.View(fa2_contract, "get_balance")(args)
+
+
+def _total_supply(fa2_contract, args):
+    """Utility function to call the contract's total_supply view to get the total amount of tokens."""
+    return sp.View(fa2_contract, "total_supply")(args)
+
+
+@sp.add_test()
+def test():
+    # Create and configure the test scenario
+    # Import the types from the FA2 library, the library itself, and the contract module, in that order.
+    scenario = sp.test_scenario("fa2_extended_nft", extended)
+    scenario.h1("FA2 NFT contract test")
+
+    # Define test accounts
+    # admin = sp.record(
+    #     address=sp.address("tz1QCVQinE8iVj1H2fckqx6oiM85CNJSK9Sx"),
+    #     public_key_hash=sp.key_hash("tz1QCVQinE8iVj1H2fckqx6oiM85CNJSK9Sx"),
+    #     public_key=sp.key("edpktnVRg5YeqR6yWXUFuDVTLMzDQrre1QD3FXmYxRzTVinSsJLpnk"),
+    #     private_key="edskRypCD2G7B1ym3MWuJig8LvpmG32soDsmXVSs7QzZKAH7ehWfZx5buxZ8vaHP2FHqu7yj2jrdUQyBd72EaTJ5iDTbDD9bvJ"
+    # )
+    admin = sp.address("tz1QCVQinE8iVj1H2fckqx6oiM85CNJSK9Sx")
+    admin_address = admin
+    # In mockup mode, every operation is signed and injected into a local
+    # octez-client mockup, so the admin needs a key, not just an address
+    if scenario.simulation_mode() is sp.SimulationMode.MOCKUP:
+        admin = sp.test_account("Admin")
+        admin_address = admin.address
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+
+    # Precreated image on IPFS
+    token_thumb_uri = "https://gateway.pinata.cloud/ipfs/QmRCp4Qc8afPrEqtM1YdRvNagWCsFGXHgGjbBYrmNsBkcE"
+
+    # Define initial token metadata and ownership
+    tok0_md = create_metadata(
+            "Tok0",
+            "Token Zero",
+            0,
+            token_thumb_uri,
+            token_thumb_uri,
+            "My first token",
+            token_thumb_uri,
+    )
+    tok1_md = create_metadata(
+            "Tok1",
+            "Token One",
+            0,
+            token_thumb_uri,
+            token_thumb_uri,
+            "My second token",
+            token_thumb_uri,
+    )
+    tok2_md = create_metadata(
+            "Tok2",
+            "Token Two",
+            0,
+            token_thumb_uri,
+            token_thumb_uri,
+            "My third token",
+            token_thumb_uri,
+    )
+    token_metadata = [tok0_md, tok1_md, tok2_md]
+    ledger = {0: alice.address, 1: alice.address, 2: bob.address}
+
+    # Instantiate the FA2 NFT contract
+    contract = extended.MyExtendedNFTContract(
+        admin_address, sp.big_map(), ledger, token_metadata
+    )
+
+    # Build contract metadata content
+    with phase("metadata"):
+        contract_metadata = sp.create_tzip16_metadata(
+            name="My FA2 NFT contract",
+            description="This is an FA2 NFT contract using SmartPy.",
+            version="1.0.0",
+            license_name="CC-BY-SA",
+            license_details="Creative Commons Attribution Share Alike license 4.0 https://creativecommons.org/licenses/by/4.0/",
+            interfaces=["TZIP-012", "TZIP-016"],
+            authors=["SmartPy <https://smartpy.tezos.com>"],
+            homepage="https://smartpy.io/ide?template=fa2_lib_nft.py",
+            # Optionally, upload the source code to IPFS and add the URI here
+            source_uri=None,
+            offchain_views=contract.get_offchain_views(),
+        )
+
+    # Add the info specific to FA2 permissions
+    contract_metadata["permissions"] = {
+        # The operator policy chosen:
+        # owner-or-operator-transfer is the default.
+        "operator": "owner-or-operator-transfer",
+        # Those two options should always have these values.
+        # It means that the contract doesn't use the hook mechanism.
+        "receiver": "owner-no-hook",
+        "sender": "owner-no-hook",
+    }
+
+    # You must upload the contract metadata to IPFS and get its URI.
+    # You can write the contract_metadata object to a JSON file with json.dumps() and upload it manually.
+    # You can also use sp.pin_on_ipfs() to upload the object via pinata.cloud and get the IPFS URI:
+    # metadata_uri = sp.pin_on_ipfs(contract_metadata, api_key=None, secret_key=None, name = "Metadata for my FA2 contract")
+
+    # This is a placeholder value. In production, replace it with your metadata URI.
+    metadata_uri = "ipfs://example"
+
+    # Create the metadata big map based on the IPFS URI
+    contract_metadata = sp.scenario_utils.metadata_of_url(metadata_uri)
+
+    # Update the scenario instance with the new metadata
+    contract.data.metadata = contract_metadata
+
+    # Originate the contract in the test scenario
+    scenario += contract
+
+    # Run tests
+
+    scenario.h2("Verify the initial owners of the tokens")
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=0)) == 1
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=0)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=1)) == 1
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=1)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=2)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=2)) == 1
+    )
+
+    # Verify the token supply
+    scenario.verify(_total_supply(contract, sp.record(token_id=0)) == 1)
+    scenario.verify(_total_supply(contract, sp.record(token_id=1)) == 1)
+    scenario.verify(_total_supply(contract, sp.record(token_id=2)) == 1)
+
+    # Verify the same owners with a single batched view call
+    requests = [
+        sp.record(owner=alice.address, token_id=0),
+        sp.record(owner=bob.address, token_id=0),
+        sp.record(owner=bob.address, token_id=2),
+    ]
+    scenario.verify_equal(
+        get_balances(contract, requests),
+        [
+            sp.record(request=requests[0], balance=1),
+            sp.record(request=requests[1], balance=0),
+            sp.record(request=requests[2], balance=1),
+        ],
+    )
+    scenario.verify_equal(
+        total_supplies(contract, [2, 0, 1]),
+        [
+            sp.record(token_id=2, total_supply=1),
+            sp.record(token_id=0, total_supply=1),
+            sp.record(token_id=1, total_supply=1),
+        ],
+    )
+
+    scenario.h2("Transfer a token")
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=alice,
+    )
+    # Verify the result
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=0)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=0)) == 1
+    )
+    # Transfer it back
+    contract.transfer(
+        [
+            sp.record(
+                from_=bob.address,
+                txs=[sp.record(to_=alice.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=bob,
+    )
+
+    scenario.h2("Mint a token")
+    nft3_md = fa2.make_metadata(name="Token Three", decimals=1, symbol="Tok3")
+    # Verify that only the admin can mint a token
+    contract.mint(
+        [
+            sp.record(metadata=nft3_md, to_=bob.address),
+        ],
+        _sender=bob,
+        _valid=False,
+    )
+    # Mint a token
+    contract.mint(
+        [
+            sp.record(metadata=nft3_md, to_=bob.address),
+        ],
+        _sender=admin,
+    )
+    # Verify the result
+    scenario.verify(_total_supply(contract, sp.record(token_id=3)) == 1)
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=3)) == 0
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=3)) == 1
+    )
+
+    scenario.h2("Burn a token")
+    # Verify that you can't burn someone else's token
+    contract.burn(
+        [sp.record(token_id=3, from_=bob.address, amount=1)],
+        _sender=alice,
+        _valid=False,
+    )
+
+    # Verify that you can burn your own token
+    contract.burn([sp.record(token_id=3, from_=bob.address, amount=1)], _sender=bob)
+
+    scenario.h2("Approve an operator for all tokens")
+
+    # Verify that only the owner can approve operators for its tokens
+    contract.update_all_tokens_operators(
+        [
+            sp.variant(
+                "add_all_tokens_operator",
+                sp.record(owner=alice.address, operator=bob.address),
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+        _exception="FA2_NOT_OWNER",
+    )
+
+    # Alice lets Bob transfer all of her tokens
+    contract.update_all_tokens_operators(
+        [
+            sp.variant(
+                "add_all_tokens_operator",
+                sp.record(owner=alice.address, operator=bob.address),
+            ),
+        ],
+        _sender=alice,
+    )
+
+    # Bob transfers both of Alice's tokens without per-token approvals
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[
+                    sp.record(to_=bob.address, amount=1, token_id=0),
+                    sp.record(to_=bob.address, amount=1, token_id=1),
+                ],
+            ),
+        ],
+        _sender=bob,
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=0)) == 1
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=1)) == 1
+    )
+
+    # Verify that an operator can't transfer a token the owner doesn't have
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+        _exception="FA2_INSUFFICIENT_BALANCE",
+    )
+
+    # Bob gives the tokens back and Alice removes the approval
+    contract.transfer(
+        [
+            sp.record(
+                from_=bob.address,
+                txs=[
+                    sp.record(to_=alice.address, amount=1, token_id=0),
+                    sp.record(to_=alice.address, amount=1, token_id=1),
+                ],
+            ),
+        ],
+        _sender=bob,
+    )
+    contract.update_all_tokens_operators(
+        [
+            sp.variant(
+                "remove_all_tokens_operator",
+                sp.record(owner=alice.address, operator=bob.address),
+            ),
+        ],
+        _sender=alice,
+    )
+    contract.transfer(
+        [
+            sp.record(
+                from_=alice.address,
+                txs=[sp.record(to_=bob.address, amount=1, token_id=0)],
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+        _exception="FA2_NOT_OPERATOR",
+    )
+
+    # Permits are signed with the test accounts' keys and checked against
+    # the scenario's timestamps, which mockup mode doesn't support
+    if scenario.simulation_mode() is not sp.SimulationMode.MOCKUP:
+        scenario.h2("Relay transfers with permits")
+        relayer = sp.test_account("Relayer")
+        expiry = sp.timestamp(3600)
+
+        # Alice and Bob sign permits off-chain, and the relayer registers both
+        # permits in one call and settles both transfers in another
+        alice_permit, alice_transfer = sign_permit(
+            alice, contract, 0, [(bob.address, 0, 1)], expiry
+        )
+        bob_permit, bob_transfer = sign_permit(
+            bob, contract, 0, [(alice.address, 2, 1)], expiry
+        )
+        contract.permit([alice_permit, bob_permit], _sender=relayer, _now=sp.timestamp(10))
+        contract.transfer([alice_transfer, bob_transfer], _sender=relayer, _now=sp.timestamp(20))
+        scenario.verify(
+            _get_balance(contract, sp.record(owner=bob.address, token_id=0)) == 1
+        )
+        scenario.verify(
+            _get_balance(contract, sp.record(owner=alice.address, token_id=2)) == 1
+        )
+
+        # Verify that a permit can't be used twice
+        contract.transfer(
+            [alice_transfer],
+            _sender=relayer,
+            _now=sp.timestamp(30),
+            _valid=False,
+            _exception="FA2_NOT_OPERATOR",
+        )
+
+
+@sp.add_test()
+def test_lazy_metadata():
+    scenario = sp.test_scenario("fa2_extended_nft_lazy", extended)
+    scenario.h1("FA2 NFT contract with template-based metadata")
+
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+
+    # Fields shared by every token; the base URI holds one <token_id>.json per token
+    template = lazy_template(
+        dict(
+            name="Generative",
+            symbol="GEN",
+            decimals=0,
+            description="A generative collection",
+        )
+    )
+    base_uri = sp.scenario_utils.bytes_of_string("ipfs://example/")
+    contract = extended.MyLazyNFTContract(
+        admin.address, sp.scenario_utils.metadata_of_url("ipfs://example"), base_uri, template
+    )
+    scenario += contract
+
+    scenario.h2("Mint many tokens without metadata entries")
+    contract.mint_many(
+        [sp.record(to_=alice.address, count=3), sp.record(to_=bob.address, count=9)],
+        _sender=admin,
+    )
+    # Verify that only the admin can mint tokens
+    contract.mint_many([sp.record(to_=bob.address, count=1)], _sender=bob, _valid=False)
+    scenario.verify(contract.data.next_token_id == 12)
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=2)) == 1
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=bob.address, token_id=11)) == 1
+    )
+
+    scenario.h2("Transfer a minted token")
+    contract.transfer(
+        [
+            sp.record(
+                from_=bob.address,
+                txs=[sp.record(to_=alice.address, amount=1, token_id=10)],
+            ),
+        ],
+        _sender=bob,
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=alice.address, token_id=10)) == 1
+    )
+    # Verify that tokens that weren't minted don't exist
+    contract.transfer(
+        [
+            sp.record(
+                from_=bob.address,
+                txs=[sp.record(to_=alice.address, amount=1, token_id=12)],
+            ),
+        ],
+        _sender=bob,
+        _valid=False,
+        _exception="FA2_TOKEN_UNDEFINED",
+    )
+
+    scenario.h2("Read the generated token metadata")
+    info = sp.View(contract, "token_metadata")(10).token_info
+    scenario.verify(info["name"] == sp.scenario_utils.bytes_of_string("Generative #10"))
+    scenario.verify(info["symbol"] == sp.scenario_utils.bytes_of_string("GEN"))
+    scenario.verify(info[""] == sp.scenario_utils.bytes_of_string("ipfs://example/10.json"))
+
+    # Override the metadata of a single token
+    special_md = create_metadata(
+        "GEN",
+        "The special one",
+        0,
+        "ipfs://example/special.png",
+        "ipfs://example/special.png",
+        "A one of a kind token",
+        "ipfs://example/special.png",
+    )
+    contract.set_token_metadata_overrides(
+        [sp.record(token_id=0, token_info=special_md)], _sender=admin
+    )
+    scenario.verify(
+        sp.View(contract, "token_metadata")(0).token_info["name"]
+        == sp.scenario_utils.bytes_of_string("The special one")
+    )
+    scenario.verify(
+        sp.View(contract, "token_metadata")(1).token_info["name"]
+        == sp.scenario_utils.bytes_of_string("Generative #1")
+    )
+
+
+@sp.add_test()
+def test_airdrop():
+    scenario = sp.test_scenario("fa2_extended_nft_airdrop", extended)
+    scenario.h1("Airdrop NFTs with Merkle proofs")
+
+    admin = sp.test_account("Admin")
+    relayer = sp.test_account("Relayer")
+    carol = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+    dave = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+
+    # Three tokens exist, but nobody owns them until they are claimed
+    token_metadata = [
+        fa2.make_metadata(name="Drop %d" % i, decimals=0, symbol="DROP")
+        for i in range(3)
+    ]
+    contract = extended.MyExtendedNFTContract(
+        admin.address, sp.big_map(), {}, token_metadata
+    )
+    scenario += contract
+
+    # Build the Merkle tree of the allocations offline and store its root
+    root, entries = build_small([(carol, 0, 1), (dave, 1, 1), (carol, 2, 1)])
+    contract.set_airdrop_root(sp.bytes("0x" + root), _sender=admin)
+
+    scenario.h2("Claim tokens")
+    contract.claim([claim_param(entries[0]), claim_param(entries[1])], _sender=relayer)
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=sp.address(carol), token_id=0)) == 1
+    )
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=sp.address(dave), token_id=1)) == 1
+    )
+    # Unclaimed tokens have no owner
+    scenario.verify(contract.data.ledger.contains(2) == False)
+    scenario.verify(
+        _get_balance(contract, sp.record(owner=sp.address(carol), token_id=2)) == 0
+    )
+    scenario.verify(_total_supply(contract, sp.record(token_id=2)) == 0)
+    scenario.verify(_total_supply(contract, sp.record(token_id=1)) == 1)
+
+    # Verify that a token can't be claimed twice
+    contract.claim(
+        [claim_param(entries[1])],
+        _sender=relayer,
+        _valid=False,
+        _exception="AIRDROP_TOKEN_OWNED",
+    )
+
+    # Verify that a claim must match its allocation
+    contract.claim(
+        [claim_param(dict(entries[2], owner=dave))],
+        _sender=relayer,
+        _valid=False,
+        _exception="AIRDROP_INVALID_PROOF",
+    )
@@ -0,0 +1,743 @@
+"""Differential fuzzer for `MyFungibleContract` against a reference model.
+
+The scenarios check a few dozen balances by hand. This module generates
+long random sequences of `transfer`, `mint`, `burn`, `convert` and
+`update_operators` calls, a few of them invalid on purpose. Each sequence
+is replayed against the contract of `smartpy_fa2_fungible/part_4_complete.py`
+and against `Model`, a pure-Python reference of the ledger, the supplies
+and the operators:
+
+- each call is expected to succeed or to fail with the model's error,
+  and SmartPy raises when the contract disagrees
+- every `--check-every` calls and at the end of each sequence, every
+  balance of every defined token, every supply, which ledger keys exist
+  and every operator are compared with the model, in one scenario call
+
+The ledger keys matter because the contract never deletes one: a drained
+balance keeps a key of 0, while a transfer of 0 tokens creates none.
+
+Comparing the state costs a scenario call, so it isn't done after every
+call. A difference is found up to `--check-every` calls after the call
+that caused it, and the failure is reported at the step of the check;
+shrinking then cuts the sequence to the shortest prefix that fails,
+which ends at the first check that finds the difference. `--check-every 1`
+compares after every call and reports the call itself, at the cost of
+one scenario call per call instead of one per `--batch` calls.
+
+A scenario call costs about 100ms, most of it whatever the call does, and
+a call between contracts a few milliseconds. So the accounts are `Actor`
+contracts from `fa2_tools.actors`, and the calls that the model expects to
+succeed run as internal operations of one `Driver` call, up to `--batch`
+at a time. Only the calls expected to fail, which would revert a batch,
+and the state checks are scenario calls of their own. Originating the
+contract takes a few seconds, so each worker originates it once and plays
+its seeds one after the other, each from the state the previous one left.
+
+A failing sequence is cut after its failing step and shrunk while it
+still fails, replaying each candidate on a contract originated in the
+state the sequence started from. It is written with that state as a JSON
+line that `--replay` runs again. When the setup itself fails, its error is
+reported and the worker stops.
+
+Seeds are sharded over worker processes (seed % workers). One worker runs
+a few thousand calls per minute with the defaults, from about 2,600 to
+5,000 in measured runs depending on the machine, so tens of thousands
+per minute take several workers:
+
+    python -m fa2_tools.fuzz --seeds 0:256 --length 200 --workers 8 --output failures.jsonl
+    python -m fa2_tools.fuzz --replay failures.jsonl
+"""
+
+import argparse
+import concurrent.futures
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+from fa2_tools import michelson
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNGIBLE_PATH = os.path.join(ROOT, "smartpy_fa2_fungible", "part_4_complete.py")
+
+ADMIN = "admin"
+KINDS = ("transfer", "mint", "burn", "convert", "update_operators")
+
+
+class Failwith(Exception):
+    """The model's version of a failed contract call."""
+
+
+class Model:
+    """Reference FA2 fungible state: ledger, supplies, operators and defined tokens.
+
+    Accounts are names, such as "admin" and "a0". Like in
+    `MyFungibleContract`, a ledger key is kept once a call writes it, even
+    when its balance drops to 0, and transfers of 0 tokens write none.
+    """
+
+    def __init__(self, ledger, tokens):
+        self.ledger = dict(ledger)
+        self.supply = {token_id: 0 for token_id in range(tokens)}
+        for (_, token_id), amount in self.ledger.items():
+            self.supply[token_id] += amount
+        self.next_token_id = tokens
+        self.operators = set()
+
+    def copy(self):
+        model = Model({}, 0)
+        model.ledger = dict(self.ledger)
+        model.supply = dict(self.supply)
+        model.next_token_id = self.next_token_id
+        model.operators = set(self.operators)
+        return model
+
+    def snapshot(self):
+        """Return the state as JSON data, for `from_snapshot`."""
+        return dict(
+            ledger=sorted([owner, token_id, amount] for (owner, token_id), amount in self.ledger.items()),
+            tokens=self.next_token_id,
+            operators=sorted(list(operator) for operator in self.operators),
+        )
+
+    @classmethod
+    def from_snapshot(cls, state):
+        model = cls({(owner, token_id): amount for owner, token_id, amount in state["ledger"]}, state["tokens"])
+        model.operators = {tuple(operator) for operator in state["operators"]}
+        return model
+
+    def balance(self, owner, token_id):
+        return self.ledger.get((owner, token_id), 0)
+
+    def apply(self, op):
+        """Apply a call and return None, or return its error and leave the state as it was."""
+        state = self.copy()
+        try:
+            getattr(state, "_" + op["kind"])(op["sender"], op["batch"])
+        except Failwith as error:
+            return str(error)
+        self.__dict__.update(state.__dict__)
+        return None
+
+    def _check_defined(self, token_id):
+        if not 0 <= token_id < self.next_token_id:
+            raise Failwith("FA2_TOKEN_UNDEFINED")
+
+    def _check_operator(self, sender, owner, token_id):
+        if sender != owner and (owner, sender, token_id) not in self.operators:
+            raise Failwith("FA2_NOT_OPERATOR")
+
+    def _write(self, balances):
+        self.ledger.update(balances)
+
+    def _transfer(self, sender, batch):
+        balances = {}
+        for from_, txs in batch:
+            for to_, token_id, amount in txs:
+                self._check_defined(token_id)
+                self._check_operator(sender, from_, token_id)
+                if amount == 0:
+                    continue
+                source = (from_, token_id)
+                balance = balances.get(source, self.ledger.get(source, 0)) - amount
+                if balance < 0:
+                    raise Failwith("FA2_INSUFFICIENT_BALANCE")
+                balances[source] = balance
+                target = (to_, token_id)
+                balances[target] = balances.get(target, self.ledger.get(target, 0)) + amount
+        self._write(balances)
+
+    def _mint(self, sender, batch):
+        if sender != ADMIN:
+            raise Failwith("FA2_NOT_ADMIN")
+        for to_, token_id, amount in batch:
+            if token_id is None:
+                token_id = self.next_token_id
+                self.next_token_id += 1
+                self.supply[token_id] = amount
+            else:
+                self._check_defined(token_id)
+                self.supply[token_id] += amount
+            self._write({(to_, token_id): self.balance(to_, token_id) + amount})
+
+    def _burn(self, sender, batch):
+        for from_, token_id, amount in batch:
+            self._check_defined(token_id)
+            self._check_operator(sender, from_, token_id)
+            balance = self.balance(from_, token_id) - amount
+            if balance < 0:
+                raise Failwith("FA2_INSUFFICIENT_BALANCE")
+            self._write({(from_, token_id): balance})
+            self.supply[token_id] = max(0, self.supply[token_id] - amount)
+
+    def _convert(self, sender, batch):
+        balances = {}
+        supplies = {}
+        for source, target, amount in batch:
+            for token_id in (source, target):
+                if token_id not in balances:
+                    self._check_defined(token_id)
+                    balances[token_id] = self.balance(sender, token_id)
+                    supplies[token_id] = self.supply[token_id]
+            if balances[source] < amount:
+                raise Failwith("FA2_INSUFFICIENT_BALANCE")
+            balances[source] -= amount
+            supplies[source] = max(0, supplies[source] - amount)
+            balances[target] += amount
+            supplies[target] += amount
+        self._write({(sender, token_id): amount for token_id, amount in balances.items()})
+        self.supply.update(supplies)
+
+    def _update_operators(self, sender, batch):
+        for action, owner, operator, token_id in batch:
+            if owner != sender:
+                raise Failwith("FA2_NOT_OWNER")
+            if action == "add":
+                self.operators.add((owner, operator, token_id))
+            else:
+                self.operators.discard((owner, operator, token_id))
+
+
+def accounts(count):
+    return ["a%d" % i for i in range(count)]
+
+
+def initial_ledger(holders, tokens):
+    """Give 10 of every other token to each holder, so that some balances start empty."""
+    return {
+        (holder, token_id): 10
+        for i, holder in enumerate(accounts(holders))
+        for token_id in range(tokens)
+        if (i + token_id) % 2 == 0
+    }
+
+
+# Index of the token ID and of the amount in the batch items of each kind
+_ITEM_FIELDS = {
+    "transfer": (1, 2),
+    "mint": (1, None),
+    "burn": (1, 2),
+    "convert": (0, 2),
+    "update_operators": (3, None),
+}
+
+
+def _items(op):
+    return op["batch"][0][1] if op["kind"] == "transfer" else op["batch"]
+
+
+def _owner(op, item):
+    if op["kind"] == "transfer":
+        return op["batch"][0][0]
+    if op["kind"] == "burn":
+        return item[0]
+    return op["sender"]
+
+
+def _corrupt(rng, op, model, names):
+    """Make a call invalid with an undefined token, an amount over the balance, or a sender that isn't allowed."""
+    op = copy.deepcopy(op)
+    item = rng.choice(_items(op))
+    token_index, amount_index = _ITEM_FIELDS[op["kind"]]
+    how = rng.choice(["token", "amount", "sender"])
+    if how == "amount" and amount_index is not None and item[token_index] < model.next_token_id:
+        item[amount_index] = model.balance(_owner(op, item), item[token_index]) + 1
+    elif how == "sender" and op["kind"] != "convert":
+        op["sender"] = rng.choice([name for name in names + [ADMIN] if name != op["sender"]])
+    else:
+        item[token_index] = model.next_token_id
+    return op
+
+
+def generate(seed, length, holders=4, tokens=3, max_batch=3, invalid=0.02, max_tokens=8, start=None):
+    """Generate a random sequence of calls from a seed.
+
+    The sequence starts in the `start` snapshot, or in the initial state.
+    About `invalid` of the calls are made invalid, so that every error path
+    is taken, and the others are valid: their amounts fit the balances and
+    their senders are the owners or, sometimes, their operators. New tokens
+    are minted until there are `max_tokens`.
+    """
+    rng = random.Random(seed)
+    names = accounts(holders)
+    model = Model.from_snapshot(start) if start else Model(initial_ledger(holders, tokens), tokens)
+    ops = []
+
+    for _ in range(length):
+        kind = rng.choice(KINDS)
+        owner = rng.choice(names)
+        token_ids = [rng.randrange(model.next_token_id) for _ in range(rng.randint(1, max_batch))]
+        # Balances left after the earlier items of the batch
+        left = {}
+
+        def take(owner, token_id):
+            balance = left.get((owner, token_id), model.balance(owner, token_id))
+            amount = rng.randint(0, balance)
+            left[(owner, token_id)] = balance - amount
+            return amount
+
+        def give(owner, token_id, amount):
+            left[(owner, token_id)] = left.get((owner, token_id), model.balance(owner, token_id)) + amount
+
+        def sender():
+            # Sometimes an operator of the owner for all the tokens
+            operators = [
+                name for name in names
+                if all((owner, name, token_id) in model.operators for token_id in token_ids)
+            ]
+            return rng.choice(operators) if operators and rng.random() < 0.25 else owner
+
+        if kind == "transfer":
+            txs = []
+            for token_id in token_ids:
+                to_, amount = rng.choice(names), take(owner, token_id)
+                give(to_, token_id, amount)
+                txs.append([to_, token_id, amount])
+            op = dict(kind=kind, sender=sender(), batch=[[owner, txs]])
+        elif kind == "mint":
+            batch = []
+            new_tokens = model.next_token_id
+            for token_id in token_ids:
+                if new_tokens < max_tokens and rng.random() < 0.1:
+                    token_id = None
+                    new_tokens += 1
+                batch.append([rng.choice(names), token_id, rng.randint(0, 5)])
+            op = dict(kind=kind, sender=ADMIN, batch=batch)
+        elif kind == "burn":
+            op = dict(kind=kind, sender=sender(), batch=[[owner, token_id, take(owner, token_id)] for token_id in token_ids])
+        elif kind == "convert":
+            batch = []
+            for source in token_ids:
+                target, amount = rng.randrange(model.next_token_id), take(owner, source)
+                give(owner, target, amount)
+                batch.append([source, target, amount])
+            op = dict(kind=kind, sender=owner, batch=batch)
+        else:
+            batch = [[rng.choice(["add", "remove"]), owner, rng.choice(names), token_id] for token_id in token_ids]
+            op = dict(kind=kind, sender=owner, batch=batch)
+        if rng.random() < invalid:
+            op = _corrupt(rng, op, model, names)
+        model.apply(op)
+        ops.append(op)
+    return ops
+
+
+def shrink(ops, fails, max_runs=50):
+    """Cut the sequence, then remove calls and batch items, while `fails(ops)` stays true."""
+    runs = 0
+    # The state is only compared every few calls, so find the shortest
+    # failing prefix first
+    low, high = 1, len(ops)
+    while low < high and runs < max_runs:
+        middle = (low + high) // 2
+        runs += 1
+        if fails(ops[:middle]):
+            high = middle
+        else:
+            low = middle + 1
+    ops = ops[:high]
+
+    chunk = max(len(ops) // 2, 1)
+    while runs < max_runs:
+        removed = False
+        start = 0
+        while start < len(ops) and runs < max_runs:
+            candidate = ops[:start] + ops[start + chunk:]
+            runs += 1
+            if candidate and fails(candidate):
+                ops = candidate
+                removed = True
+            else:
+                start += chunk
+        if chunk == 1 and not removed:
+            break
+        if not removed:
+            chunk //= 2
+
+    for index in range(len(ops)):
+        item = 0
+        while item < len(ops[index]["batch"]) and len(ops[index]["batch"]) > 1 and runs < max_runs:
+            op = dict(ops[index], batch=ops[index]["batch"][:item] + ops[index]["batch"][item + 1:])
+            candidate = ops[:index] + [op] + ops[index + 1:]
+            runs += 1
+            if fails(candidate):
+                ops = candidate
+            else:
+                item += 1
+    return ops
+
+
+def _describe(error):
+    return "%s: %s" % (type(error).__name__, error)
+
+
+# The metadata of minted tokens, as `fa2.make_metadata` builds it
+_NEW_TOKEN_METADATA = michelson.encode_map([
+    (michelson.encode_string(key), michelson.encode_bytes(value))
+    for key, value in sorted({"decimals": b"0", "name": b"Fuzz", "symbol": b"FZ"}.items())
+])
+
+
+def _encode_call(op, address):
+    """Encode a call as an `actors.fa2_call`, with `address` the encoded address of each account."""
+    nat = michelson.encode_int
+    pair = michelson.encode_pair
+    left, right = michelson.encode_left, michelson.encode_right
+    kind, batch = op["kind"], op["batch"]
+    # The FA2 records are right combs of their fields, and records and
+    # variants without a layout sort their fields by name
+    if kind == "transfer":
+        return left(michelson.encode_list([
+            pair(address[from_], michelson.encode_list([
+                pair(address[to_], pair(nat(token_id), nat(amount))) for to_, token_id, amount in txs
+            ]))
+            for from_, txs in batch
+        ]))
+    if kind == "mint":
+        return right(left(michelson.encode_list([
+            pair(
+                address[to_],
+                pair(right(_NEW_TOKEN_METADATA) if token_id is None else left(nat(token_id)), nat(amount)),
+            )
+            for to_, token_id, amount in batch
+        ])))
+    if kind == "burn":
+        return right(right(left(michelson.encode_list([
+            pair(address[from_], pair(nat(token_id), nat(amount))) for from_, token_id, amount in batch
+        ]))))
+    if kind == "convert":
+        return right(right(right(left(michelson.encode_list([
+            pair(nat(amount), pair(nat(source), nat(target))) for source, target, amount in batch
+        ])))))
+    return right(right(right(right(michelson.encode_list([
+        (left if action == "add" else right)(pair(address[owner], pair(address[operator], nat(token_id))))
+        for action, owner, operator, token_id in batch
+    ])))))
+
+
+class _StepFailed(Exception):
+    def __init__(self, step, error):
+        super().__init__(step, error)
+        self.step = step
+        self.error = error
+
+
+class Replayer:
+    """Replay call sequences against `MyFungibleContract` through actor contracts.
+
+    One scenario holds an `Actor` per account, a `Driver` and every
+    contract that the replayer originates. `start` originates a contract in
+    a model state and `play` continues from there, so a worker can play
+    many sequences on one contract.
+    """
+
+    def __init__(self, holders=4, tokens=3, check_every=100, batch=50):
+        import smartpy as sp
+        from smartpy.templates import fa2_lib as fa2
+
+        from fa2_tools.actors import actors
+        from fa2_tools.bench import load_module
+
+        self.sp = sp
+        self.fa2 = fa2
+        self.actors_module = actors
+        self.module = load_module(FUNGIBLE_PATH)
+        self.holders = holders
+        self.tokens = tokens
+        self.check_every = check_every
+        self.batch = batch
+        self.names = accounts(holders) + [ADMIN]
+        self.scenario = None
+        self.contract = None
+        self.model = None
+
+    def _setup(self):
+        # No scenario name, so that nothing is written to disk
+        sp = self.sp
+        self.scenario = sp.test_scenario(None, [self.module, self.actors_module])
+        self.driver = self.actors_module.Driver()
+        self.scenario += self.driver
+        self.actors = {}
+        for name in self.names:
+            self.actors[name] = self.actors_module.Actor(self.driver.address)
+            self.scenario += self.actors[name]
+        addresses = {name: actor.origination_result["address"] for name, actor in self.actors.items()}
+        self.addresses = {name: sp.address(address) for name, address in addresses.items()}
+        self.encoded_addresses = {name: michelson.encode_address(address) for name, address in addresses.items()}
+        self._checks = None
+
+    def start(self, state=None):
+        """Originate a contract in the state of a `Model.snapshot`, or in the initial state."""
+        if self.scenario is None:
+            self._setup()
+        self.contract = None
+        model = Model.from_snapshot(state) if state else Model(initial_ledger(self.holders, self.tokens), self.tokens)
+        contract = self.module.MyFungibleContract(
+            self.addresses[ADMIN],
+            self.sp.big_map(),
+            {(self.addresses[owner], token_id): amount for (owner, token_id), amount in model.ledger.items()},
+            [self.fa2.make_metadata(name="Token %d" % i, decimals=0, symbol="TK%d" % i)
+             for i in range(model.next_token_id)],
+        )
+        self.scenario += contract
+        for actor in self.actors.values():
+            actor.set_fa2(contract.address)
+        if model.operators:
+            self._call([
+                dict(kind="update_operators", sender=owner, batch=[["add", owner, operator, token_id]])
+                for owner, operator, token_id in sorted(model.operators)
+            ])
+        self.contract = contract
+        self.model = model
+        self._checks = None
+
+    def _call(self, ops, **kwargs):
+        """Run calls in order through the driver, grouping the consecutive calls of each sender."""
+        steps = []
+        for op in ops:
+            if steps and steps[-1][0] == op["sender"]:
+                steps[-1][1].append(_encode_call(op, self.encoded_addresses))
+            else:
+                steps.append((op["sender"], [_encode_call(op, self.encoded_addresses)]))
+        packed = michelson.pack(michelson.encode_list([
+            michelson.encode_pair(self.encoded_addresses[sender], michelson.encode_list(calls))
+            for sender, calls in steps
+        ]))
+        self.driver.run(self.sp.bytes("0x" + packed.hex()), **kwargs)
+
+    def _flush(self, ops, steps):
+        if not steps:
+            return
+        try:
+            self._call([ops[step] for step in steps])
+        except Exception:
+            # The batch left no trace, so replay its calls one by one to find the failing one
+            for step in steps:
+                try:
+                    self._call([ops[step]])
+                except Exception as error:
+                    raise _StepFailed(step, error)
+            raise
+        finally:
+            del steps[:]
+
+    def _check_parts(self):
+        """Return the (name, expression, expected values) of each part of the state."""
+        sp = self.sp
+        model = self.model
+        token_ids = range(model.next_token_id)
+        keys = [(name, token_id) for name in self.names for token_id in token_ids]
+        triples = [
+            (owner, operator, token_id)
+            for owner in accounts(self.holders) for operator in self.names for token_id in token_ids
+        ]
+        if self._checks is None or self._checks[0] != model.next_token_id:
+            # Building expressions is slow, so they are only rebuilt for new tokens.
+            # These are scenario expressions, where Python's `in` can't build a
+            # membership test, so they use `contains`
+            data = self.contract.data
+            self._checks = (model.next_token_id, [
+                sp.cast([data.ledger.get((self.addresses[name], token_id), default_value=0) for name, token_id in keys],
+                        sp.list[sp.nat]),
+                sp.cast([data.ledger.contains((self.addresses[name], token_id)) for name, token_id in keys],
+                        sp.list[sp.bool]),
+                sp.cast([data.supply.get(token_id, default_value=0) for token_id in token_ids], sp.list[sp.nat]),
+                sp.cast([
+                    data.operators.contains(sp.record(
+                        owner=self.addresses[owner], operator=self.addresses[operator], token_id=token_id,
+                    ))
+                    for owner, operator, token_id in triples
+                ], sp.list[sp.bool]),
+            ])
+        nats, bools = michelson.encode_int, michelson.encode_bool
+        expected = [
+            michelson.encode_list([nats(model.balance(*key)) for key in keys]),
+            michelson.encode_list([bools(key in model.ledger) for key in keys]),
+            michelson.encode_list([nats(model.supply[token_id]) for token_id in token_ids]),
+            michelson.encode_list([bools(triple in model.operators) for triple in triples]),
+        ]
+        return zip(["balances", "ledger keys", "supplies", "operators"], self._checks[1], expected)
+
+    def _check(self):
+        """Compare the whole state with the model in one scenario call."""
+        sp = self.sp
+        parts = list(self._check_parts())
+        actual = parts[-1][1]
+        expected = parts[-1][2]
+        for _, expression, encoded in reversed(parts[:-1]):
+            actual = (expression, actual)
+            expected = michelson.encode_pair(encoded, expected)
+        try:
+            self.scenario.verify(sp.pack(actual) == sp.bytes("0x" + michelson.pack(expected).hex()))
+        except Exception:
+            # Name the part that differs
+            for name, expression, encoded in parts:
+                try:
+                    self.scenario.verify(sp.pack(expression) == sp.bytes("0x" + michelson.pack(encoded).hex()))
+                except Exception:
+                    raise AssertionError("The %s differ from the model" % name)
+            raise
+
+    def play(self, ops):
+        """Play a sequence on the current contract and return None, or the failing step and the error.
+
+        After a failure, the contract no longer follows the model, and
+        `start` must originate a new one.
+        """
+        pending = []
+        step = None
+        try:
+            for step, op in enumerate(ops):
+                error = self.model.apply(op)
+                if error is None:
+                    pending.append(step)
+                    if len(pending) == self.batch:
+                        self._flush(ops, pending)
+                else:
+                    # A failing call would revert the whole batch, so it runs on its own
+                    self._flush(ops, pending)
+                    self._call([op], _valid=False, _exception=error)
+                if (step + 1) % self.check_every == 0 or step == len(ops) - 1:
+                    self._flush(ops, pending)
+                    self._check()
+        except _StepFailed as failed:
+            self.contract = None
+            return dict(step=failed.step, error=_describe(failed.error))
+        except Exception as error:
+            self.contract = None
+            return dict(step=step, error=_describe(error))
+        return None
+
+    def run(self, ops, state=None):
+        """Replay a sequence on a new contract and return None, or the failing step and the error.
+
+        The step is None when the contract can't be set up.
+        """
+        try:
+            self.start(state)
+        except Exception as error:
+            self.scenario = None
+            return dict(step=None, error=_describe(error))
+        return self.play(ops)
+
+
+def run_shard(seeds, length, holders=4, tokens=3, check_every=100, batch=50, invalid=0.02, max_shrink_runs=50):
+    """Fuzz a list of seeds in this process and return the failures and the number of calls.
+
+    The seeds continue on one contract, each from the state the previous
+    one left, until one fails.
+    """
+    replayer = Replayer(holders, tokens, check_every, batch)
+    failures = []
+    calls = 0
+    for seed in seeds:
+        if replayer.contract is None:
+            try:
+                replayer.start()
+            except Exception as error:
+                # Every seed would fail the same way
+                failures.append(dict(seed=seed, step=None, error=_describe(error),
+                                     holders=holders, tokens=tokens, start=None, ops=[]))
+                break
+        start = replayer.model.snapshot()
+        ops = generate(seed, length, holders, tokens, invalid=invalid, start=start)
+        failure = replayer.play(ops)
+        if failure is None:
+            calls += len(ops)
+            continue
+        calls += failure["step"]
+        shrunk = shrink(
+            ops[:failure["step"] + 1],
+            lambda candidate: (replayer.run(candidate, start) or {}).get("step") is not None,
+            max_shrink_runs,
+        )
+        failures.append(dict(
+            seed=seed,
+            step=failure["step"],
+            error=(replayer.run(shrunk, start) or failure)["error"],
+            holders=holders,
+            tokens=tokens,
+            start=start,
+            ops=shrunk,
+        ))
+        replayer.contract = None
+    return failures, calls
+
+
+def fuzz(seeds, length, workers=None, holders=4, tokens=3, check_every=100, batch=50, invalid=0.02):
+    """Fuzz the seeds over worker processes, sharded by seed, and return (failures, calls)."""
+    workers = workers or os.cpu_count() or 1
+    shards = [[seed for seed in seeds if seed % workers == worker] for worker in range(workers)]
+    failures = []
+    calls = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_shard, shard, length, holders, tokens, check_every, batch, invalid)
+            for shard in shards if shard
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            shard_failures, shard_calls = future.result()
+            failures.extend(shard_failures)
+            calls += shard_calls
+    return sorted(failures, key=lambda failure: failure["seed"]), calls
+
+
+def _seeds(value):
+    start, _, stop = value.partition(":")
+    return list(range(int(start), int(stop))) if stop else [int(start)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=_seeds, default=list(range(64)), help="Seed or start:stop range")
+    parser.add_argument("--length", type=int, default=200, help="Calls per sequence")
+    parser.add_argument("--workers", "-j", type=int, default=None)
+    parser.add_argument("--holders", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=3)
+    parser.add_argument("--check-every", type=int, default=100,
+                        help="Compare the full state every N calls, and at the end of each sequence")
+    parser.add_argument("--batch", type=int, default=50, help="Valid calls per driver call")
+    parser.add_argument("--invalid", type=float, default=0.02, help="Share of invalid calls")
+    parser.add_argument("--output", default="failures.jsonl")
+    parser.add_argument("--replay", help="Replay the sequences of a failures file instead")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        with open(args.replay) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        failed = 0
+        replayers = {}
+        for entry in entries:
+            key = (entry["holders"], entry["tokens"])
+            if key not in replayers:
+                replayers[key] = Replayer(entry["holders"], entry["tokens"], args.check_every, args.batch)
+            failure = replayers[key].run(entry["ops"], entry.get("start"))
+            failed += failure is not None
+            print("seed %s: %s" % (entry["seed"], "still fails: %s" % failure["error"] if failure else "passes"))
+        return 1 if failed else 0
+
+    start = time.monotonic()
+    failures, calls = fuzz(
+        args.seeds, args.length, args.workers, args.holders, args.tokens, args.check_every, args.batch, args.invalid,
+    )
+    seconds = time.monotonic() - start
+    with open(args.output, "w") as f:
+        for failure in failures:
+            f.write(json.dumps(failure) + "\n")
+    print("%d calls in %.1fs (%.0f per minute), %d failing seeds" % (
+        calls, seconds, calls * 60 / seconds if seconds else 0, len(failures),
+    ))
+    for failure in failures:
+        if failure["step"] is None:
+            print("seed %d: the setup failed, %s" % (failure["seed"], failure["error"]))
+        else:
+            print("seed %d: %d calls after shrinking, %s" % (failure["seed"], len(failure["ops"]), failure["error"]))
+    if failures:
+        print("Wrote the failures to %s" % args.output)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
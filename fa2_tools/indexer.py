@@ -0,0 +1,532 @@
+"""Local SQLite index of FA2 balances, supplies, operators and token metadata.
+
+Answering "who holds token 3" or "which tokens does this account hold"
+from a contract means walking its whole ledger big_map. This module
+follows the big_map updates of the FA2 contracts instead and keeps the
+current state in SQLite tables indexed by owner and by token ID:
+
+    index = Index("fa2.sqlite")
+    index.ingest_costs_log("calls.jsonl")
+    index.holders("KT1...", 0)      # [(owner, balance), ...]
+    index.tokens_of("KT1...", "tz1...")
+
+Updates come from `octez-client` receipts, whose "Updated big_maps"
+section lists every `Set` and `Unset` of the operation, and every `Copy`
+of a big_map into a new one, such as a contract originated with a copy
+of another's big_map. They can be read
+from the log that `python -m fa2_tools.costs run --log calls.jsonl`
+keeps while scenarios run in mockup simulation mode, from receipts saved
+by `fa2_tools.mockup` or a sandbox, or from a JSON Lines file of already
+decoded updates (`nft_ledger` for the NFT ledger):
+
+    {"contract": "KT1...", "big_map": "ledger", "action": "set", "key": ["tz1...", 0], "value": 10}
+
+The big_maps of each contract are recognized when the contract is
+originated, by the field annotation of each big_map in the storage type
+of the script, so the fungible (`(address, nat) -> nat`) and NFT
+(`nat -> address`) ledgers, `supply`, `operators` and `token_metadata`
+are all followed, but not other big_maps of the same types, such as
+checkpoint counts. When the IDs of the new big_maps don't follow the
+storage order, only the big_maps whose type no other field has are
+recognized. Each source remembers how far it was read, so
+ingesting the same growing log again only applies the new operations; a
+log that was rewritten since, such as the one of a new `costs run`, is
+read again from the start.
+
+    python -m fa2_tools.indexer fa2.sqlite ingest calls.jsonl
+    python -m fa2_tools.indexer fa2.sqlite holders KT1... 0
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+
+from fa2_tools.michelson import address_from_bytes, parse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS big_maps (
+    big_map_id INTEGER PRIMARY KEY,
+    contract TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS balances (
+    contract TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    balance TEXT NOT NULL,
+    PRIMARY KEY (contract, owner, token_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS balances_by_token ON balances (contract, token_id);
+CREATE TABLE IF NOT EXISTS supplies (
+    contract TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    supply TEXT NOT NULL,
+    PRIMARY KEY (contract, token_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS operators (
+    contract TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    operator TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    PRIMARY KEY (contract, owner, operator, token_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS operators_by_operator ON operators (contract, operator);
+CREATE TABLE IF NOT EXISTS token_metadata (
+    contract TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (contract, token_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    head BLOB NOT NULL
+);
+"""
+
+# Big_map types of the FA2 storage, without annotations, and the name they are indexed under.
+# A big_map is only indexed when its field annotation is that name (`%ledger` for `nft_ledger`).
+BIG_MAP_TYPES = {
+    "(big_map (pair address nat) nat)": "ledger",
+    "(big_map nat address)": "nft_ledger",
+    "(big_map nat nat)": "supply",
+    "(big_map (pair address (pair address nat)) unit)": "operators",
+    "(big_map (pair address address nat) unit)": "operators",
+    "(big_map nat (pair nat (map string bytes)))": "token_metadata",
+}
+
+# The table of each big_map name, and the columns of each table after `contract`
+_TABLES = dict(ledger="balances", nft_ledger="balances", supply="supplies",
+               operators="operators", token_metadata="token_metadata")
+_COLUMNS = dict(balances="owner, token_id, balance", supplies="token_id, supply",
+                operators="owner, operator, token_id", token_metadata="token_id, key, value")
+
+_HEADER_RE = re.compile(r"^\s*(Transaction|Origination|Reveal|Delegation|Event):\s*$")
+_TO_RE = re.compile(r"^\s*To: (KT1\w+)")
+_ORIGINATED_RE = re.compile(r"^\s*(KT1\w+)\s*$")
+_NEW_RE = re.compile(r"^\s*New map\((\d+)\) of type (.*)$")
+_SET_RE = re.compile(r"^\s*Set map\((\d+)\)\[(.*)\] to (.*)$")
+_UNSET_RE = re.compile(r"^\s*Unset map\((\d+)\)\[(.*)\]\s*$")
+_COPY_RE = re.compile(r"^\s*Copy map\((\d+)\) to map\((\d+)\)\s*$")
+_ANNOTATION_RE = re.compile(r"\s*[%:@]\w+")
+_BARE_PRIM_RE = re.compile(r"\((\w+)\)")
+_FAILED_RE = re.compile(r"This operation FAILED|was BACKTRACKED|was skipped")
+_SCRIPT_TOKEN_RE = re.compile(r'\s*(\(|\)|\{|\}|;|"(?:[^"\\]|\\.)*"|[^\s(){};"]+)')
+
+
+def _normalize(michelson_type):
+    normalized = " ".join(_ANNOTATION_RE.sub("", michelson_type).split())
+    normalized = normalized.replace("( ", "(").replace(" )", ")")
+    # `(nat %token_id)` leaves `(nat)` once its annotation is gone
+    return _BARE_PRIM_RE.sub(r"\1", normalized)
+
+
+def _big_map_name(field, michelson_type):
+    name = BIG_MAP_TYPES.get(_normalize(michelson_type))
+    if name is None or field not in (name, "ledger" if name == "nft_ledger" else name):
+        return None
+    return name
+
+
+def storage_big_maps(script):
+    """Return the (field annotation, type) of each big_map field in the storage type of a script.
+
+    The big_maps are listed in storage order, which is the order in which
+    an origination allocates their IDs. Fields without an annotation have
+    None as their annotation.
+    """
+    tokens = [match.group(1) for match in _SCRIPT_TOKEN_RE.finditer(script)]
+    if "storage" not in tokens:
+        return []
+    position = tokens.index("storage") + 1
+    end = position
+    depth = 0
+    while end < len(tokens) and (depth or tokens[end] not in (";", "}")):
+        depth += {"(": 1, ")": -1}.get(tokens[end], 0)
+        end += 1
+    storage = tokens[position:end]
+    if storage[:1] != ["("]:
+        storage = ["("] + storage + [")"]
+    node, _ = _parse_type(storage, 0)
+    return list(_big_map_fields(node))
+
+
+def _parse_type(tokens, position):
+    """Parse a type into (prim, annotations, args) from a list of tokens."""
+    if tokens[position] != "(":
+        return (tokens[position], [], []), position + 1
+    prim, annotations, args = tokens[position + 1], [], []
+    position += 2
+    while tokens[position] != ")":
+        if tokens[position][0] in "%:@":
+            annotations.append(tokens[position])
+            position += 1
+        else:
+            arg, position = _parse_type(tokens, position)
+            args.append(arg)
+    return (prim, annotations, args), position + 1
+
+
+def _type_text(node):
+    prim, annotations, args = node
+    if not args and not annotations:
+        return prim
+    return "(%s)" % " ".join([prim] + annotations + [_type_text(arg) for arg in args])
+
+
+def _big_map_fields(node):
+    prim, annotations, args = node
+    if prim == "big_map":
+        field = next((annotation[1:] for annotation in annotations if annotation[0] == "%"), None)
+        yield field, _type_text((prim, [], args))
+    elif prim == "pair":
+        # Big_maps under `or` or `option` may not exist, so only pairs are followed
+        for arg in args:
+            yield from _big_map_fields(arg)
+
+
+def _address(value):
+    return address_from_bytes(value) if isinstance(value, bytes) else value
+
+
+def _text(value):
+    return value.decode("utf-8", "replace") if isinstance(value, bytes) else value
+
+
+def receipt_updates(text):
+    """Yield the big_map updates of an applied octez-client receipt.
+
+    Each update is a dict with `action` (`new`, `copy`, `set` or
+    `unset`), the big_map ID, the contract the operation ran on, and the
+    key and value as Michelson text. `new` updates also have the `type`
+    of the big_map, and `copy` updates the `source` big_map ID; both have
+    the `name` the new big_map is indexed under, or None if it isn't an
+    FA2 big_map or isn't recognized.
+    """
+    if _FAILED_RE.search(text):
+        return
+    contract = None
+    expect_originated = False
+    script = None
+    pending = []
+    for line in text.splitlines():
+        if _HEADER_RE.match(line):
+            yield from _finish(pending, contract, script)
+            pending = []
+            contract = None
+            script = None
+            continue
+        if line.strip() == "Script:":
+            script = []
+            continue
+        if isinstance(script, list):
+            if line.strip().startswith("Initial storage:"):
+                script = " ".join(script)
+            else:
+                script.append(line)
+            continue
+        to = _TO_RE.match(line)
+        if to:
+            contract = to.group(1)
+            continue
+        if line.strip() == "Originated contracts:":
+            expect_originated = True
+            continue
+        if expect_originated:
+            expect_originated = False
+            originated = _ORIGINATED_RE.match(line)
+            if originated:
+                contract = originated.group(1)
+                continue
+        match = _NEW_RE.match(line)
+        if match:
+            pending.append(dict(action="new", big_map_id=int(match.group(1)), type=match.group(2)))
+            continue
+        match = _SET_RE.match(line)
+        if match:
+            pending.append(dict(action="set", big_map_id=int(match.group(1)),
+                                key=match.group(2), value=match.group(3)))
+            continue
+        match = _UNSET_RE.match(line)
+        if match:
+            pending.append(dict(action="unset", big_map_id=int(match.group(1)), key=match.group(2)))
+            continue
+        match = _COPY_RE.match(line)
+        if match:
+            pending.append(dict(action="copy", big_map_id=int(match.group(2)), source=int(match.group(1))))
+    yield from _finish(pending, contract, script)
+
+
+def _finish(pending, contract, script):
+    # "Originated contracts" can come after the big_map updates of the origination.
+    # A copy has no type in the receipt, so it matches the field at its position.
+    new = sorted((update for update in pending if update["action"] in ("new", "copy")),
+                 key=lambda update: update["big_map_id"])
+    fields = storage_big_maps(script) if isinstance(script, str) else []
+    if len(fields) == len(new) and all(update["action"] == "copy"
+                                       or _normalize(update["type"]) == _normalize(field_type)
+                                       for update, (_, field_type) in zip(new, fields)):
+        for update, (field, field_type) in zip(new, fields):
+            update["name"] = _big_map_name(field, field_type)
+    else:
+        # Without the script, or when the IDs don't follow the storage order, only
+        # the big_maps whose type no other new big_map has are recognized, by the
+        # field of that type in the script if there is one
+        types = [_normalize(update["type"]) for update in new if update["action"] == "new"]
+        field_types = [_normalize(field_type) for _, field_type in fields]
+        for update in new:
+            if update["action"] == "copy":
+                update["name"] = None
+                continue
+            michelson_type = _normalize(update["type"])
+            if types.count(michelson_type) != 1:
+                update["name"] = None
+            elif fields:
+                matching = [field for field, field_type in fields if _normalize(field_type) == michelson_type]
+                update["name"] = (_big_map_name(matching[0], michelson_type)
+                                  if field_types.count(michelson_type) == 1 else None)
+            else:
+                update["name"] = BIG_MAP_TYPES.get(michelson_type)
+    for update in pending:
+        yield dict(update, contract=contract)
+
+
+class Index:
+    def __init__(self, path=":memory:"):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # Updates
+
+    def apply(self, contract, name, action, key, value=None):
+        """Apply one decoded update of the big_map `name` of a contract.
+
+        Keys and values are Python values as returned by
+        `fa2_tools.michelson.parse`, with addresses as strings or bytes.
+        """
+        if name == "ledger":
+            owner, token_id = _address(key[0]), key[1]
+            if action == "unset" or value == 0:
+                self.db.execute("DELETE FROM balances WHERE contract = ? AND owner = ? AND token_id = ?",
+                                (contract, owner, token_id))
+            else:
+                self.db.execute("INSERT OR REPLACE INTO balances VALUES (?, ?, ?, ?)",
+                                (contract, owner, token_id, str(value)))
+        elif name == "nft_ledger":
+            self.db.execute("DELETE FROM balances WHERE contract = ? AND token_id = ?", (contract, key))
+            if action == "set":
+                self.db.execute("INSERT INTO balances VALUES (?, ?, ?, '1')", (contract, _address(value), key))
+        elif name == "supply":
+            if action == "unset":
+                self.db.execute("DELETE FROM supplies WHERE contract = ? AND token_id = ?", (contract, key))
+            else:
+                self.db.execute("INSERT OR REPLACE INTO supplies VALUES (?, ?, ?)", (contract, key, str(value)))
+        elif name == "operators":
+            owner, operator, token_id = _address(key[0]), _address(key[1]), key[2]
+            if action == "unset":
+                self.db.execute(
+                    "DELETE FROM operators WHERE contract = ? AND owner = ? AND operator = ? AND token_id = ?",
+                    (contract, owner, operator, token_id))
+            else:
+                self.db.execute("INSERT OR REPLACE INTO operators VALUES (?, ?, ?, ?)",
+                                (contract, owner, operator, token_id))
+        elif name == "token_metadata":
+            self.db.execute("DELETE FROM token_metadata WHERE contract = ? AND token_id = ?", (contract, key))
+            if action == "set":
+                _, token_info = value
+                self.db.executemany(
+                    "INSERT INTO token_metadata VALUES (?, ?, ?, ?)",
+                    [(contract, key, field, data) for field, data in token_info.items()])
+        else:
+            raise ValueError("Unknown big_map %r" % name)
+
+    def apply_receipt(self, text):
+        """Apply the FA2 big_map updates of one octez-client receipt."""
+        with self.db:
+            for update in receipt_updates(text):
+                if update["action"] == "new":
+                    name = update["name"]
+                    if name and update["contract"]:
+                        self.db.execute("INSERT OR REPLACE INTO big_maps VALUES (?, ?, ?)",
+                                        (update["big_map_id"], update["contract"], name))
+                    continue
+                if update["action"] == "copy":
+                    self._copy(update)
+                    continue
+                row = self.db.execute("SELECT contract, name FROM big_maps WHERE big_map_id = ?",
+                                      (update["big_map_id"],)).fetchone()
+                if row is None:
+                    continue  # Not an FA2 big_map, or a temporary one
+                value = parse(update["value"]) if update["action"] == "set" else None
+                self.apply(row[0], row[1], update["action"], parse(update["key"]), value)
+
+    def _copy(self, update):
+        """Index a big_map copied from an indexed one, with the entries of its source."""
+        source = self.db.execute("SELECT contract, name FROM big_maps WHERE big_map_id = ?",
+                                 (update["source"],)).fetchone()
+        contract = update["contract"]
+        if source is None or not contract:
+            return  # The entries of a big_map that isn't indexed are unknown
+        name = update["name"]
+        if name is None:
+            # Without its field, the copy takes the name of its source, unless
+            # the contract already has a big_map under that name
+            known = self.db.execute("SELECT 1 FROM big_maps WHERE contract = ? AND name = ?",
+                                    (contract, source[1])).fetchone()
+            name = None if known else source[1]
+        if name != source[1]:
+            return
+        self.db.execute("INSERT OR REPLACE INTO big_maps VALUES (?, ?, ?)", (update["big_map_id"], contract, name))
+        table = _TABLES[name]
+        self.db.execute("DELETE FROM %s WHERE contract = ?" % table, (contract,))
+        self.db.execute("INSERT INTO %s SELECT ?, %s FROM %s WHERE contract = ?"
+                        % (table, _COLUMNS[table], table), (contract, source[0]))
+
+    def _lines(self, path):
+        """Yield the lines of a source that were not read before, then remember the position.
+
+        A source is read again from the start when it was replaced by
+        another file, shrank, or starts with another line than when it was
+        last read, as a log that was truncated and written again does.
+        """
+        source = os.path.abspath(path)
+        row = self.db.execute("SELECT position, inode, head FROM sources WHERE source = ?", (source,)).fetchone()
+        with open(path, "rb") as f:
+            status = os.fstat(f.fileno())
+            head = hashlib.sha256(f.readline()).digest()
+            position = 0
+            if row and row[1] == status.st_ino and bytes(row[2]) == head and row[0] <= status.st_size:
+                position = row[0]
+            f.seek(position)
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    break  # Still being written
+                yield line.decode("utf-8")
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                                    (source, f.tell(), status.st_ino, head))
+
+    def ingest_costs_log(self, path):
+        """Apply the receipts in a `fa2_tools.costs` wrapper log. Returns the number of receipts."""
+        count = 0
+        for line in self._lines(path):
+            entry = json.loads(line)
+            if entry.get("returncode") == 0 and "--dry-run" not in entry.get("argv", []):
+                self.apply_receipt(entry["stdout"])
+                count += 1
+        return count
+
+    def ingest_events(self, path):
+        """Apply a JSON Lines file of decoded updates. Returns the number of updates."""
+        count = 0
+        for line in self._lines(path):
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            key = event["key"]
+            with self.db:
+                self.apply(event["contract"], event["big_map"], event["action"],
+                           tuple(key) if isinstance(key, list) else key, event.get("value"))
+            count += 1
+        return count
+
+    def ingest_receipt_file(self, path):
+        with open(path) as f:
+            self.apply_receipt(f.read())
+        return 1
+
+    def ingest(self, path):
+        """Apply a wrapper log (`.jsonl` with receipts), an update file (`.jsonl`) or a receipt text file."""
+        if not (path.endswith(".jsonl") or path.endswith(".ndjson")):
+            return self.ingest_receipt_file(path)
+        with open(path) as f:
+            first = f.readline()
+        if first.strip() and "big_map" in json.loads(first):
+            return self.ingest_events(path)
+        return self.ingest_costs_log(path)
+
+    # Queries
+
+    def balance(self, contract, owner, token_id):
+        row = self.db.execute("SELECT balance FROM balances WHERE contract = ? AND owner = ? AND token_id = ?",
+                              (contract, owner, token_id)).fetchone()
+        return int(row[0]) if row else 0
+
+    def holders(self, contract, token_id):
+        """Return the (owner, balance) pairs of a token with a non-zero balance."""
+        rows = self.db.execute("SELECT owner, balance FROM balances WHERE contract = ? AND token_id = ? "
+                               "ORDER BY owner", (contract, token_id))
+        return [(owner, int(balance)) for owner, balance in rows]
+
+    def tokens_of(self, contract, owner):
+        """Return the (token_id, balance) pairs that an account holds."""
+        rows = self.db.execute("SELECT token_id, balance FROM balances WHERE contract = ? AND owner = ? "
+                               "ORDER BY token_id", (contract, owner))
+        return [(token_id, int(balance)) for token_id, balance in rows]
+
+    def supply(self, contract, token_id):
+        row = self.db.execute("SELECT supply FROM supplies WHERE contract = ? AND token_id = ?",
+                              (contract, token_id)).fetchone()
+        return int(row[0]) if row else None
+
+    def operators_of(self, contract, owner):
+        """Return the (operator, token_id) pairs that an owner has approved."""
+        return self.db.execute("SELECT operator, token_id FROM operators WHERE contract = ? AND owner = ? "
+                               "ORDER BY operator, token_id", (contract, owner)).fetchall()
+
+    def token_metadata(self, contract, token_id):
+        rows = self.db.execute("SELECT key, value FROM token_metadata WHERE contract = ? AND token_id = ?",
+                               (contract, token_id))
+        return {key: bytes(value) for key, value in rows}
+
+    def contracts(self):
+        return [row[0] for row in self.db.execute("SELECT DISTINCT contract FROM big_maps ORDER BY contract")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Apply receipts or update files to the index")
+    ingest.add_argument("sources", nargs="+")
+    holders = commands.add_parser("holders", help="List the holders of a token")
+    holders.add_argument("contract")
+    holders.add_argument("token_id", type=int)
+    tokens = commands.add_parser("tokens", help="List the tokens of an account")
+    tokens.add_argument("contract")
+    tokens.add_argument("owner")
+    metadata = commands.add_parser("metadata", help="Show the metadata of a token")
+    metadata.add_argument("contract")
+    metadata.add_argument("token_id", type=int)
+    args = parser.parse_args(argv)
+
+    index = Index(args.database)
+    try:
+        if args.command == "ingest":
+            for source in args.sources:
+                print("%s: %d new entries" % (source, index.ingest(source)))
+        elif args.command == "holders":
+            for owner, balance in index.holders(args.contract, args.token_id):
+                print(owner, balance)
+        elif args.command == "tokens":
+            for token_id, balance in index.tokens_of(args.contract, args.owner):
+                print(token_id, balance)
+        else:
+            for key, value in index.token_metadata(args.contract, args.token_id).items():
+                print(key, _text(value))
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Offline, content-addressed stand-in for `sp.pin_on_ipfs`.
+
+`pin_on_ipfs` takes the same arguments as `sp.pin_on_ipfs` and returns the
+same `ipfs://` URI, but by default it computes the IPFS content ID (CID)
+of the metadata locally and stores the JSON in a local content-addressed
+store instead of uploading it to Pinata. Scenario runs stay offline,
+deterministic and fast, and the URI that ends up in `metadata_of_url` is
+the one Pinata would return for the same JSON.
+
+Set the `FA2_IPFS_BACKEND` environment variable to choose the backend:
+
+- `local` (default): store the blob in `.fa2_ipfs/` at the repository root
+  or in the directory set by `FA2_IPFS_STORE`.
+- `pinata`: upload with `sp.pin_on_ipfs` and the Pinata keys, but only if
+  the same blob has not been uploaded before.
+
+The CID is computed the way IPFS adds a file by default: the JSON is
+split into 256 KiB chunks and stored as a UnixFS file. CIDv0 (`Qm...`)
+wraps the chunks in dag-pb nodes, which is what Pinata returns unless you
+ask it for CIDv1. CIDv1 (`bafy...`/`bafk...`) uses raw leaves.
+
+The tutorial files call `sp.pin_on_ipfs` themselves, so that they still
+run on their own or in the SmartPy IDE. `install` makes `sp.pin_on_ipfs`
+use `pin_on_ipfs` in the current process, and running a file through this
+module does the same for that file:
+
+    python -m fa2_tools.ipfs smartpy_fa2_fungible/part_4_complete.py
+
+`fa2_tools.runner` and `fa2_tools.trace` run the scenario files this way.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE = os.path.join(ROOT, ".fa2_ipfs")
+
+CHUNK_SIZE = 256 * 1024
+# Most links in one node of the balanced file layout that `ipfs add` uses
+MAX_LINKS = 174
+
+_DAG_PB = 0x70
+_RAW = 0x55
+_SHA2_256 = 0x12
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# SmartPy's own `pin_on_ipfs`, which uploads to Pinata, once `install` replaced it
+_sp_pin_on_ipfs = None
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, value):
+    """Encode a protobuf length-delimited field."""
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _uint_field(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _unixfs_file(data=b"", filesize=0, blocksizes=()):
+    # UnixFS Data message: Type = File (2), Data, filesize, blocksizes
+    message = _uint_field(1, 2)
+    if data:
+        message += _field(2, data)
+    message += _uint_field(3, filesize)
+    for size in blocksizes:
+        message += _uint_field(4, size)
+    return message
+
+
+def _dag_pb(links, data):
+    """Encode a dag-pb node. Links come before Data in the canonical form."""
+    node = b""
+    for digest, tsize in links:
+        # PBLink: Hash (1), Name (2), Tsize (3)
+        link = _field(1, digest) + _field(2, b"") + _uint_field(3, tsize)
+        node += _field(2, link)
+    return node + _field(1, data)
+
+
+def _multihash(block):
+    return bytes([_SHA2_256, 32]) + hashlib.sha256(block).digest()
+
+
+def _base58(data):
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, remainder = divmod(n, 58)
+        out = _BASE58_ALPHABET[remainder] + out
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return "1" * leading_zeros + out
+
+
+def _cid_string(version, codec, multihash):
+    if version == 0:
+        return _base58(multihash)
+    cid = _varint(1) + _varint(codec) + multihash
+    return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+
+def compute_cid(blob, version=0):
+    """Return the CID that `ipfs add` (and Pinata) gives to a file with this content."""
+    raw_leaves = version == 1
+    # Each node is (multihash, codec, file size, cumulative block size)
+    nodes = []
+    for start in range(0, max(len(blob), 1), CHUNK_SIZE):
+        chunk = blob[start:start + CHUNK_SIZE]
+        if raw_leaves:
+            block, codec = chunk, _RAW
+        else:
+            block = _dag_pb([], _unixfs_file(chunk, len(chunk)))
+            codec = _DAG_PB
+        nodes.append((_multihash(block), codec, len(chunk), len(block)))
+
+    # Build the balanced tree one layer at a time, like `ipfs add`
+    while len(nodes) > 1:
+        parents = []
+        for start in range(0, len(nodes), MAX_LINKS):
+            children = nodes[start:start + MAX_LINKS]
+            filesize = sum(child[2] for child in children)
+            block = _dag_pb(
+                [(child[0], child[3]) for child in children],
+                _unixfs_file(filesize=filesize, blocksizes=[child[2] for child in children]),
+            )
+            tsize = len(block) + sum(child[3] for child in children)
+            parents.append((_multihash(block), _DAG_PB, filesize, tsize))
+        nodes = parents
+
+    multihash, codec, _, _ = nodes[0]
+    return _cid_string(version, codec, multihash)
+
+
+def serialize(metadata):
+    """Serialize metadata the way Pinata stores JSON: compact, in key order, UTF-8."""
+    return json.dumps(metadata, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class LocalStore:
+    """A directory of blobs named by their CID."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get("FA2_IPFS_STORE") or DEFAULT_STORE
+
+    def path(self, cid):
+        return os.path.join(self.directory, cid)
+
+    def __contains__(self, cid):
+        return os.path.exists(self.path(cid))
+
+    def put(self, cid, blob):
+        if cid in self:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        staging = self.path(cid) + ".%d.tmp" % os.getpid()
+        with open(staging, "wb") as f:
+            f.write(blob)
+        os.replace(staging, self.path(cid))
+
+    def get(self, cid):
+        with open(self.path(cid), "rb") as f:
+            return f.read()
+
+    def mark_pinned(self, cid, uri):
+        with open(self.path(cid) + ".pinned", "w") as f:
+            f.write(uri)
+
+    def pinned_uri(self, cid):
+        if not os.path.exists(self.path(cid) + ".pinned"):
+            return None
+        with open(self.path(cid) + ".pinned") as f:
+            return f.read().strip()
+
+
+def pin_on_ipfs(metadata, api_key=None, secret_key=None, name=None, cid_version=0, backend=None, store=None):
+    """Drop-in replacement for `sp.pin_on_ipfs` that returns an `ipfs://` URI."""
+    backend = backend or os.environ.get("FA2_IPFS_BACKEND", "local")
+    store = store or LocalStore()
+    blob = serialize(metadata)
+    cid = compute_cid(blob, cid_version)
+    store.put(cid, blob)
+
+    if backend == "local":
+        return "ipfs://" + cid
+    if backend == "pinata":
+        # Identical metadata was already uploaded: reuse its URI
+        uri = store.pinned_uri(cid)
+        if uri is None:
+            upload = _sp_pin_on_ipfs
+            if upload is None:
+                import smartpy as sp
+
+                upload = sp.pin_on_ipfs
+            uri = upload(metadata, api_key=api_key, secret_key=secret_key, name=name)
+            store.mark_pinned(cid, uri)
+        return uri
+    raise ValueError("Unknown IPFS backend %r; use 'local' or 'pinata'" % backend)
+
+
+def install():
+    """Make `sp.pin_on_ipfs` use `pin_on_ipfs` in this process, once."""
+    global _sp_pin_on_ipfs
+    import smartpy as sp
+
+    if _sp_pin_on_ipfs is None:
+        _sp_pin_on_ipfs = sp.pin_on_ipfs
+        sp.pin_on_ipfs = pin_on_ipfs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a scenario file with the offline `pin_on_ipfs`")
+    parser.add_argument("script", help="Scenario file to run")
+    args = parser.parse_args(argv)
+
+    install()
+    script = os.path.abspath(args.script)
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name="__main__")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+# Alias the main template for FA2 contracts
+main = fa2.main
+
+
+@sp.module
+def lazy_metadata():
+    import main
+
+    mint_many_batch: type = sp.list[sp.record(to_=sp.address, count=sp.nat)]
+
+    class LazyMetadataNft(main.AdminInterface, main.NftInterface, main.CommonInterface):
+        """(Mixin) Token metadata generated from a collection-wide template.
+
+        Instead of storing a `token_info` map per token, the contract stores
+        one base URI and one map of fields shared by the whole collection.
+        The `token_metadata` off-chain view (TZIP-16) builds each token's
+        metadata from them: the shared fields, a `name` that ends with
+        ` #<token_id>`, and the `""` key pointing to `<base_uri><token_id>.json`
+        for the rest (TZIP-21). Tokens with an entry in the `token_metadata`
+        big_map keep that entry instead, so single tokens can be overridden.
+
+        `mint_many` mints a number of tokens to each recipient and only
+        writes their ledger entries.
+
+        The contract must also override `is_defined_` so that tokens without
+        a `token_metadata` entry exist, for example
+        `return token_id < self.data.next_token_id`.
+        """
+
+        def __init__(self, base_uri, template):
+            main.CommonInterface.__init__(self)
+            main.NftInterface.__init__(self)
+            main.AdminInterface.__init__(self)
+            self.data.base_uri = sp.cast(base_uri, sp.bytes)
+            self.data.metadata_template = sp.cast(template, sp.map[sp.string, sp.bytes])
+
+        @sp.entrypoint
+        def mint_many(self, batch):
+            sp.cast(batch, mint_many_batch)
+            assert self.is_administrator_(), "FA2_NOT_ADMIN"
+            for action in batch:
+                for i in range(0, action.count):
+                    self.data.ledger[self.data.next_token_id] = action.to_
+                    self.data.next_token_id += 1
+
+        @sp.entrypoint
+        def set_base_uri(self, base_uri):
+            sp.cast(base_uri, sp.bytes)
+            assert self.is_administrator_(), "FA2_NOT_ADMIN"
+            self.data.base_uri = base_uri
+
+        @sp.entrypoint
+        def set_token_metadata_overrides(self, overrides):
+            sp.cast(overrides, sp.list[sp.record(token_id=sp.nat, token_info=sp.map[sp.string, sp.bytes])])
+            assert self.is_administrator_(), "FA2_NOT_ADMIN"
+            for override in overrides:
+                assert self.is_defined_(override.token_id), "FA2_TOKEN_UNDEFINED"
+                self.data.token_metadata[override.token_id] = sp.record(
+                    token_id=override.token_id, token_info=override.token_info
+                )
+
+        @sp.offchain_view()
+        def token_metadata(self, token_id):
+            sp.cast(token_id, sp.nat)
+            assert self.is_defined_(token_id), "FA2_TOKEN_UNDEFINED"
+            result = sp.record(token_id=token_id, token_info=self.data.metadata_template)
+            if token_id in self.data.token_metadata:
+                result = self.data.token_metadata[token_id]
+            else:
+                # Decimal digits of the token ID, as ASCII bytes
+                ascii_digits = {
+                    0: sp.bytes("0x30"), 1: sp.bytes("0x31"), 2: sp.bytes("0x32"),
+                    3: sp.bytes("0x33"), 4: sp.bytes("0x34"), 5: sp.bytes("0x35"),
+                    6: sp.bytes("0x36"), 7: sp.bytes("0x37"), 8: sp.bytes("0x38"),
+                    9: sp.bytes("0x39"),
+                }
+                digits = ascii_digits[sp.mod(token_id, 10)]
+                rest = sp.fst(sp.ediv(token_id, 10).unwrap_some())
+                while rest > 0:
+                    digits = ascii_digits[sp.mod(rest, 10)] + digits
+                    rest = sp.fst(sp.ediv(rest, 10).unwrap_some())
+                if "name" in result.token_info:
+                    # " #" + digits
+                    result.token_info["name"] = result.token_info["name"] + sp.bytes("0x2023") + digits
+                # ".json"
+                result.token_info[""] = self.data.base_uri + digits + sp.bytes("0x2e6a736f6e")
+            return result
@@ -0,0 +1,239 @@
+"""Import large holder snapshots into the tutorial FA2 contracts.
+
+Passing millions of holders to the `MyFungibleContract` constructor as a
+dict doesn't fit in memory or in an origination. This module streams a
+snapshot file instead: it puts as many balances as fit into the initial
+`ledger` and turns the rest into admin `mint` batches, filling each batch
+up to the operation size and gas budgets:
+
+    importer = FungibleImport("holders.csv", "holders.progress.json")
+    contract = my_module.MyFungibleContract(admin.address, sp.big_map(), importer.initial_ledger(), tokens)
+    scenario += contract
+    importer.originated()
+    for batch in importer.mint_batches():
+        contract.mint(batch, _sender=admin)
+        importer.submitted(batch)
+
+The snapshot is a CSV file with `owner`, `token_id` and `amount` columns
+or a JSON Lines file with the same keys. Progress is saved after the
+origination and after each batch, so an interrupted import started again
+with the same progress file skips what was already imported.
+
+On a node, an interruption can also happen after a batch was injected
+but before `submitted` was called. Call `injecting` with the batch and
+the hash of its signed operation, which is known before it's sent, and
+`submitted` once it's included. An import started again then stops at
+`pending_operation`: look the hash up on the chain and call `resolve`
+with whether it was included, so the batch is neither lost nor minted
+twice:
+
+    if importer.pending_operation():
+        importer.resolve(included=operation_included(importer.pending_operation()))
+    for batch in importer.mint_batches():
+        operation = sign_mint(batch)
+        importer.injecting(batch, operation.hash)
+        inject(operation)
+        wait_for_inclusion(operation.hash)
+        importer.submitted(batch)
+
+Only fungible snapshots are supported. The NFT contracts' `mint` numbers
+the tokens itself from `next_token_id` and needs each token's metadata,
+so an NFT snapshot with its own token IDs goes into the `ledger` and
+`token_metadata` of the constructor instead.
+
+Reading a snapshot and planning an import don't need SmartPy, which is
+only imported to build the initial ledger and the mint batches. To see
+how an import will be split without running it:
+
+    python -m fa2_tools.ledger holders.csv
+
+Sizes are estimated from the binary Michelson encoding of each entry.
+The default budgets leave room for the contract code in the origination
+and for the operation envelope in each batch; adjust them with the cost
+figures from `fa2_tools.bench`.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+
+from fa2_tools.michelson import ADDRESS_BYTES, PRIM_BYTES, nat_bytes
+from fa2_tools.rows import read_rows
+
+# Bytes of ledger entries to put in the origination, next to the contract code
+ORIGINATION_BYTES = 16000
+# Bytes of mint parameters per operation, below the 32 KiB operation limit
+BATCH_BYTES = 30000
+# Mint entries per operation, to stay below the operation gas limit
+BATCH_ENTRIES = 400
+
+
+def ledger_entry_bytes(token_id, amount):
+    """Size of `Elt (Pair owner token_id) amount` in the initial storage."""
+    return 2 * PRIM_BYTES + ADDRESS_BYTES + nat_bytes(token_id) + nat_bytes(amount)
+
+
+def mint_entry_bytes(token_id, amount):
+    """Size of one `sp.record(to_, amount, token=sp.variant("existing", token_id))` mint entry."""
+    return 3 * PRIM_BYTES + ADDRESS_BYTES + nat_bytes(token_id) + nat_bytes(amount)
+
+
+def read_snapshot(path):
+    """Yield (owner, token_id, amount) for each row of a snapshot file."""
+    for row in read_rows(path):
+        yield row["owner"], int(row["token_id"]), int(row["amount"])
+
+
+class FungibleImport:
+    def __init__(self, snapshot, progress_path=None,
+                 origination_bytes=ORIGINATION_BYTES, batch_bytes=BATCH_BYTES, batch_entries=BATCH_ENTRIES):
+        self.snapshot = snapshot
+        self.progress_path = progress_path
+        self.origination_bytes = origination_bytes
+        self.batch_bytes = batch_bytes
+        self.batch_entries = batch_entries
+        self.progress = dict(snapshot=os.path.abspath(snapshot), initial_entries=None,
+                             originated=False, imported_entries=0, batches=0, pending=None)
+        if progress_path and os.path.exists(progress_path):
+            with open(progress_path) as f:
+                self.progress = json.load(f)
+
+    def _save(self):
+        if not self.progress_path:
+            return
+        staging = self.progress_path + ".tmp"
+        with open(staging, "w") as f:
+            json.dump(self.progress, f, indent=2)
+        os.replace(staging, self.progress_path)
+
+    def _initial_entries(self):
+        """Count the leading snapshot rows that fit in the origination budget."""
+        count = 0
+        used = 0
+        for _, token_id, amount in read_snapshot(self.snapshot):
+            used += ledger_entry_bytes(token_id, amount)
+            if used > self.origination_bytes:
+                break
+            count += 1
+        return count
+
+    def initial_ledger(self):
+        """Return the balances to pass to the constructor, keyed by (owner, token_id)."""
+        if self.progress["initial_entries"] is None:
+            self.progress["initial_entries"] = self._initial_entries()
+            self._save()
+        import smartpy as sp
+
+        ledger = {}
+        rows = itertools.islice(read_snapshot(self.snapshot), self.progress["initial_entries"])
+        for owner, token_id, amount in rows:
+            key = (sp.address(owner), token_id)
+            ledger[key] = ledger.get(key, 0) + amount
+        return ledger
+
+    def originated(self):
+        """Record that the contract was originated with the initial ledger."""
+        self.progress["originated"] = True
+        self.progress["imported_entries"] = self.progress["initial_entries"]
+        self._save()
+
+    def _batches(self):
+        rows = itertools.islice(read_snapshot(self.snapshot), self.progress["imported_entries"], None)
+        batch = []
+        used = 0
+        for owner, token_id, amount in rows:
+            size = mint_entry_bytes(token_id, amount)
+            if batch and (used + size > self.batch_bytes or len(batch) >= self.batch_entries):
+                yield batch
+                batch = []
+                used = 0
+            batch.append((owner, token_id, amount))
+            used += size
+        if batch:
+            yield batch
+
+    def mint_batches(self):
+        """Yield the `mint` batches for the rows that are not imported yet.
+
+        Call `submitted` with each batch once its operation is applied.
+        """
+        import smartpy as sp
+
+        if not self.progress["originated"]:
+            raise RuntimeError("Originate the contract and call originated() before minting")
+        if self.pending_operation():
+            raise RuntimeError("Check whether operation %s was included and call resolve() before minting"
+                               % self.pending_operation())
+        for batch in self._batches():
+            yield [
+                sp.record(to_=sp.address(owner), amount=amount, token=sp.variant("existing", token_id))
+                for owner, token_id, amount in batch
+            ]
+
+    def injecting(self, batch, operation_hash):
+        """Record the hash of the operation of a batch, before it's injected."""
+        self.progress["pending"] = dict(operation=operation_hash, entries=len(batch))
+        self._save()
+
+    def pending_operation(self):
+        """Return the hash of an injected batch whose inclusion is unknown, or None."""
+        pending = self.progress.get("pending")
+        return pending["operation"] if pending else None
+
+    def resolve(self, included):
+        """Record whether the pending operation was included, after a restart."""
+        pending = self.progress["pending"]
+        if included:
+            self.progress["imported_entries"] += pending["entries"]
+            self.progress["batches"] += 1
+        self.progress["pending"] = None
+        self._save()
+
+    def submitted(self, batch):
+        """Record that a batch from `mint_batches` was applied."""
+        self.progress["imported_entries"] += len(batch)
+        self.progress["batches"] += 1
+        self.progress["pending"] = None
+        self._save()
+
+    def plan(self):
+        """Return how the snapshot splits into the origination and mint batches."""
+        initial = self._initial_entries()
+        plan = dict(initial_entries=initial, batches=0, batch_entries=0, largest_batch=0)
+        imported = self.progress["imported_entries"]
+        self.progress["imported_entries"] = initial
+        try:
+            for batch in self._batches():
+                plan["batches"] += 1
+                plan["batch_entries"] += len(batch)
+                plan["largest_batch"] = max(plan["largest_batch"], len(batch))
+        finally:
+            self.progress["imported_entries"] = imported
+        plan["operations"] = 1 + plan["batches"]
+        return plan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("snapshot")
+    parser.add_argument("--origination-bytes", type=int, default=ORIGINATION_BYTES)
+    parser.add_argument("--batch-bytes", type=int, default=BATCH_BYTES)
+    parser.add_argument("--batch-entries", type=int, default=BATCH_ENTRIES)
+    args = parser.parse_args(argv)
+
+    plan = FungibleImport(
+        args.snapshot,
+        origination_bytes=args.origination_bytes,
+        batch_bytes=args.batch_bytes,
+        batch_entries=args.batch_entries,
+    ).plan()
+    print("%(initial_entries)d entries in the origination, %(batch_entries)d entries "
+          "in %(batches)d mint batches (largest: %(largest_batch)d), "
+          "%(operations)d operations in total" % plan)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
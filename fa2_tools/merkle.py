@@ -0,0 +1,194 @@
+"""Streaming Merkle tree builder for `fa2_tools.airdrop` claims.
+
+An airdrop stores only the root of a Merkle tree of its allocations in
+the contract. Each recipient claims with the allocation and its proof.
+This module builds the root and the proofs from a CSV or JSON Lines file
+with `owner`, `token_id` and `amount` columns (`amount` defaults to 1 for
+NFTs):
+
+    python -m fa2_tools.merkle airdrop.csv --output proofs.jsonl
+
+It writes one JSON line per allocation, with its index and proof, and
+prints the root to pass to the contract. Rows are read twice in order and
+never held in memory: the tree is built one level at a time in files of
+32-byte hashes in a working directory, and the proofs are read back from
+those files. Millions of allocations need a few hundred megabytes of disk
+and little memory.
+
+Leaves and nodes are hashed like the contract does it:
+
+- leaf: `blake2b(0x00 + PACK(Pair index (Pair owner (Pair token_id amount))))`
+- node: `blake2b(0x01 + left + right)`, where a node without a right
+  sibling is paired with itself
+
+so a proof is the list of sibling hashes from the leaf up, and the index
+tells which side each sibling is on.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+
+from fa2_tools.michelson import blake2b, encode_address, encode_int, encode_pair, pack
+from fa2_tools.rows import read_rows
+
+HASH_BYTES = 32
+# Hashes read and written at a time when building a level
+_CHUNK = 4096
+
+
+def leaf_hash(index, owner, token_id, amount):
+    data = encode_pair(
+        encode_int(index),
+        encode_pair(encode_address(owner), encode_pair(encode_int(token_id), encode_int(amount))),
+    )
+    return blake2b(b"\0" + pack(data))
+
+
+def node_hash(left, right):
+    return blake2b(b"\1" + left + right)
+
+
+def read_allocations(path):
+    """Yield (owner, token_id, amount) for each row of an allocation file."""
+    for row in read_rows(path):
+        yield row["owner"], int(row["token_id"]), int(row.get("amount") or 1)
+
+
+def _level_path(directory, level):
+    return os.path.join(directory, "level_%d.bin" % level)
+
+
+def build_levels(allocations, directory):
+    """Write the tree levels to `directory` and return the number of hashes in each level."""
+    counts = [0]
+    with open(_level_path(directory, 0), "wb") as f:
+        for index, (owner, token_id, amount) in enumerate(allocations):
+            f.write(leaf_hash(index, owner, token_id, amount))
+            counts[0] += 1
+    if counts[0] == 0:
+        raise ValueError("The airdrop has no allocations")
+
+    level = 0
+    while counts[level] > 1:
+        count = 0
+        with open(_level_path(directory, level), "rb") as source, \
+                open(_level_path(directory, level + 1), "wb") as target:
+            while True:
+                chunk = source.read(2 * HASH_BYTES * _CHUNK)
+                if not chunk:
+                    break
+                hashes = [chunk[i:i + HASH_BYTES] for i in range(0, len(chunk), HASH_BYTES)]
+                if len(hashes) % 2:
+                    hashes.append(hashes[-1])
+                target.write(b"".join(
+                    node_hash(hashes[i], hashes[i + 1]) for i in range(0, len(hashes), 2)
+                ))
+                count += len(hashes) // 2
+        counts.append(count)
+        level += 1
+    return counts
+
+
+def root(directory, counts):
+    with open(_level_path(directory, len(counts) - 1), "rb") as f:
+        return f.read(HASH_BYTES)
+
+
+def proofs(directory, counts):
+    """Yield the proof of each leaf, in order, as a list of sibling hashes."""
+    levels = []
+    try:
+        for level in range(len(counts) - 1):
+            with open(_level_path(directory, level), "rb") as f:
+                levels.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        for index in range(counts[0]):
+            proof = []
+            position = index
+            for level, hashes in enumerate(levels):
+                sibling = position ^ 1
+                if sibling >= counts[level]:
+                    sibling = position
+                proof.append(hashes[sibling * HASH_BYTES:(sibling + 1) * HASH_BYTES])
+                position >>= 1
+            yield proof
+    finally:
+        for hashes in levels:
+            hashes.close()
+
+
+def verify(index, owner, token_id, amount, proof, expected_root):
+    node = leaf_hash(index, owner, token_id, amount)
+    for sibling in proof:
+        node = node_hash(node, sibling) if index % 2 == 0 else node_hash(sibling, node)
+        index //= 2
+    return node == expected_root
+
+
+def _entries(allocations, directory, counts):
+    for index, ((owner, token_id, amount), proof) in enumerate(zip(allocations, proofs(directory, counts))):
+        yield dict(
+            index=index, owner=owner, token_id=token_id, amount=amount,
+            proof=[sibling.hex() for sibling in proof],
+        )
+
+
+def build(path, output, work_dir=None):
+    """Build the tree of an allocation file and write its proofs as JSON Lines.
+
+    Returns the root, the number of allocations, and the proof length.
+    """
+    directory = tempfile.mkdtemp(prefix="fa2_merkle_", dir=work_dir)
+    try:
+        counts = build_levels(read_allocations(path), directory)
+        tree_root = root(directory, counts)
+        with open(output, "w") as f:
+            for entry in _entries(read_allocations(path), directory, counts):
+                f.write(json.dumps(entry) + "\n")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return dict(root=tree_root.hex(), allocations=counts[0], depth=len(counts) - 1)
+
+
+def build_small(allocations):
+    """Return the root and the proof entries of a short list of allocations, for scenarios."""
+    allocations = list(allocations)
+    directory = tempfile.mkdtemp(prefix="fa2_merkle_")
+    try:
+        counts = build_levels(allocations, directory)
+        return root(directory, counts).hex(), list(_entries(allocations, directory, counts))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def claim_param(entry):
+    """Build the `claim` parameter entry for one line of the proofs file."""
+    import smartpy as sp
+
+    return sp.record(
+        index=entry["index"],
+        to_=sp.address(entry["owner"]),
+        token_id=entry["token_id"],
+        amount=entry["amount"],
+        proof=[sp.bytes("0x" + sibling) for sibling in entry["proof"]],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("allocations", help="CSV or JSON Lines file with owner, token_id and amount")
+    parser.add_argument("--output", default="proofs.jsonl")
+    parser.add_argument("--work-dir", help="Where to keep the tree levels while building")
+    args = parser.parse_args(argv)
+
+    result = build(args.allocations, args.output, args.work_dir)
+    print("Root 0x%(root)s for %(allocations)d allocations (proofs of %(depth)d hashes)" % result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
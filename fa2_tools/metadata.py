@@ -0,0 +1,137 @@
+"""Streaming token metadata builder for large NFT collections.
+
+`create_metadata` in `fa2_tools/examples/nft.py` builds one token's metadata
+by hand. This module builds the same metadata maps for whole collections
+read from a CSV or JSON Lines file with `fa2_tools.rows.read_rows`, one
+chunk at a time:
+
+    rows = read_rows("collection.csv")
+    initial, rest = split_initial(rows, 50, chunk_size=200)
+    contract = my_module.MyNFTContract(admin, sp.big_map(), ledger, initial)
+    for batch in mint_batches(rest, to_=admin):
+        contract.mint(batch, _sender=admin)
+
+Each row has the columns `symbol`, `name`, `decimals`, `description`,
+`thumbnailUri` and optionally `displayUri` and `artifactUri`, which
+default to `thumbnailUri`, and `owner` for `mint_batches`. Rows are read
+lazily and each chunk is dropped once it has been used, so memory stays
+flat however large the collection is. Strings that repeat across tokens,
+such as shared URIs and descriptions, are encoded to bytes once and
+reused.
+"""
+
+import functools
+import itertools
+import json
+import os
+
+import smartpy as sp
+
+FIELDS = ("name", "decimals", "symbol", "displayUri", "artifactUri", "description", "thumbnailUri")
+
+
+@functools.lru_cache(maxsize=65536)
+def encode(value):
+    """Return the bytes of a string, like `sp.scenario_utils.bytes_of_string`, once per distinct string."""
+    return sp.bytes("0x" + value.encode("utf-8").hex())
+
+
+def _fields(row):
+    thumbnail = row["thumbnailUri"]
+    return dict(
+        name=row["name"],
+        decimals="%d" % int(row.get("decimals") or 0),
+        symbol=row["symbol"],
+        displayUri=row.get("displayUri") or thumbnail,
+        artifactUri=row.get("artifactUri") or thumbnail,
+        description=row.get("description") or "",
+        thumbnailUri=thumbnail,
+    )
+
+
+def token_info(row):
+    """Return the `token_info` map for one row."""
+    fields = _fields(row)
+    return sp.map(l={key: encode(fields[key]) for key in FIELDS})
+
+
+def chunks(iterable, size):
+    """Yield lists of up to `size` items without reading further ahead."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def metadata_chunks(rows, chunk_size=200):
+    """Yield lists of `token_info` maps, `chunk_size` tokens at a time.
+
+    The fields of a chunk are encoded column by column, so each distinct
+    string in the chunk is encoded at most once.
+    """
+    for chunk in chunks(rows, chunk_size):
+        columns = [_fields(row) for row in chunk]
+        encoded = {
+            key: [encode(fields[key]) for fields in columns]
+            for key in FIELDS
+        }
+        yield [
+            sp.map(l={key: encoded[key][i] for key in FIELDS})
+            for i in range(len(chunk))
+        ]
+
+
+def mint_batches(rows, to_=None, chunk_size=200):
+    """Yield `mint` batches for `MyNFTContract`.
+
+    Each token goes to the address in the row's `owner` column, or to
+    `to_` if the row has none.
+    """
+    for chunk in chunks(rows, chunk_size):
+        metadata = next(metadata_chunks(chunk, chunk_size))
+        yield [
+            sp.record(
+                metadata=token_metadata,
+                to_=sp.address(row["owner"]) if row.get("owner") else to_,
+            )
+            for row, token_metadata in zip(chunk, metadata)
+        ]
+
+
+def split_initial(rows, count, chunk_size=200):
+    """Return the metadata of the first `count` tokens for the initial storage and the remaining rows.
+
+    Pass the list to the contract constructor and the remaining rows to
+    `mint_batches`.
+    """
+    rows = iter(rows)
+    initial = [metadata for chunk in metadata_chunks(itertools.islice(rows, count), chunk_size)
+               for metadata in chunk]
+    return initial, rows
+
+
+def lazy_template(fields):
+    """Return the shared field map for `lazy_metadata.LazyMetadataNft` from a dict of strings.
+
+    The `name` field is the collection name; the contract appends
+    ` #<token_id>` to it for each token.
+    """
+    return sp.map(l={key: encode("%s" % value) for key, value in fields.items()})
+
+
+def write_token_files(rows, directory, first_token_id=0):
+    """Write one TZIP-21 JSON file per row, `<token_id>.json`, to upload under the base URI.
+
+    Returns the number of files written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for token_id, row in enumerate(rows, first_token_id):
+        fields = _fields(row)
+        fields["decimals"] = int(fields["decimals"])
+        with open(os.path.join(directory, "%d.json" % token_id), "w") as f:
+            json.dump(fields, f, separators=(",", ":"), ensure_ascii=False)
+        count += 1
+    return count
@@ -0,0 +1,274 @@
+"""Michelson encoding and parsing helpers shared by the tools."""
+
+import hashlib
+import re
+
+# An address is a 1-byte tag, a 4-byte length and 22 bytes of data
+ADDRESS_BYTES = 27
+# A prim with two arguments and no annotations, such as `Pair` or `Elt`
+PRIM_BYTES = 2
+
+
+def nat_bytes(n):
+    """Return the size of a nat: a 1-byte tag and a zarith number."""
+    size = 1
+    n >>= 6
+    while n:
+        size += 1
+        n >>= 7
+    return 1 + size
+
+
+# Base58check prefixes of the address types
+_ADDRESS_PREFIXES = {
+    (0, 0): bytes([6, 161, 159]),  # tz1
+    (0, 1): bytes([6, 161, 161]),  # tz2
+    (0, 2): bytes([6, 161, 164]),  # tz3
+    (0, 3): bytes([6, 161, 166]),  # tz4
+    (1, None): bytes([2, 90, 121]),  # KT1
+}
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def base58check_encode(payload):
+    checksum = hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    data = payload + checksum
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, remainder = divmod(n, 58)
+        out = _BASE58_ALPHABET[remainder] + out
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + out
+
+
+def base58check_decode(text):
+    n = 0
+    for char in text:
+        n = n * 58 + _BASE58_ALPHABET.index(char)
+    data = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    data = b"\0" * (len(text) - len(text.lstrip("1"))) + data
+    payload, checksum = data[:-4], data[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        raise ValueError("Bad base58check checksum in %r" % text)
+    return payload
+
+
+def address_from_bytes(data):
+    """Decode the 22-byte optimized form of an address to its `tz`/`KT1` string."""
+    if data[0] == 0:
+        return base58check_encode(_ADDRESS_PREFIXES[(0, data[1])] + data[2:22])
+    if data[0] == 1:
+        return base58check_encode(_ADDRESS_PREFIXES[(1, None)] + data[1:21])
+    raise ValueError("Not an address: 0x" + data.hex())
+
+
+def address_to_bytes(address):
+    """Encode a `tz`/`KT1` address in its 22-byte optimized form."""
+    payload = base58check_decode(address)
+    prefix, data = payload[:3], payload[3:]
+    for (tag, curve), expected in _ADDRESS_PREFIXES.items():
+        if prefix == expected:
+            return bytes([tag, curve]) + data if tag == 0 else bytes([tag]) + data + b"\0"
+    raise ValueError("Not an address: %r" % address)
+
+
+# Binary Micheline, as produced by PACK (after its 0x05 prefix)
+
+def encode_int(n):
+    """Encode an int or nat literal: a 0x00 tag and a signed zarith number."""
+    sign = 0x40 if n < 0 else 0
+    n = abs(n)
+    out = bytearray([sign | (n & 0x3F)])
+    n >>= 6
+    while n:
+        out[-1] |= 0x80
+        out.append(n & 0x7F)
+        n >>= 7
+    return b"\0" + bytes(out)
+
+
+def encode_bytes(data):
+    return b"\x0a" + len(data).to_bytes(4, "big") + data
+
+
+def encode_string(text):
+    data = text.encode("utf-8")
+    return b"\x01" + len(data).to_bytes(4, "big") + data
+
+
+def encode_bool(value):
+    return b"\x03\x0a" if value else b"\x03\x03"
+
+
+def encode_address(address):
+    return encode_bytes(address_to_bytes(address))
+
+
+def encode_pair(left, right):
+    """Encode `Pair left right` from the encodings of its arguments."""
+    return b"\x07\x07" + left + right
+
+
+def encode_left(value):
+    return b"\x05\x05" + value
+
+
+def encode_right(value):
+    return b"\x05\x08" + value
+
+
+def encode_list(items):
+    data = b"".join(items)
+    return b"\x02" + len(data).to_bytes(4, "big") + data
+
+
+def encode_map(items):
+    """Encode a map from the encodings of its (key, value) items, in key order."""
+    return encode_list([b"\x07\x04" + key + value for key, value in items])
+
+
+def pack(encoded):
+    """Return what PACK returns for a value, given its binary Micheline encoding."""
+    return b"\x05" + encoded
+
+
+def micheline_size(value):
+    """Return the binary size of a Michelson value or script in the node's JSON form.
+
+    Every primitive takes one byte whatever its opcode, so the size
+    doesn't depend on the primitive table.
+    """
+    if isinstance(value, list):
+        return 5 + sum(micheline_size(item) for item in value)
+    if "int" in value:
+        return len(encode_int(int(value["int"])))
+    if "string" in value:
+        return 5 + len(value["string"].encode("utf-8"))
+    if "bytes" in value:
+        return 5 + len(value["bytes"]) // 2
+    args = value.get("args", [])
+    annots = " ".join(value.get("annots", []))
+    size = 2 + sum(micheline_size(arg) for arg in args)
+    if len(args) > 2:
+        # The generic form has a length before its arguments and always
+        # a length before its annotations
+        return size + 4 + 4 + len(annots)
+    return size + (4 + len(annots) if annots else 0)
+
+
+def blake2b(data, digest_size=32):
+    return hashlib.blake2b(data, digest_size=digest_size).digest()
+
+
+# Base58check prefix of `expr...` script expression hashes
+_SCRIPT_EXPR_PREFIX = bytes([13, 44, 64, 27])
+
+
+def script_expr_hash(packed):
+    """Return the `expr...` hash of a packed value, as the node indexes big_map keys."""
+    return base58check_encode(_SCRIPT_EXPR_PREFIX + blake2b(packed))
+
+
+_TOKEN_RE = re.compile(r'\s*(?:(\(|\)|\{|\}|;)|("(?:[^"\\]|\\.)*")|(0x[0-9a-fA-F]*)|(-?\d+)|([A-Za-z_]\w*)|(%\w+|@\w+|:\w+))')
+
+
+class Pair(tuple):
+    """A Michelson `Pair`, with nested right combs flattened."""
+
+
+def _tokens(text):
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise ValueError("Can't parse Michelson at %r" % text[position:position + 20])
+        position = match.end()
+        if match.group(6):
+            continue  # Annotations carry no data
+        yield match.lastindex, match.group(match.lastindex)
+
+
+def parse(text):
+    """Parse a Michelson value as printed by octez-client into Python values.
+
+    Ints are ints, strings are strings, bytes are bytes, `Unit` and `None`
+    are None, `Pair`s are `Pair` tuples, a sequence of `Elt`s is a dict,
+    other sequences are lists, and `Some x`/`Left x`/`Right x` are
+    (prim, x) tuples, except `Some x`, which is x.
+    """
+    tokens = list(_tokens(text))
+    value, position = _parse(tokens, 0)
+    if position != len(tokens):
+        raise ValueError("Unexpected trailing Michelson in %r" % text)
+    return value
+
+
+def _parse(tokens, position, prim_args=True):
+    kind, token = tokens[position]
+    if kind == 1 and token == "(":
+        value, position = _parse(tokens, position + 1)
+        return value, position + 1  # ")"
+    if kind == 1 and token == "{":
+        items = []
+        position += 1
+        while tokens[position][1] != "}":
+            if tokens[position][1] == ";":
+                position += 1
+                continue
+            item, position = _parse(tokens, position)
+            items.append(item)
+        if items and all(isinstance(item, tuple) and item[:1] == ("Elt",) for item in items):
+            return {item[1]: item[2] for item in items}, position + 1
+        return items, position + 1
+    if kind == 2:
+        return bytes(token[1:-1], "utf-8").decode("unicode_escape"), position + 1
+    if kind == 3:
+        return bytes.fromhex(token[2:]), position + 1
+    if kind == 4:
+        return int(token), position + 1
+    # A prim, with arguments when it isn't itself an argument of another prim
+    if token in ("Unit", "None"):
+        return None, position + 1
+    if token in ("True", "False"):
+        return token == "True", position + 1
+    args = []
+    position += 1
+    while prim_args and position < len(tokens) and tokens[position][1] not in (")", "}", ";"):
+        arg, position = _parse(tokens, position, prim_args=False)
+        args.append(arg)
+    if token == "Pair":
+        if isinstance(args[-1], Pair):
+            args = args[:-1] + list(args[-1])
+        return Pair(args), position
+    if token == "Some":
+        return args[0], position
+    return (token,) + tuple(args), position
+
+
+def from_json(value):
+    """Decode a Michelson value in the node's JSON form into Python values, like `parse`."""
+    if isinstance(value, list):
+        items = [from_json(item) for item in value]
+        if items and all(isinstance(item, tuple) and item[:1] == ("Elt",) for item in items):
+            return {item[1]: item[2] for item in items}
+        return items
+    if "int" in value:
+        return int(value["int"])
+    if "string" in value:
+        return value["string"]
+    if "bytes" in value:
+        return bytes.fromhex(value["bytes"])
+    prim = value["prim"]
+    if prim in ("Unit", "None"):
+        return None
+    if prim in ("True", "False"):
+        return prim == "True"
+    args = [from_json(arg) for arg in value.get("args", [])]
+    if prim == "Pair":
+        if isinstance(args[-1], Pair):
+            args = args[:-1] + list(args[-1])
+        return Pair(args)
+    if prim == "Some":
+        return args[0]
+    return (prim,) + tuple(args)
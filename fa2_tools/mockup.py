@@ -0,0 +1,125 @@
+"""A local `octez-client` mockup for running the FA2 contracts offline.
+
+The scenario files run under SmartPy's mockup simulation mode, where each
+origination and call is signed and injected into a local octez-client
+mockup. This module drives such a mockup directly, for checks that need
+real Michelson execution outside a SmartPy scenario, for example with the
+compiled Michelson that `fa2_tools.cache` stores:
+
+    client = MockupClient()
+    client.create()
+    client.fund_test_accounts(dict(Alice=alice, Bob=bob))
+    contract, receipt = client.originate("nft", "step_001_cont_0_contract.tz", storage)
+    client.call(contract, "transfer", transfer_arg, source="Alice")
+    assert client.get_balance(contract, bob.address, 0) == 1
+    assert client.get_balances(contract, [(alice.address, 0), (bob.address, 0)]) == [0, 1]
+
+No node or network is involved: the mockup keeps its state in a local
+base directory.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from fa2_tools.costs import parse_receipt
+from fa2_tools.michelson import parse
+
+_ORIGINATED_RE = re.compile(r"New contract (KT1\w+) originated")
+
+
+class MockupError(Exception):
+    pass
+
+
+class MockupClient:
+    def __init__(self, base_dir=None, client="octez-client", protocol=None):
+        self.client = client
+        self.protocol = protocol
+        self.base_dir = base_dir or tempfile.mkdtemp(prefix="fa2_mockup_")
+
+    def run(self, *args):
+        """Run an octez-client command against the mockup and return its output."""
+        command = [self.client, "--mode", "mockup", "--base-dir", self.base_dir]
+        if self.protocol:
+            command += ["--protocol", self.protocol]
+        result = subprocess.run(command + list(args), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise MockupError(result.stderr.strip() or result.stdout.strip())
+        return result.stdout
+
+    def create(self):
+        """Create the mockup state, with its funded bootstrap accounts."""
+        # `create mockup` refuses to reuse a directory that already exists
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+        self.run("create", "mockup")
+
+    def remove(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def import_account(self, name, secret_key):
+        self.run("import", "secret", "key", name, "unencrypted:" + secret_key, "--force")
+
+    def fund(self, destination, amount, source="bootstrap1"):
+        """Send `amount` tez from a bootstrap account so that `destination` can pay fees."""
+        return parse_receipt(self.run(
+            "transfer", str(amount), "from", source, "to", destination, "--burn-cap", "1",
+        ))
+
+    def fund_test_accounts(self, accounts, amount=10000):
+        """Import and fund `sp.test_account` accounts, given as a dict of alias to account."""
+        for name, account in accounts.items():
+            self.import_account(name, account.secret_key)
+            self.fund(name, amount)
+
+    def originate(self, name, code, storage, source="bootstrap1", burn_cap=10):
+        """Originate a contract from a .tz file and Michelson storage.
+
+        Returns the contract address and the parsed receipt.
+        """
+        output = self.run(
+            "originate", "contract", name, "transferring", "0", "from", source,
+            "running", os.path.abspath(code), "--init", storage,
+            "--burn-cap", str(burn_cap), "--force",
+        )
+        match = _ORIGINATED_RE.search(output)
+        if match is None:
+            raise MockupError("No contract address in the origination receipt:\n" + output)
+        return match.group(1), dict(parse_receipt(output), receipt=output)
+
+    def call(self, contract, entrypoint, arg, source, amount=0, burn_cap=1):
+        """Sign and inject a contract call and return its parsed receipt.
+
+        Raises `MockupError` with the client's error output if the call
+        fails, for example with `FA2_INSUFFICIENT_BALANCE`.
+        """
+        output = self.run(
+            "transfer", str(amount), "from", source, "to", contract,
+            "--entrypoint", entrypoint, "--arg", arg, "--burn-cap", str(burn_cap),
+        )
+        return dict(parse_receipt(output), receipt=output)
+
+    def run_view(self, contract, view, arg):
+        """Run an on-chain view and return its result as Michelson."""
+        return self.run("run", "view", view, "on", "contract", contract, "with", "input", arg).strip()
+
+    def get_balances(self, contract, requests):
+        """Return the balances of (owner, token_id) pairs with one call of the `get_balance_of` view.
+
+        `get_balance_of` is the on-chain view of the template's
+        `OnchainviewBalanceOf`, which the tutorial contracts have. The
+        template's `get_balance` is an off-chain view: it is only in the
+        contract's metadata, so `run view` can't call it.
+        """
+        arg = "{ %s }" % " ; ".join('Pair "%s" %d' % (owner, token_id) for owner, token_id in requests)
+        # Each response is `Pair (Pair owner token_id) balance`
+        return [response[-1] for response in parse(self.run_view(contract, "get_balance_of", arg))]
+
+    def get_balance(self, contract, owner, token_id):
+        """Return an account's token balance with the contract's `get_balance_of` view."""
+        return self.get_balances(contract, [(owner, token_id)])[0]
+
+    def get_storage(self, contract):
+        return self.run("get", "contract", "storage", "for", contract).strip()
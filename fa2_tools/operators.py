@@ -0,0 +1,98 @@
+import smartpy as sp
+
+
+@sp.module
+def all_tokens_operators():
+    operator_permission: type = sp.record(
+        owner=sp.address,
+        operator=sp.address,
+        token_id=sp.nat,
+    ).layout(("owner", ("operator", "token_id")))
+
+    all_tokens_permission: type = sp.record(
+        owner=sp.address,
+        operator=sp.address,
+    ).layout(("owner", "operator"))
+
+    all_tokens_update: type = sp.variant(
+        add_all_tokens_operator=all_tokens_permission,
+        remove_all_tokens_operator=all_tokens_permission,
+    )
+
+    class AllTokensOperatorTransfer(sp.Contract):
+        """Owner or operator are allowed to transfer, and operators can be
+        approved for all of an owner's tokens.
+
+        The `owner-or-operator-transfer` policy stores one operator entry per
+        (owner, operator, token_id). With this policy, an owner can also
+        approve an operator for all of its tokens, present and future, with
+        a single `update_all_tokens_operators` entry.
+
+        Like the template's policies, it goes before the base class in the
+        order of inheritance, and its `__init__` is called after the base
+        class's. The template's `transfer` and `burn` accept both approvals
+        through `check_tx_transfer_permissions_`, which looks up the
+        all-tokens approval before the per-token operators.
+        """
+
+        def __init__(self):
+            self.private.policy = sp.record(
+                name="owner-or-operator-transfer",
+                supports_transfer=True,
+                supports_operator=True,
+            )
+            self.data.operators = sp.cast(
+                sp.big_map(), sp.big_map[operator_permission, sp.unit]
+            )
+            self.data.all_tokens_operators = sp.cast(
+                sp.big_map(), sp.big_map[all_tokens_permission, sp.unit]
+            )
+
+        @sp.private()
+        def check_operator_update_permissions_(self, permission):
+            sp.cast(permission, operator_permission)
+            assert permission.owner == sp.sender, "FA2_NOT_OWNER"
+
+        @sp.private(with_storage="read-only")
+        def check_tx_transfer_permissions_(self, params):
+            sp.cast(
+                params,
+                sp.record(
+                    from_=sp.address,
+                    to_=sp.address,
+                    token_id=sp.nat,
+                ),
+            )
+            assert (
+                (sp.sender == params.from_)
+                or (sp.record(owner=params.from_, operator=sp.sender) in self.data.all_tokens_operators)
+                or (
+                    sp.record(owner=params.from_, operator=sp.sender, token_id=params.token_id)
+                    in self.data.operators
+                )
+            ), "FA2_NOT_OPERATOR"
+
+        @sp.private(with_storage="read-only")
+        def is_operator_(self, permission):
+            sp.cast(permission, operator_permission)
+            return (
+                sp.record(owner=permission.owner, operator=permission.operator)
+                in self.data.all_tokens_operators
+            ) or (permission in self.data.operators)
+
+        @sp.entrypoint
+        def update_all_tokens_operators(self, actions):
+            sp.cast(actions, sp.list[all_tokens_update])
+            for action in actions:
+                match action:
+                    case add_all_tokens_operator(permission):
+                        assert permission.owner == sp.sender, "FA2_NOT_OWNER"
+                        self.data.all_tokens_operators[permission] = ()
+                    case remove_all_tokens_operator(permission):
+                        assert permission.owner == sp.sender, "FA2_NOT_OWNER"
+                        del self.data.all_tokens_operators[permission]
+
+        @sp.onchain_view()
+        def is_all_tokens_operator(self, permission):
+            sp.cast(permission, all_tokens_permission)
+            return permission in self.data.all_tokens_operators
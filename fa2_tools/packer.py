@@ -0,0 +1,300 @@
+"""Pack large transfer, mint and convert lists into as few operations as possible.
+
+None of the tutorial entrypoints limit the length of their lists, so a
+big airdrop or rebalance has to be split on the Python side. This module
+estimates the gas, storage and size of each item, packs the items into
+contract calls that stay under the per-operation limits, and packs the
+calls into operation groups that stay under the group size and block
+gas limits:
+
+    model = CostModel.from_bench("bench.csv", "fungible")
+    groups = pack("transfer", items, model)
+    for group in groups:
+        for call in group["calls"]:
+            contract.transfer(to_smartpy(call), _sender=sender)
+
+Items are tuples:
+
+- `transfer`: (from_, to_, token_id, amount)
+- `mint` (fungible): (to_, token_id, amount)
+- `burn`: (from_, token_id, amount)
+- `convert`: (source_token_id, target_token_id, amount)
+
+From the command line, items are read from a CSV file with the same
+columns and the packed calls are written as JSON:
+
+    python -m fa2_tools.packer transfer airdrop.csv --bench bench.csv --output batches.json
+
+The gas and storage per item come from a linear fit of the
+`fa2_tools.bench` results (a fixed cost per call plus a cost per item);
+without them, conservative defaults are used. Sizes are estimated from
+the binary Michelson encoding of the items.
+"""
+
+import argparse
+import collections
+import csv
+import json
+import sys
+
+from fa2_tools.michelson import ADDRESS_BYTES, PRIM_BYTES, nat_bytes
+
+# Protocol limits; a group is a single operation for the size limit
+LIMITS = dict(
+    operation_gas=1040000,
+    operation_storage=60000,
+    block_gas=1733333,
+    group_bytes=32768,
+)
+# Room left for gas estimation error, the signature and the operation envelope
+SAFETY = 0.9
+CALL_OVERHEAD_BYTES = 120
+GROUP_OVERHEAD_BYTES = 100
+
+# Used when no benchmark results are given: (gas per call, gas per item, storage per item)
+DEFAULT_COSTS = {
+    "transfer": (3000, 1200, 70),
+    "mint": (3000, 1200, 70),
+    "burn": (3000, 1000, 0),
+    "convert": (3000, 2000, 70),
+}
+
+FIELDS = {
+    "transfer": ("from_", "to_", "token_id", "amount"),
+    "mint": ("to_", "token_id", "amount"),
+    "burn": ("from_", "token_id", "amount"),
+    "convert": ("source_token_id", "target_token_id", "amount"),
+}
+
+
+def _fit(points):
+    """Least-squares fit of y = a + b * x; returns (a, b)."""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return 0.0, mean_y / mean_x if mean_x else 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+    return max(mean_y - slope * mean_x, 0.0), slope
+
+
+class CostModel:
+    def __init__(self, costs=None):
+        self.costs = dict(DEFAULT_COSTS, **(costs or {}))
+
+    @classmethod
+    def from_bench(cls, path, contract="fungible"):
+        """Fit the cost per call and per item of each entrypoint from `fa2_tools.bench` CSV output."""
+        gas = collections.defaultdict(list)
+        storage = collections.defaultdict(list)
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row["contract"] != contract or row["entrypoint"] not in DEFAULT_COSTS:
+                    continue
+                elements = int(row["elements"])
+                gas[row["entrypoint"]].append((elements, float(row["gas"])))
+                storage[row["entrypoint"]].append((elements, float(row["paid_storage_size_diff"])))
+        costs = {}
+        for entrypoint, points in gas.items():
+            base, per_item = _fit(points)
+            _, storage_per_item = _fit(storage[entrypoint])
+            costs[entrypoint] = (base, per_item, max(storage_per_item, 0.0))
+        return cls(costs)
+
+    def call_gas(self, entrypoint, count):
+        base, per_item, _ = self.costs[entrypoint]
+        return base + per_item * count
+
+    def item_storage(self, entrypoint):
+        return self.costs[entrypoint][2]
+
+
+def item_bytes(entrypoint, item):
+    """Estimate the binary Michelson size of one item in its entrypoint's parameter."""
+    if entrypoint == "transfer":
+        # `from_` is shared by consecutive txs of the same sender, see `_Call.added_bytes`
+        _, _, token_id, amount = item
+        return 2 * PRIM_BYTES + ADDRESS_BYTES + nat_bytes(token_id) + nat_bytes(amount)
+    if entrypoint == "mint":
+        _, token_id, amount = item
+        return 3 * PRIM_BYTES + ADDRESS_BYTES + nat_bytes(token_id) + nat_bytes(amount)
+    if entrypoint == "burn":
+        _, token_id, amount = item
+        return 2 * PRIM_BYTES + ADDRESS_BYTES + nat_bytes(token_id) + nat_bytes(amount)
+    if entrypoint == "convert":
+        source, target, amount = item
+        return 2 * PRIM_BYTES + nat_bytes(source) + nat_bytes(target) + nat_bytes(amount)
+    raise ValueError("Unknown entrypoint %r" % entrypoint)
+
+
+def _sender_bytes():
+    # `Pair from_ { txs }`: the pair, the address and the list header
+    return PRIM_BYTES + ADDRESS_BYTES + 5
+
+
+class _Call:
+    def __init__(self, entrypoint):
+        self.entrypoint = entrypoint
+        self.items = []
+        self.last_sender = None
+        self.bytes = CALL_OVERHEAD_BYTES
+        self.storage = 0.0
+
+    def added_bytes(self, item):
+        size = item_bytes(self.entrypoint, item)
+        if self.entrypoint == "transfer" and (not self.items or item[0] != self.last_sender):
+            # A new `from_` item, as `to_smartpy` only merges consecutive txs of a sender
+            size += _sender_bytes()
+        return size
+
+    def fits(self, item, model, limits):
+        gas = model.call_gas(self.entrypoint, len(self.items) + 1)
+        storage = self.storage + model.item_storage(self.entrypoint)
+        size = self.bytes + self.added_bytes(item)
+        return (
+            gas <= limits["operation_gas"] * SAFETY
+            and storage <= limits["operation_storage"] * SAFETY
+            and size <= (limits["group_bytes"] - GROUP_OVERHEAD_BYTES) * SAFETY
+        )
+
+    def add(self, item, model):
+        self.bytes += self.added_bytes(item)
+        self.storage += model.item_storage(self.entrypoint)
+        if self.entrypoint == "transfer":
+            self.last_sender = item[0]
+        self.items.append(item)
+
+
+def pack(entrypoint, items, model=None, limits=None, keep_order=True):
+    """Pack items into calls and calls into operation groups.
+
+    With `keep_order`, items stay in their original order (next fit), which
+    matters when a later item depends on an earlier one, for example a
+    transfer of tokens that an earlier transfer delivered. Otherwise the
+    largest items are placed first into the first call with room for them
+    (first fit decreasing), which wastes less space when item sizes vary.
+
+    Returns a list of groups, each with its calls and their estimates.
+    """
+    model = model or CostModel()
+    limits = dict(LIMITS, **(limits or {}))
+    items = list(items)
+    if not keep_order:
+        items.sort(key=lambda item: item_bytes(entrypoint, item), reverse=True)
+
+    calls = []
+    for item in items:
+        candidates = calls[-1:] if keep_order else calls
+        for call in candidates:
+            if call.fits(item, model, limits):
+                call.add(item, model)
+                break
+        else:
+            call = _Call(entrypoint)
+            if not call.fits(item, model, limits):
+                raise ValueError("Item %r doesn't fit in an operation on its own" % (item,))
+            call.add(item, model)
+            calls.append(call)
+
+    groups = []
+    group = None
+    for call in calls:
+        gas = model.call_gas(entrypoint, len(call.items))
+        if (
+            group is None
+            or group["gas"] + gas > limits["block_gas"] * SAFETY
+            or group["bytes"] + call.bytes > limits["group_bytes"] - GROUP_OVERHEAD_BYTES
+        ):
+            group = dict(calls=[], gas=0.0, bytes=GROUP_OVERHEAD_BYTES, storage=0.0)
+            groups.append(group)
+        group["calls"].append(dict(
+            entrypoint=entrypoint,
+            items=call.items,
+            gas=round(gas, 3),
+            bytes=call.bytes,
+            storage=round(call.storage, 3),
+        ))
+        group["gas"] = round(group["gas"] + gas, 3)
+        group["bytes"] += call.bytes
+        group["storage"] = round(group["storage"] + call.storage, 3)
+    return groups
+
+
+def summary(groups):
+    calls = [call for group in groups for call in group["calls"]]
+    return dict(
+        groups=len(groups),
+        calls=len(calls),
+        items=sum(len(call["items"]) for call in calls),
+        gas=round(sum(call["gas"] for call in calls), 3),
+        storage=round(sum(call["storage"] for call in calls), 3),
+        largest_call=max((len(call["items"]) for call in calls), default=0),
+    )
+
+
+def to_smartpy(call):
+    """Build the SmartPy parameter for a packed call.
+
+    Consecutive transfers of the same sender share a `from_` item; the
+    transfers keep their order, so a sender can pass on tokens that an
+    earlier item delivered.
+    """
+    import smartpy as sp
+
+    entrypoint = call["entrypoint"]
+    if entrypoint == "transfer":
+        batches = []
+        for from_, to_, token_id, amount in call["items"]:
+            if not batches or batches[-1][0] != from_:
+                batches.append((from_, []))
+            batches[-1][1].append(sp.record(to_=sp.address(to_), token_id=token_id, amount=amount))
+        return [sp.record(from_=sp.address(from_), txs=txs) for from_, txs in batches]
+    if entrypoint == "mint":
+        return [
+            sp.record(to_=sp.address(to_), amount=amount, token=sp.variant("existing", token_id))
+            for to_, token_id, amount in call["items"]
+        ]
+    if entrypoint == "burn":
+        return [
+            sp.record(from_=sp.address(from_), token_id=token_id, amount=amount)
+            for from_, token_id, amount in call["items"]
+        ]
+    return [
+        sp.record(source_token_id=source, target_token_id=target, amount=amount)
+        for source, target, amount in call["items"]
+    ]
+
+
+def read_items(entrypoint, path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield tuple(
+                row[field] if field in ("from_", "to_") else int(row[field])
+                for field in FIELDS[entrypoint]
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entrypoint", choices=sorted(FIELDS))
+    parser.add_argument("items", help="CSV file with one item per row")
+    parser.add_argument("--bench", help="fa2_tools.bench CSV output to fit the costs from")
+    parser.add_argument("--contract", default="fungible")
+    parser.add_argument("--reorder", action="store_true", help="Allow reordering items to pack tighter")
+    parser.add_argument("--output", default="batches.json")
+    args = parser.parse_args(argv)
+
+    model = CostModel.from_bench(args.bench, args.contract) if args.bench else CostModel()
+    groups = pack(args.entrypoint, read_items(args.entrypoint, args.items), model,
+                  keep_order=not args.reorder)
+    totals = summary(groups)
+    with open(args.output, "w") as f:
+        json.dump(dict(summary=totals, groups=groups), f, indent=2)
+    print("%(items)d items in %(calls)d calls and %(groups)d operation groups "
+          "(largest call: %(largest_call)d items, estimated gas %(gas)s, storage %(storage)s bytes)" % totals)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import smartpy as sp
+
+
+@sp.module
+def permits():
+    permit_param: type = sp.record(
+        public_key=sp.key,
+        signature=sp.signature,
+        transfer_hash=sp.bytes,
+        expiry=sp.timestamp,
+    )
+
+    permit_key: type = sp.record(owner=sp.address, transfer_hash=sp.bytes).layout(
+        ("owner", "transfer_hash")
+    )
+
+    class Permits(sp.Contract):
+        """(Mixin) TZIP-17 style permits for relayed transfers.
+
+        An owner signs a permit for one `transfer` item (a `from_` and its
+        `txs`) off-chain. A relayer registers the permits of many owners in
+        one `permit` call and then submits all of their transfer items in
+        one `transfer` call, in the same operation group.
+
+        The signed message is the packed
+        `(chain_id, (contract, (nonce, (expiry, transfer_hash))))`, where
+        `transfer_hash` is the Blake2b hash of the packed transfer item,
+        so a permit signed for a contract on one chain can't be replayed on
+        another chain where the contract has the same address. Each owner
+        has a nonce that increases with every permit, so a signature can't
+        be registered twice, and a permit can't be used after its expiry.
+        A new permit for the same transfer item replaces an expired one.
+
+        The contract's `transfer` must call `use_permit_` for the items the
+        sender isn't otherwise allowed to transfer, after the owner and
+        operator checks, so that a permit is only used up when it's needed.
+        """
+
+        def __init__(self):
+            self.data.permits = sp.cast(sp.big_map(), sp.big_map[permit_key, sp.timestamp])
+            self.data.permit_nonces = sp.cast(sp.big_map(), sp.big_map[sp.address, sp.nat])
+
+        @sp.entrypoint
+        def permit(self, params):
+            sp.cast(params, sp.list[permit_param])
+            for param in params:
+                owner = sp.to_address(sp.implicit_account(sp.hash_key(param.public_key)))
+                nonce = self.data.permit_nonces.get(owner, default=0)
+                message = sp.pack(
+                    (sp.chain_id, (sp.self_address, (nonce, (param.expiry, param.transfer_hash))))
+                )
+                assert sp.check_signature(
+                    param.public_key, param.signature, message
+                ), "MISSING_SIGNED"
+                assert sp.now < param.expiry, "EXPIRED_PERMIT"
+                key = sp.record(owner=owner, transfer_hash=param.transfer_hash)
+                # Only a permit that can still be used blocks a new one
+                if key in self.data.permits:
+                    assert self.data.permits[key] <= sp.now, "DUP_PERMIT"
+                self.data.permits[key] = param.expiry
+                self.data.permit_nonces[owner] = nonce + 1
+
+        @sp.private(with_storage="read-write")
+        def use_permit_(self, transfer):
+            """Consume the owner's permit for this transfer item, if there is one."""
+            key = sp.record(owner=transfer.from_, transfer_hash=sp.blake2b(sp.pack(transfer)))
+            used = False
+            if key in self.data.permits:
+                assert sp.now < self.data.permits[key], "EXPIRED_PERMIT"
+                del self.data.permits[key]
+                used = True
+            return used
+
+        @sp.onchain_view()
+        def permit_nonce(self, owner):
+            sp.cast(owner, sp.address)
+            return self.data.permit_nonces.get(owner, default=0)
+
+
+def transfer_item(from_, txs):
+    """Build a `transfer` item from an address and a list of (to_, token_id, amount)."""
+    return sp.record(
+        from_=from_,
+        txs=[sp.record(to_=to_, token_id=token_id, amount=amount) for to_, token_id, amount in txs],
+    )
+
+
+def _packed_item(from_, txs):
+    # Pairs pack like the transfer records, whose layouts follow the FA2 standard
+    return sp.pack((from_, [(to_, (sp.nat(token_id), sp.nat(amount))) for to_, token_id, amount in txs]))
+
+
+def sign_permit(account, fa2_contract, nonce, txs, expiry, chain_id=None):
+    """Sign a permit for `account` to send `txs`, a list of (to_, token_id, amount).
+
+    `account` is an `sp.test_account` that owns the tokens and `nonce` is
+    its current `permit_nonce`. `chain_id` is the `sp.chain_id_cst` of the
+    chain the contract runs on, by default the empty chain ID of the
+    scenario interpreter. Returns the `permit` parameter entry and the
+    matching `transfer` item for the relayer to submit.
+    """
+    if chain_id is None:
+        chain_id = sp.chain_id_cst("0x")
+    transfer_hash = sp.blake2b(_packed_item(account.address, txs))
+    message = sp.pack((chain_id, (fa2_contract.address, (sp.nat(nonce), (expiry, transfer_hash)))))
+    permit = sp.record(
+        public_key=account.public_key,
+        signature=sp.make_signature(account.secret_key, message, message_format="Raw"),
+        transfer_hash=transfer_hash,
+        expiry=expiry,
+    )
+    return permit, transfer_item(account.address, txs)
@@ -0,0 +1,21 @@
+"""Streaming readers for the CSV and JSON Lines inputs of the tools.
+
+Tools that don't need SmartPy, such as `ledger.py`, `merkle.py` and
+`rpc.py`, read their inputs with this module, so that they can run where
+SmartPy isn't installed.
+"""
+
+import csv
+import json
+
+
+def read_rows(path):
+    """Yield the rows of a CSV or JSON Lines file as dicts, one at a time."""
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, newline="") as f:
+            yield from csv.DictReader(f)
@@ -0,0 +1,269 @@
+"""Concurrent reads of FA2 ledgers from a Tezos node's RPC.
+
+Reading a balance is a GET of one big_map value, keyed by the `expr...`
+hash of the packed key. Reading thousands of them one at a time is slow,
+so `LedgerReader` hashes the keys in batch (caching the hashes) and sends
+the GETs concurrently with asyncio over a pool of keep-alive HTTP
+connections:
+
+    async with LedgerReader("http://localhost:8732", "KT1...") as reader:
+        balances = await reader.balances([("tz1...", 0), ("tz1...", 1)])
+
+    read_balances("http://localhost:8732", "KT1...", [("tz1...", 0)])
+
+The ledger big_map is found in the contract's storage by its `%ledger`
+annotation, and its key type tells a `MyFungibleContract` ledger
+(`(address, nat) -> nat`) from a `MyNFTContract` ledger (`nat -> address`).
+All reads of a reader are made at the same block, the head when it
+starts unless another block is given. Missing keys read as a balance of 0
+or no owner.
+
+The client only needs the standard library, and any server that answers
+the RPC paths works, for example a stub server in a test:
+
+    python -m fa2_tools.rpc http://localhost:8732 KT1... holders.csv --output balances.jsonl
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import ssl
+import sys
+from urllib.parse import urlsplit
+
+from fa2_tools.michelson import (
+    address_from_bytes, encode_address, encode_int, encode_pair, from_json, pack, script_expr_hash,
+)
+from fa2_tools.rows import read_rows
+
+
+class RpcError(Exception):
+    def __init__(self, status, path, body):
+        super().__init__("RPC %s returned %d: %s" % (path, status, body[:200]))
+        self.status = status
+        self.path = path
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def ledger_key_hash(owner, token_id):
+    """Return the `expr...` hash of a `MyFungibleContract` ledger key."""
+    return script_expr_hash(pack(encode_pair(encode_address(owner), encode_int(token_id))))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def nft_ledger_key_hash(token_id):
+    """Return the `expr...` hash of a `MyNFTContract` ledger key."""
+    return script_expr_hash(pack(encode_int(token_id)))
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one node, at most `size` at a time."""
+
+    def __init__(self, url, size=16):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.prefix = parts.path.rstrip("/")
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def get_json(self, path):
+        """GET a path and return its JSON, or None if the node answers 404."""
+        async with self.slots:
+            # An idle connection may have been closed by the node: retry once
+            # on a new connection
+            reused = bool(self.idle)
+            try:
+                status, body = await self._get(path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                status, body = await self._get(path)
+        if status == 404:
+            return None
+        if status >= 400:
+            raise RpcError(status, path, body.decode("utf-8", "replace"))
+        return json.loads(body)
+
+    async def _get(self, path):
+        if self.idle:
+            reader, writer = self.idle.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        try:
+            writer.write((
+                "GET %s%s HTTP/1.1\r\nHost: %s\r\nAccept: application/json\r\n"
+                "Connection: keep-alive\r\n\r\n" % (self.prefix, path, self.host)
+            ).encode("ascii"))
+            await writer.drain()
+            status, keep_alive, body = await _read_response(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return status, body
+
+    async def close(self):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("The node closed the connection")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = headers.get("connection", "").lower() != "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # Trailers
+                break
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+        body = bytes(body)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return status, keep_alive, body
+
+
+def _annotated_values(type_, value, found):
+    """Collect the storage values of the annotated fields in the storage type."""
+    for annot in type_.get("annots", []):
+        if annot.startswith("%"):
+            found[annot[1:]] = (type_, value)
+    if type_["prim"] != "pair":
+        return
+    # Right combs can be written as a Pair with more arguments or a sequence
+    args = value if isinstance(value, list) else value["args"]
+    type_args = type_["args"]
+    for i, arg_type in enumerate(type_args):
+        if i == len(type_args) - 1 and len(args) > len(type_args):
+            arg_value = dict(prim="Pair", args=args[i:])
+        else:
+            arg_value = args[i]
+        _annotated_values(arg_type, arg_value, found)
+
+
+class LedgerReader:
+    """Read the ledger of one FA2 contract with concurrent RPC calls."""
+
+    def __init__(self, url, contract, connections=16, block=None):
+        self.pool = ConnectionPool(url, connections)
+        self.contract = contract
+        self.block = block
+        self.ledger_id = None
+        self.is_nft = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.pool.close()
+
+    async def start(self):
+        """Pin the block and find the ledger big_map."""
+        if self.block is None:
+            self.block = await self.pool.get_json("/chains/main/blocks/head/hash")
+        script = await self.pool.get_json(
+            "/chains/main/blocks/%s/context/contracts/%s/script" % (self.block, self.contract)
+        )
+        if script is None:
+            raise ValueError("No contract %s at block %s" % (self.contract, self.block))
+        storage_type = next(item for item in script["code"] if item["prim"] == "storage")["args"][0]
+        fields = {}
+        _annotated_values(storage_type, script["storage"], fields)
+        if "ledger" not in fields:
+            raise ValueError("No %%ledger big_map in the storage of %s" % self.contract)
+        type_, value = fields["ledger"]
+        self.ledger_id = int(value["int"])
+        self.is_nft = type_["args"][0]["prim"] == "nat"
+
+    async def values(self, big_map_id, key_hashes):
+        """Fetch the values of a big_map for a list of key hashes, None where missing."""
+        results = await asyncio.gather(*(
+            self.pool.get_json(
+                "/chains/main/blocks/%s/context/big_maps/%d/%s" % (self.block, big_map_id, key_hash)
+            )
+            for key_hash in key_hashes
+        ))
+        return [None if result is None else from_json(result) for result in results]
+
+    async def balances(self, requests):
+        """Return the balance of each (owner, token_id), in order."""
+        if self.is_nft:
+            owners = await self.owners([token_id for _, token_id in requests])
+            return [int(owner == request[0]) for owner, request in zip(owners, requests)]
+        values = await self.values(
+            self.ledger_id, [ledger_key_hash(owner, token_id) for owner, token_id in requests]
+        )
+        return [value or 0 for value in values]
+
+    async def owners(self, token_ids):
+        """Return the owner of each token of an NFT ledger, None where it has none."""
+        if not self.is_nft:
+            raise ValueError("%s doesn't have an NFT ledger" % self.contract)
+        owners = await self.values(self.ledger_id, [nft_ledger_key_hash(token_id) for token_id in token_ids])
+        # Nodes return addresses in their optimized form in the `Optimized` unparsing mode
+        return [address_from_bytes(owner) if isinstance(owner, bytes) else owner for owner in owners]
+
+
+def read_balances(url, contract, requests, connections=16, block=None):
+    """Read the balances of a list of (owner, token_id) without an event loop."""
+
+    async def read():
+        async with LedgerReader(url, contract, connections, block) as reader:
+            return await reader.balances(requests)
+
+    return asyncio.run(read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", help="Node RPC URL, such as http://localhost:8732")
+    parser.add_argument("contract")
+    parser.add_argument("requests", help="CSV or JSON Lines file with owner and token_id")
+    parser.add_argument("--output", help="JSON Lines file for the balances (default: stdout)")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--block", help="Block hash or level to read at (default: head)")
+    args = parser.parse_args(argv)
+
+    requests = [(row["owner"], int(row["token_id"])) for row in read_rows(args.requests)]
+    balances = read_balances(args.url, args.contract, requests, args.connections, args.block)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for (owner, token_id), balance in zip(requests, balances):
+            output.write(json.dumps(dict(owner=owner, token_id=token_id, balance=balance)) + "\n")
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Run every SmartPy scenario file in the repository in parallel.
+
+    python -m fa2_tools.runner
+    python -m fa2_tools.runner smartpy_fa2_fungible --jobs 4
+
+The runner finds the files that declare `@sp.add_test()` functions,
+outside of the `fa2_tools` package or in `fa2_tools/examples`, and runs
+each file in its own Python process, several at a time. Each file
+runs in its own working directory under the output directory, so
+scenarios with the same name in different files (such as
+`fa2_lib_fungible` in the four fungible parts) don't overwrite each
+other's output. When all files are done, the runner prints a summary of
+pass/fail and timing and writes it to `summary.json`. With `--trace`, each
+file also runs under `fa2_tools.trace`, and the traces of all files are
+merged into `trace.json`, one process per file.
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+from fa2_tools import trace
+from fa2_tools.cache import Cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKIPPED_DIRS = {"node_modules", "__pycache__"}
+# The tools' own scenario files, such as the one that compiles the shared
+# contracts, aren't tests; they still run when given explicitly. The
+# example contracts in `examples` are.
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES_DIR = os.path.join(TOOLS_DIR, "examples")
+
+
+def _is_add_test(decorator):
+    # Matches `@sp.add_test()` and `@sp.add_test(...)`
+    return (
+        isinstance(decorator, ast.Call)
+        and isinstance(decorator.func, ast.Attribute)
+        and decorator.func.attr == "add_test"
+    )
+
+
+def _is_tools_dir(path):
+    path = os.path.abspath(path)
+    in_tools = path == TOOLS_DIR or path.startswith(TOOLS_DIR + os.sep)
+    in_examples = path == EXAMPLES_DIR or path.startswith(EXAMPLES_DIR + os.sep)
+    return in_tools and not in_examples
+
+
+def find_tests(path):
+    """Return the names of the `@sp.add_test()` functions in a Python file."""
+    with open(path) as f:
+        source = f.read()
+    if "add_test" not in source:
+        return []
+    tree = ast.parse(source, filename=path)
+    return [
+        node.name
+        for node in ast.walk(tree)
+        if isinstance(node, ast.FunctionDef)
+        and any(_is_add_test(decorator) for decorator in node.decorator_list)
+    ]
+
+
+def discover(paths):
+    """Map each scenario file under the given paths to its test function names."""
+    found = {}
+    for path in paths:
+        if os.path.isfile(path):
+            candidates = [path]
+        else:
+            candidates = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(
+                    d for d in dirnames if d not in SKIPPED_DIRS and not d.startswith(".")
+                )
+                if _is_tools_dir(dirpath):
+                    continue
+                candidates.extend(
+                    os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith(".py")
+                )
+        for candidate in candidates:
+            tests = find_tests(candidate)
+            if tests:
+                found[os.path.abspath(candidate)] = tests
+    return found
+
+
+def output_dir_for(path, output_root):
+    """Return the working directory where a scenario file writes its output."""
+    relative = os.path.relpath(os.path.abspath(path), ROOT)
+    return os.path.join(output_root, os.path.splitext(relative)[0])
+
+
+def run_file(path, output_root, timeout=None, traced=False):
+    """Run one scenario file in its own process and return its result."""
+    workdir = output_dir_for(path, output_root)
+    os.makedirs(workdir, exist_ok=True)
+    log_path = os.path.join(workdir, "output.log")
+    # The tutorial files call `sp.pin_on_ipfs`; pin their metadata offline
+    command = [sys.executable, "-m", "fa2_tools.ipfs", os.path.abspath(path)]
+    if traced:
+        command = [sys.executable, "-m", "fa2_tools.trace", os.path.abspath(path),
+                   "--output", os.path.join(workdir, "trace.json")]
+    # The example files import fa2_tools from the repository root
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [ROOT] + [p for p in [os.environ.get("PYTHONPATH")] if p]
+    ))
+    start = time.monotonic()
+    with open(log_path, "w") as log:
+        try:
+            returncode = subprocess.run(
+                command,
+                cwd=workdir,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+            ).returncode
+        except subprocess.TimeoutExpired:
+            returncode = None
+    return dict(
+        path=os.path.relpath(path, ROOT),
+        status="pass" if returncode == 0 else ("timeout" if returncode is None else "fail"),
+        returncode=returncode,
+        seconds=round(time.monotonic() - start, 3),
+        output_dir=os.path.relpath(workdir, ROOT),
+        log=os.path.relpath(log_path, ROOT),
+    )
+
+
+def _run_cached(path, output_root, timeout, cache, traced):
+    if cache is not None:
+        result = cache.passed(path)
+        if result is not None:
+            return dict(result, status="cached", seconds=0.0)
+    result = run_file(path, output_root, timeout, traced)
+    if cache is not None:
+        cache.store(path, output_dir_for(path, output_root), result)
+    return result
+
+
+def run_all(files, output_root, jobs=None, timeout=None, cache=None, traced=False):
+    """Run the scenario files in parallel and return their results in file order.
+
+    Each file already runs in its own process, so a thread pool is
+    enough to keep `jobs` of those processes busy. With a `cache`, files
+    whose modules and tests haven't changed since they last passed are
+    not run again.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            path: pool.submit(_run_cached, path, output_root, timeout, cache, traced)
+            for path in files
+        }
+        return [dict(futures[path].result(), tests=files[path]) for path in files]
+
+
+def print_summary(results, wall_seconds):
+    width = max([len(result["path"]) for result in results] + [4])
+    for result in results:
+        print("%-7s %s  %7.2fs  %s" % (
+            result["status"].upper(), result["path"].ljust(width), result["seconds"],
+            ", ".join(result["tests"]),
+        ))
+    failed = [result for result in results if result["status"] not in ("pass", "cached")]
+    serial_seconds = sum(result["seconds"] for result in results)
+    print("%d passed, %d failed in %.2fs (%.2fs if run one after another)" % (
+        len(results) - len(failed), len(failed), wall_seconds, serial_seconds,
+    ))
+    for result in failed:
+        print("See %s for the output of %s" % (result["log"], result["path"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[ROOT], help="Files or directories to search")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Files to run at once")
+    parser.add_argument("--output", default=os.path.join(ROOT, "scenario_output"))
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds allowed per file")
+    parser.add_argument("--cache", action="store_true", help="Skip files that passed unchanged")
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--trace", action="store_true", help="Write a Chrome trace of the scenario phases")
+    args = parser.parse_args(argv)
+
+    files = discover(args.paths)
+    if not files:
+        print("No @sp.add_test() scenarios found")
+        return 1
+    start = time.monotonic()
+    cache = None
+    if args.cache:
+        cache = Cache(args.cache_dir) if args.cache_dir else Cache()
+    results = run_all(
+        files, os.path.abspath(args.output), jobs=args.jobs, timeout=args.timeout, cache=cache,
+        traced=args.trace,
+    )
+    wall_seconds = time.monotonic() - start
+
+    print_summary(results, wall_seconds)
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "summary.json"), "w") as f:
+        json.dump(dict(seconds=round(wall_seconds, 3), results=results), f, indent=2)
+    if args.trace:
+        trace_path = os.path.join(args.output, "trace.json")
+        trace.merge(
+            [os.path.join(output_dir_for(path, os.path.abspath(args.output)), "trace.json")
+             for path, result in zip(files, results) if result["status"] != "cached"],
+            trace_path,
+        )
+        print("Wrote the trace of the scenario phases to %s" % trace_path)
+    return 0 if all(result["status"] in ("pass", "cached") for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import contextlib
+
+import smartpy as sp
+
+from fa2_tools import bench
+
+
+def test_load_module_skips_the_tests():
+    add_test = sp.add_test
+    my_module = bench.load_module(bench.FUNGIBLE_PATH)
+    assert sp.add_test is add_test
+    assert hasattr(my_module, "MyFungibleContract")
+
+
+def test_scenarios_run_in_the_interpreter():
+    # No scenario name, so that nothing is written to disk; a failing call raises
+    bench.fungible_scenario(bench.load_module(bench.FUNGIBLE_PATH), None, 2, 2, 3)
+    bench.nft_scenario(bench.load_module(bench.NFT_PATH), None, 2, 2, 3)
+
+
+def test_run_divides_costs_by_elements(monkeypatch):
+    table = dict(version=1, scenarios={
+        "bench_fungible_n2_m3_k4": [
+            dict(step=1, entrypoint="origination", status="applied", gas=600.0, paid_storage_size_diff=1200),
+            dict(step=2, entrypoint="transfer", status="applied", gas=100.0, paid_storage_size_diff=10),
+            dict(step=3, entrypoint="burn", status="failed", gas=None, paid_storage_size_diff=None),
+        ],
+        "bench_nft_n2_m3_k4": [
+            dict(step=1, entrypoint="mint", status="applied", gas=80.0, paid_storage_size_diff=16),
+        ],
+    })
+    monkeypatch.setattr(bench.costs, "recording", lambda *args, **kwargs: contextlib.nullcontext())
+    monkeypatch.setattr(bench.costs, "build_table", lambda path: table)
+    monkeypatch.setattr(bench, "_add_test", lambda *args: None)
+    rows = bench.run(["fungible", "nft"], [2], [3], [4])
+    assert [(row["contract"], row["entrypoint"], row["elements"], row["gas_per_element"],
+             row["storage_per_element"]) for row in rows] == [
+        # One initial ledger entry per holder and token
+        ("fungible", "origination", 6, 100.0, 200.0),
+        ("fungible", "transfer", 4, 25.0, 2.5),
+        # The NFT scenario mints 2K tokens
+        ("nft", "mint", 8, 10.0, 2.0),
+    ]
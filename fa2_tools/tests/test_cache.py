@@ -0,0 +1,82 @@
+import ast
+import os
+
+from fa2_tools import cache
+
+
+def _imports(source, path=os.path.join(cache.ROOT, "scenario.py")):
+    return sorted(set(os.path.relpath(p, cache.ROOT) for p in cache._imported_tools(ast.parse(source), path)))
+
+
+def test_every_import_form_is_followed():
+    assert _imports("import fa2_tools.views") == ["fa2_tools/__init__.py", "fa2_tools/views.py"]
+    assert _imports("from fa2_tools import views") == ["fa2_tools/__init__.py", "fa2_tools/views.py"]
+    assert _imports("from fa2_tools.views import views") == ["fa2_tools/__init__.py", "fa2_tools/views.py"]
+    assert _imports("def f():\n    import fa2_tools.permits") == ["fa2_tools/__init__.py", "fa2_tools/permits.py"]
+
+
+def test_relative_imports_and_lazy_packages():
+    path = os.path.join(cache.ROOT, "fa2_tools", "contracts", "_compile.py")
+    assert "fa2_tools/views.py" in _imports("from ..views import views", path)
+    assert "fa2_tools/contracts/_compile.py" in _imports("from fa2_tools.contracts import nft")
+
+
+def test_loaded_tutorial_files_are_followed():
+    assert "smartpy_fa2_fungible/part_4_complete.py" not in _imports("from fa2_tools import bench")
+    imports = _imports("from fa2_tools.bench import load_module\nmy_module = load_module(PATH)")
+    assert "smartpy_fa2_fungible/part_4_complete.py" in imports
+    assert "create-nfts/contract/pre-deployed-fa2-nft.py" in imports
+    # The contracts package loads the tutorial files on first use
+    init = os.path.join(cache.ROOT, "fa2_tools", "contracts", "__init__.py")
+    with open(init) as f:
+        assert "smartpy_fa2_fungible/part_3_complete.py" in _imports(f.read(), init)
+
+
+def test_key_changes_with_imported_sources(tmp_path, monkeypatch):
+    scenario = os.path.join(str(tmp_path), "scenario.py")
+    with open(scenario, "w") as f:
+        f.write("from fa2_tools import views\nX = 1  # a comment\n")
+    key = cache.source_key(scenario, "v")
+    with open(scenario, "w") as f:
+        f.write("from fa2_tools import views\n\nX = 1\n")
+    assert cache.source_key(scenario, "v") == key
+
+    parse = cache._parse
+    monkeypatch.setattr(cache, "_parse", lambda path: ast.parse("Y = 2") if path.endswith("views.py") else parse(path))
+    assert cache.source_key(scenario, "v") != key
+
+
+def test_module_key_ignores_test_bodies(tmp_path):
+    scenario = os.path.join(str(tmp_path), "scenario.py")
+    source = (
+        "import smartpy as sp\n"
+        "@sp.module\ndef main():\n    class C(sp.Contract):\n        pass\n"
+        "@sp.add_test()\ndef test():\n    scenario = sp.test_scenario('C', %s)\n"
+    )
+    with open(scenario, "w") as f:
+        f.write(source % "main")
+    keys = cache.module_key(scenario, "v"), cache.source_key(scenario, "v")
+    with open(scenario, "w") as f:
+        f.write(source % "[main]")
+    assert cache.module_key(scenario, "v") == keys[0]
+    assert cache.source_key(scenario, "v") != keys[1]
+    with open(scenario, "w") as f:
+        f.write((source % "main").replace("pass", "x = 1"))
+    assert cache.module_key(scenario, "v") != keys[0]
+
+
+def test_store_adds_artifacts_under_the_module_key(tmp_path):
+    scenario = os.path.join(str(tmp_path), "scenario.py")
+    with open(scenario, "w") as f:
+        f.write("import smartpy as sp\n")
+    store = cache.Cache(os.path.join(str(tmp_path), "cache"))
+    for name in ("A", "B"):
+        output_dir = os.path.join(str(tmp_path), "out" + name)
+        os.makedirs(os.path.join(output_dir, name))
+        with open(os.path.join(output_dir, name, "step_001_cont_0_contract.tz"), "w") as f:
+            f.write(name)
+        with open(scenario, "a") as f:
+            f.write("def test_%s():\n    pass\n" % name)
+        store.store(scenario, output_dir, dict(status="pass"))
+        assert store.passed(scenario) == dict(status="pass")
+    assert sorted(os.listdir(store.lookup(scenario))) == ["A", "B"]
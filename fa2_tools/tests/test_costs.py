@@ -0,0 +1,87 @@
+import json
+import os
+
+from fa2_tools.costs import build_table, compare, parse_receipt
+
+CONTRACT = "KT1AafHA1C1vk959wvHWBispY9Y2f3fxBUUo"
+
+ORIGINATION = """Operation successfully injected in the node.
+    Origination:
+      This origination was successfully applied
+      Originated contracts:
+        %s
+      Storage size: 1200 bytes
+      Paid storage size diff: 1200 bytes
+      Consumed gas: 1500.123
+""" % CONTRACT
+
+# A transfer with an internal operation, which has its own gas
+TRANSFER = """    Transaction:
+      This transaction was successfully applied
+      Updated storage: ...
+      Storage size: 1267 bytes
+      Paid storage size diff: 67 bytes
+      Consumed gas: 2000.5
+      Internal operations:
+        Internal Transaction:
+          This transaction was successfully applied
+          Storage size: 300 bytes
+          Consumed gas: 100.25
+"""
+
+
+def test_parse_receipt_sums_internal_operations():
+    assert parse_receipt(TRANSFER) == dict(gas=2100.75, storage_size=1267, paid_storage_size_diff=67)
+    assert parse_receipt("Nothing applied") == dict(gas=0, storage_size=None, paid_storage_size_diff=0)
+
+
+def _log(tmp_path, entries):
+    path = os.path.join(str(tmp_path), "calls.jsonl")
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    return path
+
+
+def _client(stdout, *argv, returncode=0):
+    return dict(argv=["--mode", "mockup", "--base-dir", "/tmp/m"] + list(argv), stdout=stdout, returncode=returncode)
+
+
+def test_build_table(tmp_path):
+    log = _log(tmp_path, [
+        dict(path="part_4.py"),
+        dict(scenario="fa2_lib_fungible"),
+        _client(ORIGINATION, "originate", "contract", "c0", "transferring", "0", "from", "bootstrap1"),
+        _client(TRANSFER, "transfer", "0", "from", "alice", "to", CONTRACT, "--entrypoint", "transfer"),
+        _client(TRANSFER, "transfer", "0", "from", "alice", "to", CONTRACT, "--entrypoint", "burn", "--dry-run"),
+        _client("", "transfer", "0", "from", "bob", "to", CONTRACT, "--entrypoint", "mint", returncode=1),
+        _client("", "list", "known", "contracts"),
+    ])
+    rows = build_table(log)["scenarios"]["part_4.py:fa2_lib_fungible"]
+    assert [(row["step"], row["entrypoint"], row["status"]) for row in rows] == [
+        (1, "origination", "applied"), (2, "transfer", "applied"), (3, "mint", "failed"),
+    ]
+    assert rows[0]["contract"] == CONTRACT
+    assert rows[0]["storage_size_diff"] == 1200
+    # The storage size diff is measured from the contract's previous size
+    assert rows[1]["storage_size_diff"] == 67
+    assert rows[2]["gas"] is None
+
+
+def _table(*rows):
+    return dict(version=1, scenarios={"s": [
+        dict(step=step, entrypoint=entrypoint, status="applied", gas=gas,
+             paid_storage_size_diff=0, storage_size_diff=None)
+        for step, (entrypoint, gas) in enumerate(rows, 1)
+    ]})
+
+
+def test_compare_matches_steps_by_occurrence():
+    baseline = _table(("transfer", 100), ("transfer", 200))
+    # A new mint step doesn't shift the transfers
+    current = _table(("mint", 50), ("transfer", 104), ("transfer", 220))
+    regressions = compare(baseline, current, threshold=0.05)
+    assert [(r["entrypoint"], r["occurrence"], r["field"], r["current"]) for r in regressions] == [
+        ("transfer", 1, "gas", 220),
+    ]
+    assert compare(baseline, current, threshold=0.2) == []
@@ -0,0 +1,82 @@
+from fa2_tools.fuzz import ADMIN, Model, generate, initial_ledger, shrink
+
+
+def _model():
+    return Model({("a0", 0): 10, ("a1", 1): 5}, 2)
+
+
+def _transfer(sender, from_, *txs):
+    return dict(kind="transfer", sender=sender, batch=[[from_, [list(tx) for tx in txs]]])
+
+
+def test_transfer_keeps_drained_keys_and_skips_zero_amounts():
+    model = _model()
+    assert model.apply(_transfer("a0", "a0", ("a1", 0, 10), ("a2", 0, 0))) is None
+    assert model.ledger == {("a0", 0): 0, ("a1", 0): 10, ("a1", 1): 5}
+    # A transfer of 0 tokens is still checked
+    assert model.apply(_transfer("a2", "a0", ("a2", 0, 0))) == "FA2_NOT_OPERATOR"
+    assert model.apply(_transfer("a0", "a0", ("a2", 2, 0))) == "FA2_TOKEN_UNDEFINED"
+
+
+def test_failed_calls_leave_the_state():
+    model = _model()
+    before = model.snapshot()
+    # The first tx is valid, the second overdraws the balance it left
+    assert model.apply(_transfer("a0", "a0", ("a1", 0, 6), ("a2", 0, 6))) == "FA2_INSUFFICIENT_BALANCE"
+    assert model.snapshot() == before
+
+
+def test_mint_burn_convert_and_operators():
+    model = _model()
+    assert model.apply(dict(kind="mint", sender="a0", batch=[["a0", 0, 1]])) == "FA2_NOT_ADMIN"
+    assert model.apply(dict(kind="mint", sender=ADMIN, batch=[["a2", None, 3], ["a2", 0, 1]])) is None
+    assert (model.next_token_id, model.supply) == (3, {0: 11, 1: 5, 2: 3})
+
+    assert model.apply(dict(kind="update_operators", sender="a1", batch=[["add", "a0", "a1", 0]])) == "FA2_NOT_OWNER"
+    assert model.apply(dict(kind="update_operators", sender="a0", batch=[["add", "a0", "a1", 0]])) is None
+    assert model.apply(dict(kind="burn", sender="a1", batch=[["a0", 0, 10]])) is None
+    assert model.ledger[("a0", 0)] == 0 and model.supply[0] == 1
+
+    assert model.apply(dict(kind="convert", sender="a1", batch=[[1, 0, 2], [0, 2, 2]])) is None
+    assert model.balance("a1", 1) == 3 and model.balance("a1", 2) == 2
+    assert model.supply == {0: 1, 1: 3, 2: 5}
+
+
+def test_snapshot_round_trip():
+    model = _model()
+    model.apply(dict(kind="update_operators", sender="a0", batch=[["add", "a0", "a1", 0]]))
+    model.apply(_transfer("a1", "a0", ("a1", 0, 10)))
+    restored = Model.from_snapshot(model.snapshot())
+    assert restored.snapshot() == model.snapshot()
+    assert restored.supply == model.supply
+
+
+def test_generate_is_deterministic_and_valid():
+    assert generate(7, 100) == generate(7, 100)
+    assert generate(7, 100) != generate(8, 100)
+    model = Model(initial_ledger(4, 3), 3)
+    for op in generate(7, 300, invalid=0):
+        assert model.apply(op) is None, op
+    assert 3 < model.next_token_id <= 8
+
+
+def test_generate_invalid_calls_fail():
+    ops = generate(3, 300, invalid=1)
+    model = Model(initial_ledger(4, 3), 3)
+    errors = [model.apply(op) for op in ops]
+    # A corrupted call can still be valid, such as an operator sender
+    assert sum(error is not None for error in errors) > len(ops) // 2
+
+
+def test_shrink_keeps_only_the_failing_calls():
+    ops = [dict(kind="mint", sender=ADMIN, batch=[[i], [i + 100]]) for i in range(40)]
+
+    def fails(candidate):
+        items = [item[0] for op in candidate for item in op["batch"]]
+        return 12 in items and 30 in items
+
+    shrunk = shrink(ops, fails, max_runs=500)
+    assert shrunk == [
+        dict(kind="mint", sender=ADMIN, batch=[[12]]),
+        dict(kind="mint", sender=ADMIN, batch=[[30]]),
+    ]
@@ -0,0 +1,219 @@
+import json
+import os
+
+from fa2_tools.indexer import Index, receipt_updates, storage_big_maps
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+ALICE_BYTES = "0x00006b82198cb179e8306c1bedd08f12dc863f328886"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+BOB_BYTES = "0x0000a26828841890d3f3a2a1d4083839c7a882fe0501"
+CONTRACT = "KT1AafHA1C1vk959wvHWBispY9Y2f3fxBUUo"
+
+# The storage type of `MyExtendedFungibleContract` in fa2_tools/examples/fungible.py,
+# which has several big_maps with the types of `ledger` and `supply`
+EXTENDED_STORAGE = """(pair (address %administrator)
+            (pair (big_map %airdrop_claimed (pair bytes nat) nat)
+                  (pair (bytes %airdrop_root)
+                        (pair (big_map %all_tokens_operators (pair (address %owner) (address %operator)) unit)
+                              (pair (big_map %balance_checkpoint_counts (pair address nat) nat)
+                                    (pair (big_map %balance_checkpoints (pair address (pair nat nat)) (pair (nat %balance) (nat %level)))
+                                          (pair (big_map %ledger (pair address nat) nat)
+                                                (pair (big_map %metadata string bytes)
+                                                      (pair (nat %next_token_id)
+                                                            (pair (big_map %operators (pair (address %owner) (pair (address %operator) (nat %token_id))) unit)
+                                                                  (pair (big_map %permit_nonces address nat)
+                                                                        (pair (big_map %permits (pair (address %owner) (bytes %transfer_hash)) timestamp)
+                                                                              (pair (big_map %supply nat nat)
+                                                                                    (pair (big_map %supply_checkpoint_counts nat nat)
+                                                                                          (pair (big_map %supply_checkpoints (pair nat nat) (pair (nat %level) (nat %supply)))
+                                                                                                (big_map %token_metadata nat (pair (nat %token_id) (map %token_info string bytes))))))))))))))))))"""
+
+ORIGINATION = """Operation hash is 'opGcxGa3kYnN4u9eAsn6LRJ2Vm2B8v6tZPWrGYn9pX6HHLqAt5G'
+Manager signed operations:
+  From: %(alice)s
+  Fee to the baker: ꜩ0.003
+  Expected counter: 2
+  Gas limit: 10000
+  Storage limit: 10000 bytes
+  Origination:
+    From: %(alice)s
+    Credit: ꜩ0
+    Script:
+      { parameter unit ;
+        storage
+          %(storage)s ;
+        code { CDR ; NIL operation ; PAIR } }
+      Initial storage: (Pair "%(alice)s" {} 0x {} {} {} {} {} 1 {} {} {} {} {} {} {})
+      No delegate for this contract
+    This origination was successfully applied
+    Originated contracts:
+      %(contract)s
+    Storage size: 9000 bytes
+    Updated big_maps:
+      New map(22) of type (big_map nat (pair (nat %%token_id) (map %%token_info string bytes)))
+      Set map(22)[0] to (Pair 0 { Elt "name" 0x54 })
+      New map(21) of type (big_map (pair nat nat) (pair (nat %%level) (nat %%supply)))
+      New map(20) of type (big_map nat nat)
+      New map(19) of type (big_map nat nat)
+      Set map(19)[0] to 10
+      New map(18) of type (big_map (pair (address %%owner) (bytes %%transfer_hash)) timestamp)
+      New map(17) of type (big_map address nat)
+      New map(16) of type (big_map (pair (address %%owner) (pair (address %%operator) (nat %%token_id))) unit)
+      New map(15) of type (big_map string bytes)
+      New map(14) of type (big_map (pair address nat) nat)
+      Set map(14)[(Pair %(alice_bytes)s 0)] to 10
+      New map(13) of type (big_map (pair address (pair nat nat)) (pair (nat %%balance) (nat %%level)))
+      New map(12) of type (big_map (pair address nat) nat)
+      New map(11) of type (big_map (pair (address %%owner) (address %%operator)) unit)
+      New map(10) of type (big_map (pair bytes nat) nat)
+    Paid storage size diff: 9000 bytes
+""" % dict(alice=ALICE, alice_bytes=ALICE_BYTES, contract=CONTRACT, storage=EXTENDED_STORAGE)
+
+TRANSFER = """Operation hash is 'ooNUJGrBRAVJAPuZsJkHkhBQbkzLmGm8EtvWUK2rAiVSwrYTs5S'
+Manager signed operations:
+  From: %(alice)s
+  Transaction:
+    Amount: ꜩ0
+    From: %(alice)s
+    To: %(contract)s
+    Entrypoint: transfer
+    This transaction was successfully applied
+    Updated storage: Unit
+    Updated big_maps:
+      Set map(14)[(Pair %(bob_bytes)s 0)] to 3
+      Set map(14)[(Pair %(alice_bytes)s 0)] to 7
+      Set map(13)[(Pair %(alice_bytes)s 0 0)] to (Pair 10 0)
+      Set map(12)[(Pair %(alice_bytes)s 0)] to 2
+      Set map(12)[(Pair %(bob_bytes)s 0)] to 1
+      Set map(20)[0] to 1
+""" % dict(alice=ALICE, alice_bytes=ALICE_BYTES, bob_bytes=BOB_BYTES, contract=CONTRACT)
+
+
+def test_storage_big_maps_follows_storage_order():
+    fields = storage_big_maps("{ parameter unit ; storage %s ; code { FAILWITH } }" % EXTENDED_STORAGE)
+    assert [field for field, _ in fields] == [
+        "airdrop_claimed", "all_tokens_operators", "balance_checkpoint_counts", "balance_checkpoints",
+        "ledger", "metadata", "operators", "permit_nonces", "permits", "supply",
+        "supply_checkpoint_counts", "supply_checkpoints", "token_metadata",
+    ]
+    assert fields[2] == ("balance_checkpoint_counts", "(big_map (pair address nat) nat)")
+
+
+def test_origination_names_big_maps_by_field():
+    names = {update["big_map_id"]: update["name"]
+             for update in receipt_updates(ORIGINATION) if update["action"] == "new"}
+    assert names == {10: None, 11: None, 12: None, 13: None, 14: "ledger", 15: None, 16: "operators",
+                     17: None, 18: None, 19: "supply", 20: None, 21: None, 22: "token_metadata"}
+
+
+def test_extended_receipts_skip_checkpoint_counts():
+    index = Index()
+    index.apply_receipt(ORIGINATION)
+    index.apply_receipt(TRANSFER)
+    assert index.holders(CONTRACT, 0) == sorted([(ALICE, 7), (BOB, 3)])
+    assert index.supply(CONTRACT, 0) == 10
+    assert index.token_metadata(CONTRACT, 0) == {"name": b"T"}
+
+
+def test_ambiguous_types_without_script_are_skipped():
+    receipt = "\n".join(line for line in ORIGINATION.splitlines() if "Script:" not in line)
+    names = {update["big_map_id"]: update["name"]
+             for update in receipt_updates(receipt) if update["action"] == "new"}
+    assert names[14] is None and names[12] is None
+    assert names[16] == "operators"
+
+
+# The storage type of the tutorial fungible contracts, whose big_maps all have different types
+FUNGIBLE_STORAGE = """(pair (address %administrator)
+            (pair (big_map %ledger (pair address nat) nat)
+                  (pair (big_map %metadata string bytes)
+                        (pair (nat %next_token_id)
+                              (pair (big_map %operators (pair (address %owner) (pair (address %operator) (nat %token_id))) unit)
+                                    (pair (big_map %supply nat nat)
+                                          (big_map %token_metadata nat (pair (nat %token_id) (map %token_info string bytes)))))))))"""
+
+
+def _origination(storage, updates, contract=CONTRACT):
+    return """Manager signed operations:
+  Origination:
+    From: %(alice)s
+    Script:
+      { parameter unit ;
+        storage
+          %(storage)s ;
+        code { CDR ; NIL operation ; PAIR } }
+      Initial storage: Unit
+    This origination was successfully applied
+    Originated contracts:
+      %(contract)s
+    Updated big_maps:
+%(updates)s
+""" % dict(alice=ALICE, storage=storage, contract=contract,
+           updates="\n".join("      " + update for update in updates))
+
+
+def test_ids_out_of_storage_order():
+    # The IDs go down the storage instead of up
+    receipt = _origination(FUNGIBLE_STORAGE, [
+        "New map(5) of type (big_map nat (pair (nat %token_id) (map %token_info string bytes)))",
+        "New map(6) of type (big_map nat nat)",
+        "Set map(6)[0] to 10",
+        "New map(7) of type (big_map (pair (address %owner) (pair (address %operator) (nat %token_id))) unit)",
+        "New map(8) of type (big_map string bytes)",
+        "New map(9) of type (big_map (pair address nat) nat)",
+        "Set map(9)[(Pair %s 0)] to 10" % ALICE_BYTES,
+    ])
+    names = {update["big_map_id"]: update["name"]
+             for update in receipt_updates(receipt) if update["action"] == "new"}
+    assert names == {5: "token_metadata", 6: "supply", 7: "operators", 8: None, 9: "ledger"}
+    index = Index()
+    index.apply_receipt(receipt)
+    assert index.holders(CONTRACT, 0) == [(ALICE, 10)]
+    assert index.supply(CONTRACT, 0) == 10
+
+    # With several big_maps of a type, those types are left out
+    shuffled = ORIGINATION.replace("New map(14)", "New map(99)").replace("map(14)[", "map(99)[") \
+        .replace("New map(10)", "New map(14)").replace("New map(99)", "New map(10)").replace("map(99)[", "map(10)[")
+    names = {update["big_map_id"]: update["name"]
+             for update in receipt_updates(shuffled) if update["action"] == "new"}
+    assert names[10] is None and names[19] is None
+    assert names[16] == "operators" and names[22] == "token_metadata"
+
+
+def test_copied_big_maps_keep_their_entries():
+    other = "KT1NFT1C1vk959wvHWBispY9Y2f3fxBUUo"
+    index = Index()
+    index.apply_receipt(ORIGINATION)
+    # A contract originated with a copy of the ledger, then a new supply
+    storage = "(pair (big_map %ledger (pair address nat) nat) (big_map %supply nat nat))"
+    index.apply_receipt(_origination(storage, [
+        "Copy map(14) to map(30)",
+        "Set map(30)[(Pair %s 0)] to 5" % BOB_BYTES,
+        "New map(31) of type (big_map nat nat)",
+        "Set map(31)[0] to 15",
+    ], contract=other))
+    assert index.holders(other, 0) == sorted([(ALICE, 10), (BOB, 5)])
+    assert index.supply(other, 0) == 15
+    # The source keeps its own entries
+    assert index.holders(CONTRACT, 0) == [(ALICE, 10)]
+
+
+def _write_log(path, started, receipts):
+    with open(path, "w") as log:
+        log.write(json.dumps(dict(started=started)) + "\n")
+        for receipt in receipts:
+            log.write(json.dumps(dict(argv=["transfer"], stdout=receipt, returncode=0)) + "\n")
+
+
+def test_rewritten_log_is_read_again(tmp_path):
+    path = os.path.join(str(tmp_path), "calls.jsonl")
+    index = Index(os.path.join(str(tmp_path), "fa2.sqlite"))
+    _write_log(path, 1, [ORIGINATION, TRANSFER])
+    assert index.ingest(path) == 2
+    assert index.ingest(path) == 0
+
+    # A new run truncates the log and writes a longer one from the start
+    _write_log(path, 2, [ORIGINATION, TRANSFER, TRANSFER])
+    assert index.ingest(path) == 3
+    assert index.balance(CONTRACT, BOB, 0) == 3
+    index.close()
@@ -0,0 +1,77 @@
+import pytest
+
+from fa2_tools.ipfs import CHUNK_SIZE, LocalStore, compute_cid, pin_on_ipfs, serialize
+
+
+@pytest.mark.parametrize("blob, cid_v0, cid_v1", [
+    # `ipfs add` and `ipfs add --cid-version 1` of these files
+    (b"", "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH",
+     "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"),
+    (b"hello world", "Qmf412jQZiuVUtdgnB36FXFX7xg5V6KEbSJ4dpQuhkLyfD",
+     "bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e"),
+    (b"hello world\n", "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o",
+     "bafkreifjjcie6lypi6ny7amxnfftagclbuxndqonfipmb64f2km2devei4"),
+])
+def test_known_cids(blob, cid_v0, cid_v1):
+    assert compute_cid(blob, 0) == cid_v0
+    assert compute_cid(blob, 1) == cid_v1
+
+
+def test_chunked_file_has_a_dag_pb_root():
+    blob = b"x" * (CHUNK_SIZE + 1)
+    assert compute_cid(blob, 0).startswith("Qm")
+    # Raw leaves, but the root that links them is a dag-pb node
+    assert compute_cid(blob, 1).startswith("bafybei")
+    assert compute_cid(blob, 1) != compute_cid(b"x" * CHUNK_SIZE, 1)
+
+
+def test_pin_locally(tmp_path):
+    store = LocalStore(str(tmp_path))
+    metadata = {"name": "My FA2", "version": "1.0.0", "description": "Tokens ✓"}
+    uri = pin_on_ipfs(metadata, backend="local", store=store)
+    cid = uri[len("ipfs://"):]
+    assert cid == compute_cid(serialize(metadata))
+    assert cid in store
+    assert compute_cid(b"") not in store
+    assert store.get(cid) == '{"name":"My FA2","version":"1.0.0","description":"Tokens ✓"}'.encode("utf-8")
+    assert pin_on_ipfs(dict(metadata), backend="local", store=store) == uri
+    with pytest.raises(ValueError):
+        pin_on_ipfs(metadata, backend="s3", store=store)
+
+
+def test_install_replaces_sp_pin_on_ipfs(tmp_path, monkeypatch):
+    import smartpy as sp
+
+    from fa2_tools import ipfs
+
+    monkeypatch.setattr(sp, "pin_on_ipfs", sp.pin_on_ipfs)
+    monkeypatch.setattr(ipfs, "_sp_pin_on_ipfs", None)
+    monkeypatch.setenv("FA2_IPFS_STORE", str(tmp_path))
+    original = sp.pin_on_ipfs
+    ipfs.install()
+    ipfs.install()
+    assert sp.pin_on_ipfs is pin_on_ipfs
+    assert ipfs._sp_pin_on_ipfs is original
+    uri = sp.pin_on_ipfs({"name": "My FA2"})
+    assert LocalStore(str(tmp_path)).get(uri[len("ipfs://"):]) == b'{"name":"My FA2"}'
+
+
+def test_main_runs_a_script_with_the_offline_pin(tmp_path, monkeypatch):
+    import sys
+
+    import smartpy as sp
+
+    from fa2_tools import ipfs
+
+    monkeypatch.setattr(sp, "pin_on_ipfs", sp.pin_on_ipfs)
+    monkeypatch.setattr(ipfs, "_sp_pin_on_ipfs", None)
+    monkeypatch.setattr(sys, "argv", list(sys.argv))
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setenv("FA2_IPFS_STORE", str(tmp_path / "store"))
+    script = tmp_path / "script.py"
+    script.write_text(
+        "import smartpy as sp\n"
+        "open(%r, 'w').write(sp.pin_on_ipfs({'name': 'My FA2'}))\n" % str(tmp_path / "uri")
+    )
+    assert ipfs.main([str(script)]) == 0
+    assert (tmp_path / "uri").read_text() == pin_on_ipfs({"name": "My FA2"}, store=LocalStore(str(tmp_path)))
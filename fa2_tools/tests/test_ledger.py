@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from fa2_tools import michelson
+from fa2_tools.ledger import FungibleImport, ledger_entry_bytes
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+
+
+def _snapshot(tmp_path, rows):
+    path = os.path.join(str(tmp_path), "holders.csv")
+    with open(path, "w") as f:
+        f.write("owner,token_id,amount\n")
+        for owner, token_id, amount in rows:
+            f.write("%s,%d,%d\n" % (owner, token_id, amount))
+    return path
+
+
+def test_ledger_entry_bytes_matches_encoding():
+    elt = b"\x07\x04" + michelson.encode_pair(michelson.encode_address(ALICE), michelson.encode_int(300)) \
+        + michelson.encode_int(10 ** 6)
+    assert ledger_entry_bytes(300, 10 ** 6) == len(elt)
+
+
+def test_split_and_resume(tmp_path):
+    rows = [(ALICE if i % 2 else BOB, i % 3, i + 1) for i in range(10)]
+    snapshot = _snapshot(tmp_path, rows)
+    progress = os.path.join(str(tmp_path), "progress.json")
+    # Room for 3 ledger entries in the origination and 3 mint entries per batch
+    budgets = dict(origination_bytes=3 * ledger_entry_bytes(0, 1), batch_entries=3)
+
+    importer = FungibleImport(snapshot, progress, **budgets)
+    assert importer.plan() == dict(initial_entries=3, batches=3, batch_entries=7, largest_batch=3, operations=4)
+    ledger = importer.initial_ledger()
+    assert len(ledger) == 3
+    importer.originated()
+    first = next(importer.mint_batches())
+    assert len(first) == 3
+    importer.submitted(first)
+
+    # Started again, the import continues after the first batch
+    resumed = FungibleImport(snapshot, progress, **budgets)
+    assert [len(batch) for batch in resumed.mint_batches()] == [3, 1]
+
+
+def test_mint_before_origination(tmp_path):
+    importer = FungibleImport(_snapshot(tmp_path, [(ALICE, 0, 1)]))
+    with pytest.raises(RuntimeError):
+        next(importer.mint_batches())
+
+
+def test_resume_after_injection(tmp_path):
+    snapshot = _snapshot(tmp_path, [(ALICE, 0, i + 1) for i in range(4)])
+    progress = os.path.join(str(tmp_path), "progress.json")
+    budgets = dict(origination_bytes=0, batch_entries=2)
+    importer = FungibleImport(snapshot, progress, **budgets)
+    importer.initial_ledger()
+    importer.originated()
+    importer.injecting(next(importer.mint_batches()), "opHash1")
+
+    # Interrupted before `submitted`: the batch may or may not be on chain
+    resumed = FungibleImport(snapshot, progress, **budgets)
+    assert resumed.pending_operation() == "opHash1"
+    with pytest.raises(RuntimeError):
+        next(resumed.mint_batches())
+    resumed.resolve(included=True)
+    assert [len(batch) for batch in resumed.mint_batches()] == [2]
+
+    resumed.injecting(next(resumed.mint_batches()), "opHash2")
+    dropped = FungibleImport(snapshot, progress, **budgets)
+    dropped.resolve(included=False)
+    assert dropped.pending_operation() is None
+    assert [len(batch) for batch in dropped.mint_batches()] == [2]
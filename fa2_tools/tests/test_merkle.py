@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+from fa2_tools.merkle import build, build_small, leaf_hash, node_hash, verify
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+
+
+def _naive_root(leaves):
+    while len(leaves) > 1:
+        if len(leaves) % 2:
+            leaves = leaves + leaves[-1:]
+        leaves = [node_hash(leaves[i], leaves[i + 1]) for i in range(0, len(leaves), 2)]
+    return leaves[0]
+
+
+def _allocations(count):
+    return [(ALICE if i % 3 else BOB, i % 4, i + 1) for i in range(count)]
+
+
+def test_leaf_hash():
+    # `sp.blake2b(sp.bytes("0x00") + sp.pack((0, (sp.address(ALICE), (0, 5)))))` in a scenario
+    assert leaf_hash(0, ALICE, 0, 5).hex() == "1af7480b3870d5e8d97a01e5e9621c02d68b56584aac88eb9c337798dea2684f"
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 8, 13])
+def test_roots_and_proofs(count):
+    allocations = _allocations(count)
+    root, entries = build_small(allocations)
+    expected = _naive_root([leaf_hash(i, *allocation) for i, allocation in enumerate(allocations)])
+    assert root == expected.hex()
+    for entry in entries:
+        proof = [bytes.fromhex(sibling) for sibling in entry["proof"]]
+        assert verify(entry["index"], entry["owner"], entry["token_id"], entry["amount"], proof, expected)
+        # The proof doesn't hold for another amount or index
+        assert not verify(entry["index"], entry["owner"], entry["token_id"], entry["amount"] + 1, proof, expected)
+        if count > 1:
+            assert not verify(entry["index"] ^ 1, entry["owner"], entry["token_id"], entry["amount"], proof, expected)
+
+
+def test_build_from_file(tmp_path):
+    path = os.path.join(str(tmp_path), "airdrop.jsonl")
+    with open(path, "w") as f:
+        for owner, token_id, amount in _allocations(6):
+            f.write(json.dumps(dict(owner=owner, token_id=token_id, amount=amount)) + "\n")
+        # NFT allocations can leave the amount out
+        f.write(json.dumps(dict(owner=BOB, token_id=9)) + "\n")
+    output = os.path.join(str(tmp_path), "proofs.jsonl")
+    result = build(path, output, work_dir=str(tmp_path))
+    assert result["allocations"] == 7 and result["depth"] == 3
+    with open(output) as f:
+        entries = [json.loads(line) for line in f]
+    assert entries[-1]["amount"] == 1
+    assert result["root"] == build_small(_allocations(6) + [(BOB, 9, 1)])[0]
+    # Only the output is left behind
+    assert sorted(os.listdir(str(tmp_path))) == ["airdrop.jsonl", "proofs.jsonl"]
@@ -0,0 +1,67 @@
+import json
+import os
+
+import smartpy as sp
+
+from fa2_tools import contracts, metadata
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+
+
+def _rows(count):
+    return (
+        dict(symbol="ART", name="Art %d" % i, thumbnailUri="ipfs://thumb", owner=BOB if i % 2 else "")
+        for i in range(count)
+    )
+
+
+def test_chunks_and_fields():
+    assert list(metadata.chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    fields = metadata._fields(dict(symbol="A", name="B", thumbnailUri="t", artifactUri="a", decimals=""))
+    assert fields == dict(name="B", decimals="0", symbol="A", displayUri="t", artifactUri="a",
+                          description="", thumbnailUri="t")
+    # Repeated strings are encoded once
+    assert metadata.encode("ipfs://thumb") is metadata.encode("ipfs://thumb")
+
+
+def test_split_initial_leaves_the_rest_unread():
+    rows = _rows(7)
+    initial, rest = metadata.split_initial(rows, 3, chunk_size=2)
+    assert len(initial) == 3
+    assert next(rest)["name"] == "Art 3"
+
+
+def test_collection_in_a_contract():
+    initial, rest = metadata.split_initial(_rows(7), 3, chunk_size=2)
+    batches = list(metadata.mint_batches(rest, to_=sp.address(ALICE), chunk_size=3))
+    assert [len(batch) for batch in batches] == [3, 1]
+
+    # No scenario name, so that nothing is written to disk
+    scenario = sp.test_scenario(None, contracts.nft)
+    admin = sp.test_account("Admin")
+    contract = contracts.nft.MyNFTContract(
+        admin.address, sp.big_map(), {i: sp.address(ALICE) for i in range(3)}, initial
+    )
+    scenario += contract
+    for batch in batches:
+        contract.mint(batch, _sender=admin)
+    for token_id in range(7):
+        token_info = contract.data.token_metadata[token_id].token_info
+        scenario.verify(token_info["name"] == sp.bytes("0x" + ("Art %d" % token_id).encode().hex()))
+        scenario.verify(token_info["displayUri"] == sp.bytes("0x" + b"ipfs://thumb".hex()))
+        scenario.verify(token_info["decimals"] == sp.bytes("0x30"))
+    # Rows with an owner go to it, the others to `to_`
+    scenario.verify(contract.data.ledger[3] == sp.address(BOB))
+    scenario.verify(contract.data.ledger[4] == sp.address(ALICE))
+
+
+def test_write_token_files(tmp_path):
+    directory = os.path.join(str(tmp_path), "tokens")
+    assert metadata.write_token_files(_rows(2), directory, first_token_id=10) == 2
+    assert sorted(os.listdir(directory)) == ["10.json", "11.json"]
+    with open(os.path.join(directory, "11.json")) as f:
+        token = json.load(f)
+    assert token["name"] == "Art 1"
+    assert token["decimals"] == 0
+    assert token["artifactUri"] == "ipfs://thumb"
@@ -0,0 +1,85 @@
+import pytest
+
+from fa2_tools import michelson
+from fa2_tools.michelson import Pair
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+CONTRACT = "KT1AafHA1C1vk959wvHWBispY9Y2f3fxBUUo"
+
+
+@pytest.mark.parametrize("encoded, packed", [
+    # What `sp.pack` returns for the same values
+    (michelson.encode_int(0), "050000"),
+    (michelson.encode_int(63), "05003f"),
+    (michelson.encode_int(64), "05008001"),
+    (michelson.encode_int(1000000), "050080897a"),
+    (michelson.encode_int(-1), "050041"),
+    (michelson.encode_int(-64), "0500c001"),
+    (michelson.encode_string("abc"), "050100000003616263"),
+    (michelson.encode_bytes(bytes.fromhex("dead")), "050a00000002dead"),
+    (michelson.encode_bool(True), "05030a"),
+    (michelson.encode_bool(False), "050303"),
+    (michelson.encode_left(michelson.encode_int(1)), "0505050001"),
+    (michelson.encode_right(michelson.encode_int(1)), "0505080001"),
+    (michelson.encode_list([michelson.encode_int(1), michelson.encode_int(2)]), "05020000000400010002"),
+    (michelson.encode_map([(michelson.encode_int(0), michelson.encode_string("b")),
+                           (michelson.encode_int(1), michelson.encode_string("a"))]),
+     "0502000000140704000001000000016207040001010000000161"),
+    (michelson.encode_address(BOB), "050a000000160000a26828841890d3f3a2a1d4083839c7a882fe0501"),
+    (michelson.encode_pair(michelson.encode_address(ALICE), michelson.encode_int(0)),
+     "0507070a0000001600006b82198cb179e8306c1bedd08f12dc863f3288860000"),
+    (michelson.encode_pair(michelson.encode_address(CONTRACT), michelson.encode_int(7)),
+     "0507070a000000160115eb0104481a6d7921160bc982c5e0a561cd8a3a000007"),
+])
+def test_pack(encoded, packed):
+    assert michelson.pack(encoded).hex() == packed
+
+
+def test_script_expr_hash():
+    # The big_map key hashes that octez-client prints for `0` and `Pair "tz1VSU..." 0`
+    assert michelson.script_expr_hash(bytes.fromhex("050000")) == "exprtZBwZUeYYYfUs9B9Rg2ywHezVHnCCnmF9WsDQVrs582dSK63dC"
+    assert michelson.script_expr_hash(
+        bytes.fromhex("0507070a0000001600006b82198cb179e8306c1bedd08f12dc863f3288860000")
+    ) == "expruf31xxwPARn57EfGnwxDZNNBT9aANCoawPVeTfBx5ckmgvaJje"
+
+
+def test_nat_bytes_matches_encoding():
+    for n in (0, 1, 63, 64, 8191, 8192, 2 ** 64):
+        assert michelson.nat_bytes(n) == len(michelson.encode_int(n))
+
+
+@pytest.mark.parametrize("address", [ALICE, BOB, CONTRACT])
+def test_address_round_trip(address):
+    data = michelson.address_to_bytes(address)
+    assert len(data) == 22
+    assert michelson.address_from_bytes(data) == address
+
+
+def test_bad_checksum():
+    with pytest.raises(ValueError):
+        michelson.base58check_decode(ALICE[:-1] + "c")
+
+
+def test_parse():
+    value = michelson.parse('(Pair 0x00006b82198cb179e8306c1bedd08f12dc863f328886 (Pair 3 "a\\"b") { Elt 1 True })')
+    assert value == Pair([bytes.fromhex("00006b82198cb179e8306c1bedd08f12dc863f328886"), Pair([3, 'a"b']), {1: True}])
+    # Right combs are flattened
+    assert michelson.parse("Pair 1 (Pair 2 3)") == Pair([1, 2, 3])
+    assert michelson.parse("(Some (Left Unit))") == ("Left", None)
+    assert michelson.parse("{ -1 ; 2 }") == [-1, 2]
+    with pytest.raises(ValueError):
+        michelson.parse("1 2")
+
+
+def test_from_json():
+    value = {"prim": "Pair", "args": [{"string": ALICE}, {"prim": "Pair", "args": [{"int": "3"}, {"bytes": "ff"}]}]}
+    assert michelson.from_json(value) == Pair([ALICE, 3, b"\xff"])
+    assert michelson.from_json([{"prim": "Elt", "args": [{"int": "0"}, {"prim": "Unit"}]}]) == {0: None}
+
+
+def test_micheline_size():
+    value = {"prim": "Pair", "args": [{"int": "64"}, {"string": "abc"}]}
+    assert michelson.micheline_size(value) == len(
+        michelson.encode_pair(michelson.encode_int(64), michelson.encode_string("abc"))
+    )
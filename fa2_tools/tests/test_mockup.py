@@ -0,0 +1,35 @@
+from fa2_tools.mockup import MockupClient
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+CONTRACT = "KT1AafHA1C1vk959wvHWBispY9Y2f3fxBUUo"
+
+
+def _client(monkeypatch, output):
+    """A client whose `octez-client` runs are recorded and answered with `output`."""
+    client = MockupClient(base_dir="/nonexistent")
+    commands = []
+
+    def run(*args):
+        commands.append(args)
+        return output
+
+    monkeypatch.setattr(client, "run", run)
+    return client, commands
+
+
+def test_get_balance_calls_get_balance_of(monkeypatch):
+    client, commands = _client(monkeypatch, '{ Pair (Pair "%s" 3) 12 }\n' % ALICE)
+    assert client.get_balance(CONTRACT, ALICE, 3) == 12
+    assert commands == [(
+        "run", "view", "get_balance_of", "on", "contract", CONTRACT,
+        "with", "input", '{ Pair "%s" 3 }' % ALICE,
+    )]
+
+
+def test_get_balances_keeps_request_order(monkeypatch):
+    client, commands = _client(
+        monkeypatch, '{ Pair (Pair "%s" 0) 0 ; Pair (Pair "%s" 0) 1 }' % (ALICE, BOB)
+    )
+    assert client.get_balances(CONTRACT, [(ALICE, 0), (BOB, 0)]) == [0, 1]
+    assert commands[0][-1] == '{ Pair "%s" 0 ; Pair "%s" 0 }' % (ALICE, BOB)
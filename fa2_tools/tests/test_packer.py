@@ -0,0 +1,58 @@
+import pytest
+
+from fa2_tools import michelson
+from fa2_tools.packer import CALL_OVERHEAD_BYTES, CostModel, item_bytes, pack, summary
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+CAROL = "KT1AafHA1C1vk959wvHWBispY9Y2f3fxBUUo"
+
+
+def _encoded_transfer(items):
+    """Encode a transfer parameter the way `to_smartpy` groups it."""
+    batches = []
+    for from_, to_, token_id, amount in items:
+        if not batches or batches[-1][0] != from_:
+            batches.append((from_, []))
+        tx = michelson.encode_pair(
+            michelson.encode_address(to_),
+            michelson.encode_pair(michelson.encode_int(token_id), michelson.encode_int(amount)),
+        )
+        batches[-1][1].append(tx)
+    return michelson.encode_list([
+        michelson.encode_pair(michelson.encode_address(from_), michelson.encode_list(txs))
+        for from_, txs in batches
+    ])
+
+
+def test_transfer_size_matches_encoding():
+    # Alice's transfers are split by one of Bob's, so they need two `from_` items
+    items = [(ALICE, BOB, 0, 1), (ALICE, CAROL, 1, 300), (BOB, ALICE, 0, 70000), (ALICE, BOB, 2, 5)]
+    [group] = pack("transfer", items)
+    [call] = group["calls"]
+    assert call["items"] == items
+    # The overhead covers the list header of the parameter
+    assert call["bytes"] - CALL_OVERHEAD_BYTES == len(_encoded_transfer(items)) - 5
+
+
+def test_item_bytes():
+    assert item_bytes("transfer", (ALICE, BOB, 0, 1)) == 2 * 2 + 27 + 2 + 2
+    assert item_bytes("convert", (0, 1, 64)) == 2 * 2 + 2 + 2 + 3
+    with pytest.raises(ValueError):
+        item_bytes("approve", ())
+
+
+def test_calls_split_on_gas():
+    model = CostModel({"mint": (1000, 100000, 0)})
+    groups = pack("mint", [(ALICE, 0, 1)] * 20, model)
+    totals = summary(groups)
+    # 9 items use 901,000 gas, under 90% of the operation limit
+    assert totals["largest_call"] == 9
+    assert totals["calls"] == 3 and totals["items"] == 20
+    assert all(group["gas"] <= 1733333 * 0.9 for group in groups)
+
+
+def test_reorder_places_largest_items_first():
+    items = [(0, 1, 1), (0, 1, 2 ** 60), (0, 1, 2)]
+    [group] = pack("convert", items, keep_order=False)
+    assert group["calls"][0]["items"][0] == (0, 1, 2 ** 60)
@@ -0,0 +1,108 @@
+import http.server
+import json
+import threading
+
+import pytest
+
+from fa2_tools.rpc import ledger_key_hash, nft_ledger_key_hash, read_balances
+
+ALICE = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+BOB = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+FUNGIBLE = "KT1AafHA1C1vk959wvHWBispY9Y2f3fxBUUo"
+NFT = "KT1NFT1C1vk959wvHWBispY9Y2f3fxBUUo"
+BLOCK = "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2"
+
+# `Pair tz1VSU... 0` and `0`, hashed by octez-client as `expr...` keys
+ALICE_0 = "expruf31xxwPARn57EfGnwxDZNNBT9aANCoawPVeTfBx5ckmgvaJje"
+TOKEN_0 = "exprtZBwZUeYYYfUs9B9Rg2ywHezVHnCCnmF9WsDQVrs582dSK63dC"
+
+
+def _storage_type(ledger_type):
+    return dict(prim="pair", args=[
+        dict(prim="address", annots=["%administrator"]),
+        dict(prim="big_map", annots=["%ledger"], args=ledger_type),
+        dict(prim="big_map", annots=["%supply"], args=[dict(prim="nat"), dict(prim="nat")]),
+    ])
+
+
+CONTRACTS = {
+    FUNGIBLE: dict(
+        code=[dict(prim="parameter", args=[dict(prim="unit")]),
+              dict(prim="storage", args=[_storage_type([
+                  dict(prim="pair", args=[dict(prim="address"), dict(prim="nat")]), dict(prim="nat")])]),
+              dict(prim="code", args=[[]])],
+        storage=dict(prim="Pair", args=[dict(string=ALICE), dict(int="12"), dict(int="13")]),
+    ),
+    NFT: dict(
+        code=[dict(prim="parameter", args=[dict(prim="unit")]),
+              dict(prim="storage", args=[_storage_type([dict(prim="nat"), dict(prim="address")])]),
+              dict(prim="code", args=[[]])],
+        # A right comb written as a sequence
+        storage=[dict(string=ALICE), dict(int="20"), dict(int="21")],
+    ),
+}
+BIG_MAPS = {
+    (12, ALICE_0): dict(int="10"),
+    (12, ledger_key_hash(BOB, 1)): dict(int="3"),
+    (20, TOKEN_0): dict(string=BOB),
+    (20, nft_ledger_key_hash(1)): dict(bytes="00006b82198cb179e8306c1bedd08f12dc863f328886"),
+}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    blocks = set()
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        body = None
+        if self.path == "/chains/main/blocks/head/hash":
+            body = BLOCK
+        elif parts[:3] == ["chains", "main", "blocks"] and parts[4:5] == ["context"]:
+            self.blocks.add(parts[3])
+            if parts[5] == "contracts" and parts[7:] == ["script"]:
+                body = CONTRACTS.get(parts[6])
+            elif parts[5] == "big_maps":
+                body = BIG_MAPS.get((int(parts[6]), parts[7]))
+        data = json.dumps(body).encode()
+        self.send_response(404 if body is None else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def node():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    _Handler.blocks.clear()
+    yield "http://127.0.0.1:%d" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_key_hashes():
+    assert ledger_key_hash(ALICE, 0) == ALICE_0
+    assert nft_ledger_key_hash(0) == TOKEN_0
+
+
+def test_fungible_balances(node):
+    requests = [(ALICE, 0), (BOB, 1), (BOB, 0)] * 20
+    assert read_balances(node, FUNGIBLE, requests, connections=4) == [10, 3, 0] * 20
+    assert _Handler.blocks == {BLOCK}
+
+
+def test_nft_balances(node):
+    requests = [(BOB, 0), (ALICE, 0), (ALICE, 1), (ALICE, 2)]
+    assert read_balances(node, NFT, requests, block="42") == [1, 0, 1, 0]
+    assert _Handler.blocks == {"42"}
+
+
+def test_missing_contract(node):
+    with pytest.raises(ValueError):
+        read_balances(node, "KT1Missing", [(ALICE, 0)])
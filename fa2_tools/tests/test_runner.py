@@ -0,0 +1,21 @@
+import os
+
+from fa2_tools import runner
+
+COMPILE_PATH = os.path.join(runner.TOOLS_DIR, "contracts", "_compile.py")
+
+
+def test_discovery_skips_the_tools_package_but_not_the_examples():
+    found = runner.discover([runner.ROOT])
+    assert os.path.join(runner.ROOT, "smartpy_fa2_fungible", "part_4_complete.py") in found
+    assert os.path.join(runner.EXAMPLES_DIR, "fungible.py") in found
+    assert os.path.join(runner.EXAMPLES_DIR, "nft.py") in found
+    assert not [
+        path for path in found
+        if path.startswith(runner.TOOLS_DIR + os.sep) and not path.startswith(runner.EXAMPLES_DIR + os.sep)
+    ]
+
+
+def test_explicit_tools_file_is_found():
+    found = runner.discover([COMPILE_PATH])
+    assert found[COMPILE_PATH] == ["test_fungible", "test_convertible_fungible", "test_nft", "test_open_mint_nft"]
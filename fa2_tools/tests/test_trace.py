@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+from fa2_tools import runner
+from fa2_tools.trace import Tracer
+
+
+def _span(tracer):
+    tracer.begin("compile", "my_module")
+    tracer.end()
+    return tracer.events[-1]
+
+
+def test_span_records_memory(tmp_path):
+    event = _span(Tracer(str(tmp_path / "trace.json"), memory=False))
+    assert event["ph"] == "X" and event["name"] == "my_module"
+    if sys.platform != "win32":
+        assert event["args"]["max_rss_bytes"] > 0
+
+
+def test_span_without_getrusage(tmp_path, monkeypatch):
+    # Windows has no `resource` module
+    monkeypatch.setitem(sys.modules, "resource", None)
+    event = _span(Tracer(str(tmp_path / "trace.json"), memory=False))
+    assert "max_rss_bytes" not in event["args"]
+
+
+SCENARIO = '''
+import smartpy as sp
+
+
+@sp.module
+def counter_module():
+    class Counter(sp.Contract):
+        def __init__(self):
+            self.data.count = 0
+
+        @sp.entrypoint
+        def increment(self, amount):
+            self.data.count += amount
+
+        @sp.onchain_view()
+        def count(self):
+            return self.data.count
+
+
+@sp.add_test()
+def test():
+    scenario = sp.test_scenario("counter", counter_module)
+    counter = counter_module.Counter()
+    scenario += counter
+    scenario.h2("Increment")
+    counter.increment(2)
+    counter.increment(3)
+    scenario.verify(sp.View(counter, "count")() == 5)
+'''
+
+
+def test_traced_scenario(tmp_path):
+    script = tmp_path / "counter.py"
+    script.write_text(SCENARIO)
+    output = tmp_path / "trace.json"
+    env = dict(os.environ, PYTHONPATH=runner.ROOT)
+    subprocess.run(
+        [sys.executable, "-m", "fa2_tools.trace", str(script), "--output", str(output), "--no-memory"],
+        cwd=str(tmp_path), env=env, check=True, capture_output=True,
+    )
+    with open(str(output)) as f:
+        events = [event for event in json.load(f)["traceEvents"] if event["ph"] == "X"]
+    names = [(event["cat"], event["name"]) for event in events]
+    assert names.count(("call", "increment")) == 2
+    assert ("origination", "Instance") in names
+    assert ("step", "Increment") in names
+    assert ("verify", "verify") in names
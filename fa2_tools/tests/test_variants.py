@@ -0,0 +1,72 @@
+import pytest
+
+from fa2_tools import variants
+
+
+def test_is_valid():
+    assert variants.is_valid("fungible", ())
+    assert variants.is_valid("fungible", ("admin", "mint", "convert"))
+    assert not variants.is_valid("nft", ("convert",))
+    # Minting needs an administrator check, open or not
+    assert not variants.is_valid("fungible", ("mint",))
+    assert variants.is_valid("nft", ("mint", "open_admin"))
+    assert not variants.is_valid("fungible", ("open_admin", "burn"))
+    with pytest.raises(ValueError):
+        variants.is_valid("single_asset", ())
+    with pytest.raises(ValueError):
+        variants.is_valid("fungible", ("pause",))
+
+
+def test_feature_sets():
+    sets = list(variants.feature_sets("fungible", ("convert", "mint", "admin")))
+    # In the order of FEATURES, smallest first, without `mint` alone
+    assert sets == [(), ("admin",), ("convert",), ("admin", "mint"), ("admin", "convert"), ("admin", "mint", "convert")]
+    assert all("convert" not in features for features in variants.feature_sets("nft"))
+    assert len(set(variants.feature_sets("nft"))) == len(list(variants.feature_sets("nft")))
+
+
+def test_class_name_and_source():
+    features = ("admin", "mint", "balance_of_view", "convert")
+    assert variants.class_name("fungible", features) == "FungibleAdminMintBalanceOfViewConvert"
+    source = variants.class_source("fungible", features)
+    assert source.startswith(
+        "    class FungibleAdminMintBalanceOfViewConvert"
+        "(main.Admin, main.Fungible, main.MintFungible, main.OnchainviewBalanceOf):\n"
+    )
+    # The mixins are initialized before the base class, and Admin last
+    assert source.index("main.OnchainviewBalanceOf.__init__") < source.index("main.MintFungible.__init__") \
+        < source.index("main.Fungible.__init__") < source.index("main.Admin.__init__")
+    assert "        def convert(self, batch):" in source
+    assert "is_administrator_" in variants.class_source("nft", ("mint", "open_admin"))
+
+
+def test_tutorial_convert():
+    types, method = variants.tutorial_convert()
+    assert types.startswith("    conversion_type: type = sp.record(")
+    assert "    conversion_batch: type" in types
+    assert method.startswith("        @sp.entrypoint\n        def convert(self, batch):\n")
+    assert method.rstrip().endswith("self.data.supply[item.key] = supplies[item.key]")
+
+
+def test_variants_run_in_the_interpreter(tmp_path):
+    fungible = [("admin", "mint", "burn", "convert"), ("balance_of_view",)]
+    module = variants.load_variants("fungible", fungible, str(tmp_path))
+    for features in fungible:
+        variants.fungible_scenario(module, None, features)
+    nft = [("mint", "burn", "open_admin")]
+    module = variants.load_variants("nft", nft, str(tmp_path))
+    variants.nft_scenario(module, None, nft[0])
+
+
+def test_leanest():
+    rows = [
+        dict(variant="A", features="", code_size=100, origination_paid_storage_size_diff=50),
+        dict(variant="B", features="admin+mint", code_size=300, origination_paid_storage_size_diff=90),
+        dict(variant="C", features="admin+mint+burn", code_size=300, origination_paid_storage_size_diff=80),
+        dict(variant="D", features="admin+burn", code_size=None, origination_paid_storage_size_diff=10),
+    ]
+    assert variants.leanest(rows, [])["variant"] == "A"
+    assert variants.leanest(rows, ["mint"])["variant"] == "C"
+    # A variant without a measured code size comes last
+    assert variants.leanest(rows, ["burn"])["variant"] == "C"
+    assert variants.leanest(rows, ["convert"]) is None
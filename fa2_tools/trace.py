@@ -0,0 +1,325 @@
+"""Trace the phases of SmartPy scenario files for Chrome or Perfetto.
+
+When a scenario file is slow, this module tells where the time goes. It
+records the wall time and the peak memory of each phase as a Chrome trace
+event, which chrome://tracing and https://ui.perfetto.dev can open:
+
+- `compile`: `@sp.module` functions and the modules that `sp.test_scenario`
+  loads
+- `test`: each `@sp.add_test()` function, with one `step` per `h1`/`h2`
+  section of its scenario
+- `metadata`: `sp.create_tzip16_metadata` and the blocks that the test
+  functions wrap in `phase("metadata")`, such as `get_offchain_views()`
+- `origination`: `scenario += contract`
+- `call`: entrypoint calls of originated contracts
+- `verify`: `scenario.verify`, `verify_equal`, `compute` and `sp.View`
+
+Run a file under the tracer, set `FA2_TRACE` to the trace file to trace
+any file that imports `fa2_tools`, or trace every file the runner runs:
+
+    python -m fa2_tools.trace smartpy_fa2_fungible/part_4_complete.py --output trace.json
+    FA2_TRACE=trace.json python fa2_tools/examples/fungible.py
+    python -m fa2_tools.runner --trace
+
+Peak memory is the peak of Python allocations during the phase, measured
+with `tracemalloc`, and the process's maximum resident set size so far.
+`tracemalloc` slows allocation-heavy code down; set `FA2_TRACE_MEMORY=0`
+or pass `--no-memory` to record wall times only.
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+
+from fa2_tools import ipfs
+
+ENV_VAR = "FA2_TRACE"
+# Phases that other phases can't start inside, such as the methods that
+# SmartPy calls on a contract while originating it
+_LEAF_CATEGORIES = {"compile", "metadata", "origination", "call", "verify"}
+
+_tracer = None
+
+
+class Tracer:
+    """Collect Chrome trace events for one process."""
+
+    def __init__(self, path, process_name=None, memory=True):
+        self.path = path
+        self.memory = memory
+        self.pid = os.getpid()
+        self.stack = []
+        self.events = []
+        if process_name:
+            self.events.append(
+                dict(name="process_name", ph="M", pid=self.pid, tid=0, args=dict(name=process_name))
+            )
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def busy(self):
+        return bool(self.stack) and self.stack[-1]["cat"] in _LEAF_CATEGORIES
+
+    def begin(self, category, name):
+        if self.memory:
+            # Keep the peak of the enclosing phase before measuring this one
+            if self.stack:
+                parent = self.stack[-1]
+                parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.stack.append(dict(cat=category, name=name, start=time.perf_counter_ns(), peak=0))
+
+    def end(self):
+        span = self.stack.pop()
+        end = time.perf_counter_ns()
+        args = {}
+        rss = _max_rss()
+        if rss is not None:
+            args["max_rss_bytes"] = rss
+        if self.memory:
+            peak = max(span["peak"], tracemalloc.get_traced_memory()[1])
+            if self.stack:
+                self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            args["peak_python_bytes"] = peak
+        self.events.append(dict(
+            name=span["name"],
+            cat=span["cat"],
+            ph="X",
+            ts=span["start"] // 1000,
+            dur=(end - span["start"]) // 1000,
+            pid=self.pid,
+            tid=threading.get_ident(),
+            args=args,
+        ))
+
+    def start_step(self, name):
+        self.end_step()
+        self.begin("step", name)
+
+    def end_step(self):
+        if self.stack and self.stack[-1]["cat"] == "step":
+            self.end()
+
+    def write(self):
+        with open(self.path, "w") as f:
+            json.dump(dict(traceEvents=self.events, displayTimeUnit="ms"), f)
+
+
+def _max_rss():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows has no getrusage
+    # Linux reports kilobytes and macOS bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+@contextlib.contextmanager
+def phase(category, name=None):
+    """Record the enclosed block as a phase when tracing is on."""
+    if _tracer is None or _tracer.busy():
+        yield
+        return
+    _tracer.begin(category, name or category)
+    try:
+        yield
+    finally:
+        _tracer.end()
+
+
+def _traced(category, name, function):
+    def traced(*args, **kwargs):
+        with phase(category, name):
+            return function(*args, **kwargs)
+
+    return traced
+
+
+class _TracedScenario:
+    """Wrap a scenario to record origination, verification and steps."""
+
+    def __init__(self, scenario):
+        object.__setattr__(self, "_scenario", scenario)
+
+    def __getattr__(self, name):
+        value = getattr(self._scenario, name)
+        if name in ("verify", "verify_equal", "compute"):
+            return _traced("verify", name, value)
+        if name in ("h1", "h2"):
+            def heading(title, *args, **kwargs):
+                if _tracer is not None and not _tracer.busy():
+                    _tracer.start_step(str(title))
+                return value(title, *args, **kwargs)
+
+            return heading
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._scenario, name, value)
+
+    def __iadd__(self, contract):
+        scenario = self._scenario
+        with phase("origination", type(contract).__name__):
+            scenario += contract
+        _trace_calls(contract)
+        return self
+
+
+_traced_classes = {}
+
+
+def _trace_calls(contract):
+    """Record the entrypoint calls of an originated contract."""
+    # SmartPy looks entrypoints up in `__getattr__` and returns a `Method`;
+    # other attributes, such as `contract_class`, stay as they are
+    from smartpy.internal.module_elements import Method
+
+    cls = type(contract)
+    if cls not in _traced_classes:
+        try:
+            class TracedContract(cls):
+                def __getattr__(self, name):
+                    value = super().__getattr__(name)
+                    if isinstance(value, Method):
+                        return _traced("call", name, value)
+                    return value
+
+                def get_offchain_views(self):
+                    with phase("metadata", "get_offchain_views"):
+                        return super().get_offchain_views()
+
+            TracedContract.__name__ = TracedContract.__qualname__ = cls.__name__
+        except Exception:
+            TracedContract = None
+        _traced_classes[cls] = TracedContract
+    if _traced_classes[cls] is not None:
+        try:
+            contract.__class__ = _traced_classes[cls]
+        except TypeError:
+            # Not every object's class can change; its calls stay untraced
+            _traced_classes[cls] = None
+
+
+def _patch(sp):
+    module = sp.module
+
+    def traced_module(function, *args, **kwargs):
+        with phase("compile", getattr(function, "__name__", "module")):
+            return module(function, *args, **kwargs)
+
+    test_scenario = sp.test_scenario
+
+    def traced_test_scenario(name, *args, **kwargs):
+        with phase("compile", "test_scenario %s" % name):
+            return _TracedScenario(test_scenario(name, *args, **kwargs))
+
+    add_test = sp.add_test
+
+    def traced_add_test(*args, **kwargs):
+        decorator = add_test(*args, **kwargs)
+
+        def traced_decorator(function):
+            def test(*test_args, **test_kwargs):
+                _tracer.begin("test", function.__name__)
+                try:
+                    return function(*test_args, **test_kwargs)
+                finally:
+                    _tracer.end_step()
+                    _tracer.end()
+                    _tracer.write()
+
+            test.__name__ = test.__qualname__ = function.__name__
+            test.__module__ = function.__module__
+            test.__doc__ = function.__doc__
+            return decorator(test)
+
+        return traced_decorator
+
+    create_tzip16_metadata = sp.create_tzip16_metadata
+    view = sp.View
+
+    def traced_view(contract, name, *args, **kwargs):
+        return _traced("verify", "view %s" % name, view(contract, name, *args, **kwargs))
+
+    sp.module = traced_module
+    sp.test_scenario = traced_test_scenario
+    sp.add_test = traced_add_test
+    sp.create_tzip16_metadata = _traced("metadata", "create_tzip16_metadata", create_tzip16_metadata)
+    sp.View = traced_view
+
+
+def install(path, process_name=None, memory=True):
+    """Start tracing this process into `path`, once."""
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    import smartpy as sp
+
+    _tracer = Tracer(path, process_name, memory)
+    _patch(sp)
+    atexit.register(_tracer.write)
+    return _tracer
+
+
+def install_from_env():
+    """Start tracing if `FA2_TRACE` names a trace file."""
+    path = os.environ.get(ENV_VAR)
+    if path:
+        memory = os.environ.get("FA2_TRACE_MEMORY", "1") != "0"
+        install(os.path.abspath(path), os.path.basename(sys.argv[0]) or None, memory)
+
+
+def merge(paths, output):
+    """Merge the trace files of several processes into one."""
+    events = []
+    for path in paths:
+        if os.path.exists(path):
+            with open(path) as f:
+                events.extend(json.load(f)["traceEvents"])
+    with open(output, "w") as f:
+        json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+    return len(events)
+
+
+def totals(events):
+    """Return the total seconds and count of each phase category, slowest first."""
+    result = {}
+    for event in events:
+        if event["ph"] == "X" and event["cat"] not in ("script", "test", "step"):
+            seconds, count = result.get(event["cat"], (0.0, 0))
+            result[event["cat"]] = (seconds + event["dur"] / 1e6, count + 1)
+    return sorted(result.items(), key=lambda item: -item[1][0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", help="Scenario file to run")
+    parser.add_argument("--output", default="trace.json")
+    parser.add_argument("--no-memory", action="store_true", help="Record wall times only")
+    args = parser.parse_args(argv)
+
+    # Pin the metadata offline, like `fa2_tools.runner` does
+    ipfs.install()
+    script = os.path.abspath(args.script)
+    tracer = install(os.path.abspath(args.output), os.path.basename(script), not args.no_memory)
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(script))
+    with phase("script", os.path.basename(script)):
+        runpy.run_path(script, run_name="__main__")
+    tracer.write()
+    for category, (seconds, count) in totals(tracer.events):
+        print("%-12s %8.3fs in %d phases" % (category, seconds, count), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
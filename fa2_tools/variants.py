@@ -0,0 +1,381 @@
+"""Build FA2 contract variants from feature sets and compare their costs.
+
+The tutorial contracts are hand-written combinations of the FA2 template
+classes. This module builds any valid combination of a base class
+(`fungible` or `nft`) and these features:
+
+- `admin`: `main.Admin`
+- `mint`: `main.MintFungible` or `main.MintNft`, which needs `admin` or
+  `open_admin`
+- `burn`: `main.BurnFungible` or `main.BurnNft`
+- `balance_of_view`: `main.OnchainviewBalanceOf`
+- `open_admin`: an `is_administrator_` that returns True, so that anyone
+  can mint, as in `pre-deployed-fa2-nft.py`
+- `convert`: the `convert` entrypoint of part 4 of the fungible tutorial
+  (fungible only), copied with its types from the tutorial file so that
+  the tutorial stays its only definition
+
+All variants of a base are generated as classes of one `@sp.module`, so
+the template is elaborated once. Each variant is then originated with
+the same small ledger and each of its entrypoints is called once, in
+mockup simulation mode so that `fa2_tools.costs` can read the receipts.
+The result is a matrix of code size, origination storage and gas per
+entrypoint, one row per variant:
+
+    python -m fa2_tools.variants --base fungible --output variants.csv
+    python -m fa2_tools.variants --base nft --features admin,mint,burn --require mint
+
+With `--require`, the leanest variant that has the required features is
+printed: the smallest code, then the least storage paid at origination.
+"""
+
+import argparse
+import ast
+import contextlib
+import csv
+import functools
+import glob
+import importlib.util
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+from fa2_tools import costs
+from fa2_tools.contracts import PATHS
+from fa2_tools.michelson import micheline_size
+
+BASES = {
+    "fungible": dict(base="Fungible", mint="MintFungible", burn="BurnFungible"),
+    "nft": dict(base="Nft", mint="MintNft", burn="BurnNft"),
+}
+FEATURES = ("admin", "mint", "burn", "balance_of_view", "open_admin", "convert")
+ENTRYPOINTS = ("transfer", "update_operators", "mint", "burn", "convert")
+
+CSV_FIELDS = [
+    "variant", "base", "features", "code_size",
+    "origination_storage_size", "origination_paid_storage_size_diff",
+] + ["gas_" + entrypoint for entrypoint in ENTRYPOINTS]
+
+_MODULE_SOURCE = '''import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+# Alias the main template for FA2 contracts
+main = fa2.main
+
+
+@sp.module
+def variants():
+    import main
+
+{types}
+{classes}
+'''
+
+
+def is_valid(base, features):
+    """Tell whether a set of features makes a contract that compiles and makes sense."""
+    features = set(features)
+    unknown = features - set(FEATURES)
+    if base not in BASES or unknown:
+        raise ValueError("Unknown base %r or features %s" % (base, ", ".join(sorted(unknown))))
+    if "convert" in features and base != "fungible":
+        return False
+    # Minting checks `is_administrator_`
+    if "mint" in features and not features & {"admin", "open_admin"}:
+        return False
+    # Opening the admin checks only matters for the entrypoints that use them
+    if "open_admin" in features and not features & {"admin", "mint"}:
+        return False
+    return True
+
+
+def feature_sets(base, features=FEATURES):
+    """Yield every valid combination of the given features, in the order of `FEATURES`."""
+    features = [feature for feature in FEATURES if feature in features]
+    for size in range(len(features) + 1):
+        for combination in itertools.combinations(features, size):
+            if is_valid(base, combination):
+                yield combination
+
+
+def class_name(base, features):
+    return BASES[base]["base"] + "".join(
+        part.capitalize() for feature in features for part in feature.split("_")
+    )
+
+
+def _segment(lines, node):
+    """Return the source lines of a node, with its decorators and comments inside it."""
+    start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno]) + "\n"
+
+
+@functools.lru_cache()
+def tutorial_convert(path=PATHS["convertible_fungible"]):
+    """Return the source of the conversion types and of the `convert` entrypoint of part 4.
+
+    Both come indented as in the tutorial's `my_module`: the types at the
+    module level and the entrypoint in the body of `MyFungibleContract`,
+    which are the levels of the generated module and classes too.
+    """
+    with open(path) as f:
+        source = f.read()
+    lines = source.splitlines()
+    module = next(
+        node for node in ast.parse(source).body
+        if isinstance(node, ast.FunctionDef) and node.name == "my_module"
+    )
+    types = [
+        node for node in module.body
+        if isinstance(node, ast.AnnAssign) and node.target.id in ("conversion_type", "conversion_batch")
+    ]
+    contract = next(
+        node for node in module.body if isinstance(node, ast.ClassDef) and node.name == "MyFungibleContract"
+    )
+    method = next(node for node in contract.body if isinstance(node, ast.FunctionDef) and node.name == "convert")
+    return "\n".join(_segment(lines, node) for node in types), _segment(lines, method)
+
+
+def class_source(base, features):
+    """Return the source of the class of one variant, indented for the module."""
+    names = BASES[base]
+    mixins = []
+    if "mint" in features:
+        mixins.append("main." + names["mint"])
+    if "burn" in features:
+        mixins.append("main." + names["burn"])
+    if "balance_of_view" in features:
+        mixins.append("main.OnchainviewBalanceOf")
+
+    # Order of inheritance: [Admin], [<policy>], <base class>, [<other mixins>]
+    parents = (["main.Admin"] if "admin" in features else []) + ["main." + names["base"]] + mixins
+
+    lines = [
+        "    class %s(%s):" % (class_name(base, features), ", ".join(parents)),
+        "        def __init__(self, admin_address, contract_metadata, ledger, token_metadata):",
+    ]
+    # Other mixins, then the base class, then Admin
+    lines += ["            %s.__init__(self)" % mixin for mixin in reversed(mixins)]
+    lines.append("            main.%s.__init__(self, contract_metadata, ledger, token_metadata)" % names["base"])
+    if "admin" in features:
+        lines.append("            main.Admin.__init__(self, admin_address)")
+    if "open_admin" in features:
+        lines += [
+            "",
+            "        @sp.private()",
+            "        def is_administrator_(self):",
+            "            return True",
+        ]
+    if "convert" in features:
+        lines += ["", tutorial_convert()[1].rstrip("\n")]
+    return "\n".join(lines) + "\n"
+
+
+def load_variants(base, sets, directory):
+    """Write the module of the variants to `directory` and return it."""
+    path = os.path.join(directory, "fa2_variants_%s.py" % base)
+    types = tutorial_convert()[0] if any("convert" in features for features in sets) else ""
+    with open(path, "w") as f:
+        f.write(_MODULE_SOURCE.format(
+            types=types,
+            classes="\n".join(class_source(base, features) for features in sets),
+        ))
+    spec = importlib.util.spec_from_file_location("fa2_variants_%s" % base, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.variants
+
+
+def _token_metadata(tokens):
+    return [
+        fa2.make_metadata(name="Token %d" % i, decimals=0, symbol="TK%d" % i)
+        for i in range(tokens)
+    ]
+
+
+def fungible_scenario(module, name, features):
+    """Originate a fungible variant and call each of its entrypoints once."""
+    scenario = sp.test_scenario(name, module)
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+
+    contract = getattr(module, class_name("fungible", features))(
+        admin.address,
+        sp.big_map(),
+        {(alice.address, 0): 10, (bob.address, 1): 10},
+        _token_metadata(2),
+    )
+    scenario += contract
+
+    contract.transfer(
+        [sp.record(from_=alice.address, txs=[sp.record(to_=bob.address, amount=1, token_id=0)])],
+        _sender=alice,
+    )
+    contract.update_operators(
+        [sp.variant("add_operator", sp.record(owner=alice.address, operator=bob.address, token_id=0))],
+        _sender=alice,
+    )
+    if "mint" in features:
+        contract.mint(
+            [sp.record(to_=alice.address, amount=1, token=sp.variant("existing", 0))],
+            _sender=admin,
+        )
+    if "burn" in features:
+        contract.burn([sp.record(from_=alice.address, token_id=0, amount=1)], _sender=alice)
+    if "convert" in features:
+        contract.convert(
+            [sp.record(source_token_id=0, target_token_id=1, amount=1)],
+            _sender=alice,
+        )
+
+
+def nft_scenario(module, name, features):
+    """Originate an NFT variant and call each of its entrypoints once."""
+    scenario = sp.test_scenario(name, module)
+    admin = sp.test_account("Admin")
+    alice = sp.test_account("Alice")
+    bob = sp.test_account("Bob")
+
+    contract = getattr(module, class_name("nft", features))(
+        admin.address,
+        sp.big_map(),
+        {0: alice.address, 1: bob.address},
+        _token_metadata(2),
+    )
+    scenario += contract
+
+    contract.transfer(
+        [sp.record(from_=alice.address, txs=[sp.record(to_=bob.address, amount=1, token_id=0)])],
+        _sender=alice,
+    )
+    contract.update_operators(
+        [sp.variant("add_operator", sp.record(owner=bob.address, operator=alice.address, token_id=0))],
+        _sender=bob,
+    )
+    if "mint" in features:
+        contract.mint(
+            [sp.record(metadata=fa2.make_metadata(name="Minted", decimals=0, symbol="MT"), to_=alice.address)],
+            _sender=admin,
+        )
+    if "burn" in features:
+        contract.burn([sp.record(from_=bob.address, token_id=1, amount=1)], _sender=bob)
+
+
+SCENARIOS = {"fungible": fungible_scenario, "nft": nft_scenario}
+
+
+@contextlib.contextmanager
+def _working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def code_size(output_dir):
+    """Return the binary size of the code that SmartPy wrote for a scenario's contract."""
+    paths = sorted(glob.glob(os.path.join(output_dir, "**", "*_contract.json"), recursive=True))
+    if not paths:
+        return None
+    with open(paths[0]) as f:
+        return micheline_size(json.load(f))
+
+
+def run(base, features=FEATURES, client="octez-client"):
+    """Build, originate and call every valid variant of a base, and return the matrix rows."""
+    sets = list(feature_sets(base, features))
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="fa2_variants_") as tmp:
+        module = load_variants(base, sets, tmp)
+        log_path = os.path.join(tmp, "calls.jsonl")
+        open(log_path, "w").close()
+        names = {}
+        # `recording` runs the scenarios in mockup mode, which writes the receipts
+        with _working_directory(tmp), costs.recording(log_path, client=client, mode="mockup"):
+            for variant in sets:
+                name = "variant_%s" % class_name(base, variant)
+                names[name] = variant
+
+                def test(variant=variant, name=name):
+                    SCENARIOS[base](module, name, variant)
+
+                sp.add_test()(test)
+        table = costs.build_table(log_path)
+        if not any(call["status"] == "applied" for calls in table["scenarios"].values() for call in calls):
+            raise RuntimeError(
+                "No receipts were recorded for the variants; check that %s can run a mockup" % client
+            )
+
+        for name, variant in names.items():
+            row = dict(
+                variant=class_name(base, variant),
+                base=base,
+                features="+".join(variant),
+                code_size=code_size(os.path.join(tmp, name)),
+            )
+            for call in table["scenarios"].get(name, []):
+                if call["status"] != "applied":
+                    continue
+                if call["entrypoint"] == "origination":
+                    row["origination_storage_size"] = call["storage_size"]
+                    row["origination_paid_storage_size_diff"] = call["paid_storage_size_diff"]
+                elif call["entrypoint"] in ENTRYPOINTS:
+                    row["gas_" + call["entrypoint"]] = call["gas"]
+            rows.append(row)
+    return rows
+
+
+def leanest(rows, required):
+    """Return the row of the cheapest variant that has all the required features, or None."""
+    candidates = [row for row in rows if set(required) <= set(filter(None, row["features"].split("+")))]
+    if not candidates:
+        return None
+    infinity = float("inf")
+    return min(candidates, key=lambda row: (
+        row.get("code_size") or infinity,
+        row.get("origination_paid_storage_size_diff") or infinity,
+    ))
+
+
+def _features(value):
+    return [feature for feature in value.split(",") if feature]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base", choices=sorted(BASES), default="fungible")
+    parser.add_argument("--features", type=_features, default=list(FEATURES),
+                        help="Features to combine, comma-separated (default: all)")
+    parser.add_argument("--require", type=_features, default=None,
+                        help="Print the leanest variant with these features")
+    parser.add_argument("--output", default="variants.csv")
+    parser.add_argument("--client", default="octez-client")
+    args = parser.parse_args(argv)
+
+    rows = run(args.base, args.features, client=args.client)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print("Wrote %d variants to %s" % (len(rows), args.output))
+    if args.require is not None:
+        row = leanest(rows, args.require)
+        if row is None:
+            print("No variant has %s" % ", ".join(args.require))
+            return 1
+        print("Leanest with %s: %s (%s bytes of code)" % (
+            ", ".join(args.require) or "no features", row["variant"], row["code_size"],
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import smartpy as sp
+from smartpy.templates import fa2_lib as fa2
+
+# Alias the main template for FA2 contracts
+main = fa2.main
+
+
+@sp.module
+def batch_views():
+    import main
+
+    balance_request: type = sp.record(owner=sp.address, token_id=sp.nat)
+    balance_response: type = sp.record(request=balance_request, balance=sp.nat)
+    supply_response: type = sp.record(token_id=sp.nat, total_supply=sp.nat)
+
+    # The ledger layout differs between the fungible and NFT base classes,
+    # so each base class has its own mixin. Both expose the same views.
+
+    class OnchainviewBatchBalancesFungible(main.FungibleInterface, main.CommonInterface):
+        """(Mixin) Batched balance and supply views for `main.Fungible`.
+
+        `get_balances` answers a list of (owner, token_id) requests and
+        `total_supplies` answers a list of token IDs in one view call.
+        The results are in the same order as the requests.
+        """
+
+        def __init__(self):
+            main.CommonInterface.__init__(self)
+            main.FungibleInterface.__init__(self)
+
+        @sp.onchain_view()
+        def get_balances(self, requests):
+            sp.cast(requests, sp.list[balance_request])
+
+            # Like the template's `get_balance_of`, the privates are passed
+            # to a function that the list comprehension calls for each request
+            @sp.effects(with_storage="read-only")
+            def f_balance(param):
+                (request, is_defined) = param
+                assert is_defined(request.token_id), "FA2_TOKEN_UNDEFINED"
+                return sp.cast(
+                    sp.record(
+                        request=request,
+                        balance=self.data.ledger.get((request.owner, request.token_id), default=0),
+                    ),
+                    balance_response,
+                )
+
+            return [f_balance((request, self.is_defined_)) for request in requests]
+
+        @sp.onchain_view()
+        def total_supplies(self, token_ids):
+            sp.cast(token_ids, sp.list[sp.nat])
+
+            @sp.effects(with_storage="read-only")
+            def f_supply(param):
+                (token_id, is_defined) = param
+                assert is_defined(token_id), "FA2_TOKEN_UNDEFINED"
+                return sp.cast(
+                    sp.record(
+                        token_id=token_id,
+                        total_supply=self.data.supply.get(token_id, default=0),
+                    ),
+                    supply_response,
+                )
+
+            return [f_supply((token_id, self.is_defined_)) for token_id in token_ids]
+
+    class OnchainviewBatchBalancesNft(main.NftInterface, main.CommonInterface):
+        """(Mixin) Batched balance and supply views for `main.Nft`.
+
+        Same views as `OnchainviewBatchBalancesFungible`, for a ledger that
+        maps each token ID to its owner.
+        """
+
+        def __init__(self):
+            main.CommonInterface.__init__(self)
+            main.NftInterface.__init__(self)
+
+        @sp.onchain_view()
+        def get_balances(self, requests):
+            sp.cast(requests, sp.list[balance_request])
+
+            @sp.effects(with_storage="read-only")
+            def f_balance(param):
+                (request, is_defined) = param
+                assert is_defined(request.token_id), "FA2_TOKEN_UNDEFINED"
+                balance = 0
+                if self.data.ledger.get_opt(request.token_id) == sp.Some(request.owner):
+                    balance = 1
+                return sp.cast(sp.record(request=request, balance=balance), balance_response)
+
+            return [f_balance((request, self.is_defined_)) for request in requests]
+
+        @sp.onchain_view()
+        def total_supplies(self, token_ids):
+            sp.cast(token_ids, sp.list[sp.nat])
+
+            @sp.effects(with_storage="read-only")
+            def f_supply(param):
+                (token_id, is_defined) = param
+                assert is_defined(token_id), "FA2_TOKEN_UNDEFINED"
+                total_supply = 0
+                if token_id in self.data.ledger:
+                    total_supply = 1
+                return sp.cast(sp.record(token_id=token_id, total_supply=total_supply), supply_response)
+
+            return [f_supply((token_id, self.is_defined_)) for token_id in token_ids]
+
+
+def get_balances(fa2_contract, requests):
+    """Utility function to call the contract's get_balances view to get many balances at once."""
+    return sp.View(fa2_contract, "get_balances")(requests)
+
+
+def total_supplies(fa2_contract, token_ids):
+    """Utility function to call the contract's total_supplies view to get many supplies at once."""
+    return sp.View(fa2_contract, "total_supplies")(token_ids)
+
+
+def verify_balances(scenario, fa2_contract, balances=None, supplies=None):
+    """Verify a whole table of expected balances and supplies in one step.
+
+    `balances` maps (owner, token_id) to the expected balance, where the
+    owner is an address or a test account, and `supplies` maps token IDs to
+    the expected total supply. Both tables are read with the batched views
+    in a single evaluation and a single report entry; if anything differs,
+    the report shows the expected and the actual table side by side, so
+    every mismatch is visible at once.
+    """
+    requests = []
+    expected_balances = []
+    for (owner, token_id), balance in (balances or {}).items():
+        if isinstance(owner, sp.BaseTestAccount):
+            owner = owner.address
+        request = sp.record(owner=owner, token_id=token_id)
+        requests.append(request)
+        expected_balances.append(sp.record(request=request, balance=balance))
+    token_ids = list((supplies or {}).keys())
+    expected_supplies = [
+        sp.record(token_id=token_id, total_supply=supplies[token_id]) for token_id in token_ids
+    ]
+    scenario.verify_equal(
+        sp.record(
+            balances=get_balances(fa2_contract, requests),
+            supplies=total_supplies(fa2_contract, token_ids),
+        ),
+        sp.record(balances=expected_balances, supplies=expected_supplies),
+    )